@@ -1,10 +1,31 @@
 import sys
 import os
 import re
+import io
 import json
+import math
+import mmap
+import tempfile
+import sqlite3
+import csv
+import shutil
+import bisect
+import heapq
+import html
+import struct
+import threading
+import time
 import traceback
+import zlib
+from collections import Counter, OrderedDict, deque
 import send2trash
-from PIL import Image
+from concurrent.futures import Future, ThreadPoolExecutor
+from PIL import Image, ImageChops, ImageStat
+
+try:
+    import numpy as np   # 可选：有 NumPy 时感知哈希按批向量化计算
+except ImportError:
+    np = None
 
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout,
@@ -12,16 +33,19 @@ from PyQt6.QtWidgets import (
     QSplitter, QTextBrowser, QFileDialog,
     QStackedWidget, QScrollArea, QToolBar, QMessageBox,
     QFrame, QPushButton, QSizePolicy, QAbstractItemView,
-    QToolButton, QMenu
+    QToolButton, QMenu, QTreeWidget, QTreeWidgetItem, QTabBar,
+    QDialog, QPlainTextEdit, QToolTip, QSlider, QSpinBox
 )
 import PyQt6.QtCore
 from PyQt6.QtCore import QPoint
 from PyQt6.QtGui import (
     QPixmap, QIcon, QAction, QActionGroup, QDragEnterEvent, QDropEvent,
-    QImage, QResizeEvent, QColor, QPainter,
-    QShortcut, QKeySequence
+    QImage, QResizeEvent, QColor, QPainter, QTextDocument,
+    QShortcut, QKeySequence, QCursor
+)
+from PyQt6.QtCore import (
+    Qt, QSize, QThread, QObject, pyqtSignal, QUrl, QTimer, QSettings, QPointF, QRectF, QEvent
 )
-from PyQt6.QtCore import Qt, QSize, QThread, pyqtSignal, QUrl, QTimer, QSettings
 
 
 # --- 异常捕获 ---
@@ -40,6 +64,24 @@ sys.excepthook = exception_hook
 
 VALID_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.bmp')
 
+# 只打开用户自己选的本地文件：放宽 Pillow 的解压炸弹上限（默认超过约 1.8 亿像素直接报错），
+# 16k×16k（2.7 亿像素）这类大图要能显示、能放大看瓦片；超过 2^31 像素仍然拒绝
+Image.MAX_IMAGE_PIXELS = 1 << 30
+
+# 排序方式：(mode, 翻译 key)；依赖元数据索引的排序在索引完成后会自动重排一次
+SORT_MODES = [
+    ("name_natural", 'sort_name'),
+    ("mtime", 'sort_mtime'),
+    ("size", 'sort_size'),
+    ("dimensions", 'sort_dimensions'),
+    ("seed", 'sort_seed'),
+    ("steps", 'sort_steps'),
+    ("cfg", 'sort_cfg'),
+    ("model", 'sort_model'),
+    ("lora", 'sort_lora'),
+]
+METADATA_SORT_MODES = ("dimensions", "seed", "steps", "cfg", "model", "lora")
+
 
 # ==========================================
 # --- 🎨 现代原生风格配色 (Modern Native) ---
@@ -112,6 +154,68 @@ TRANSLATIONS = {
         'sort': "Sort",
         'sort_name': "Name (A → Z)",
         'sort_mtime': "Modified Time (Newest)",
+        'delete_confirm_many': "Delete {0} selected images from disk?",
+        'deleting': "Moving to Recycle Bin… {0}/{1}",
+        'deleted_undo': "Deleted {0} — press Ctrl+Z to undo",
+        'undo_done': "Restored {0}",
+        'sort_size': "File Size (Largest)",
+        'sort_dimensions': "Dimensions (Largest)",
+        'sort_seed': "Seed",
+        'sort_steps': "Steps",
+        'sort_cfg': "CFG Scale",
+        'sort_model': "Model (A → Z)",
+        'sort_lora': "LoRA (A → Z)",
+        'find_dups': "Find Duplicates",
+        'hashing': "Comparing images… {0}/{1}",
+        'dups_found': "{0} groups of similar images ({1} files)",
+        'dups_none': "No similar images found",
+        'facets': "Filters",
+        'facet_sampler': "Sampler",
+        'facet_scheduler': "Scheduler",
+        'facet_resolution': "Resolution",
+        'facet_clear': "Clear filters",
+        'new_tab': "New Tab",
+        'tab_files': "Files",
+        'slow_storage': "Slow storage",
+        'loading_meta': "Reading metadata…",
+        'show_all': "Show all ({} chars)",
+        'raw_json': "Raw JSON",
+        'raw_json_loading': "Loading JSON…",
+        'raw_json_none': "No embedded JSON",
+        'raw_json_lines': "{} lines",
+        'thumb_size': "Thumbnail size",
+        'export': "Export",
+        'export_jsonl': "Prompts and params (JSONL)…",
+        'export_csv': "Prompts and params (CSV)…",
+        'export_paths': "Path list…",
+        'export_copy': "Copy files to folder…",
+        'export_link': "Hard-link files to folder…",
+        'exporting': "Exporting… {0}/{1}",
+        'export_done': "Exported {0} images",
+        'export_done_copied': "Exported {0} images ({1} copied: hard links not possible there)",
+        'export_failed': "Export failed: {0}",
+        'export_busy': "An export is already running",
+        'slideshow': "Slideshow",
+        'slideshow_seconds': "{0:g} s per image",
+        'slideshow_report': "Slideshow: {0} images, {1} missed deadlines (worst {2} ms late)",
+        'memory': "Memory usage",
+        'mem_cache': "Cache",
+        'mem_used': "Used",
+        'mem_entries': "Entries",
+        'mem_freed': "Evicted",
+        'mem_tiles': "Zoom tiles",
+        'mem_documents': "Metadata pages (HTML)",
+        'mem_display': "Decoded images",
+        'mem_thumbnails': "Thumbnails",
+        'mem_metadata': "Parsed metadata",
+        'mem_total': "Total",
+        'mem_budget': "Memory budget",
+        'mem_over': "Over budget: what is left is metadata, the open image and visible thumbnails, which are never evicted.",
+        'mem_mapped': "Disk thumbnail cache mapped: {0} (OS page cache, not counted)",
+        'meta_unreadable': "This file could not be read (it may be damaged or still being written).",
+        'close_tab_title': "Close Tab",
+        'close_last_tab_confirm': "This is the last tab. Clear its {0} images?",
+        'zoom_failed': "Cannot zoom into this image: {0}",
     },
     'cn': {
         'title': "AI 图片元数据查看器 (基础版) v1.1.0",
@@ -147,6 +251,68 @@ TRANSLATIONS = {
         'sort': "排序",
         'sort_name': "按名称",
         'sort_mtime': "按修改时间",
+        'delete_confirm_many': "从磁盘中删除选中的 {0} 张图片？",
+        'deleting': "正在移入回收站… {0}/{1}",
+        'deleted_undo': "已删除 {0} 张 — 按 Ctrl+Z 撤销",
+        'undo_done': "已恢复 {0} 张",
+        'sort_size': "按文件大小",
+        'sort_dimensions': "按分辨率",
+        'sort_seed': "按种子",
+        'sort_steps': "按步数",
+        'sort_cfg': "按 CFG",
+        'sort_model': "按模型",
+        'sort_lora': "按 LoRA",
+        'find_dups': "查找相似图",
+        'hashing': "正在比对图片… {0}/{1}",
+        'dups_found': "找到 {0} 组相似图片（共 {1} 张）",
+        'dups_none': "没有找到相似图片",
+        'facets': "筛选",
+        'facet_sampler': "采样器",
+        'facet_scheduler': "调度器",
+        'facet_resolution': "分辨率",
+        'facet_clear': "清除筛选",
+        'new_tab': "新标签页",
+        'tab_files': "文件",
+        'slow_storage': "慢速存储",
+        'loading_meta': "正在读取元数据…",
+        'show_all': "展开全部（{} 字）",
+        'raw_json': "原始 JSON",
+        'raw_json_loading': "正在加载 JSON…",
+        'raw_json_none': "没有内嵌的 JSON",
+        'raw_json_lines': "共 {} 行",
+        'thumb_size': "缩略图大小",
+        'export': "导出",
+        'export_jsonl': "提示词和参数（JSONL）…",
+        'export_csv': "提示词和参数（CSV）…",
+        'export_paths': "路径列表…",
+        'export_copy': "复制文件到文件夹…",
+        'export_link': "硬链接到文件夹…",
+        'exporting': "正在导出… {0}/{1}",
+        'export_done': "已导出 {0} 张",
+        'export_done_copied': "已导出 {0} 张（其中 {1} 张无法硬链接，已改为复制）",
+        'export_failed': "导出失败：{0}",
+        'export_busy': "已有导出正在进行",
+        'slideshow': "幻灯片",
+        'slideshow_seconds': "每张 {0:g} 秒",
+        'slideshow_report': "幻灯片：共 {0} 张，{1} 帧没能按时就绪（最多晚 {2} 毫秒）",
+        'memory': "内存占用",
+        'mem_cache': "缓存",
+        'mem_used': "占用",
+        'mem_entries': "条目",
+        'mem_freed': "已收回",
+        'mem_tiles': "缩放瓦片",
+        'mem_documents': "元数据页面（HTML）",
+        'mem_display': "已解码大图",
+        'mem_thumbnails': "缩略图",
+        'mem_metadata': "已解析元数据",
+        'mem_total': "合计",
+        'mem_budget': "内存预算",
+        'mem_over': "超出预算：剩下的是元数据、当前打开的图和视口内的缩略图，这些不会被淘汰。",
+        'mem_mapped': "磁盘缩略图缓存映射：{0}（系统页缓存，不计入）",
+        'meta_unreadable': "无法读取这个文件（可能已损坏，或者还没写完）。",
+        'close_tab_title': "关闭标签页",
+        'close_last_tab_confirm': "这是最后一个标签页，清空其中的 {0} 张图片？",
+        'zoom_failed': "无法放大这张图片：{0}",
     },
     'tc': {
         'title': "AI 圖片元數據查看器 (基礎版) v1.1.0",
@@ -182,6 +348,68 @@ TRANSLATIONS = {
         'sort': "排序",
         'sort_name': "按名稱",
         'sort_mtime': "按修改時間",
+        'delete_confirm_many': "從磁盤中刪除選中的 {0} 張圖片？",
+        'deleting': "正在移入資源回收筒… {0}/{1}",
+        'deleted_undo': "已刪除 {0} 張 — 按 Ctrl+Z 撤銷",
+        'undo_done': "已恢復 {0} 張",
+        'sort_size': "按文件大小",
+        'sort_dimensions': "按解析度",
+        'sort_seed': "按種子",
+        'sort_steps': "按步數",
+        'sort_cfg': "按 CFG",
+        'sort_model': "按模型",
+        'sort_lora': "按 LoRA",
+        'find_dups': "查找相似圖",
+        'hashing': "正在比對圖片… {0}/{1}",
+        'dups_found': "找到 {0} 組相似圖片（共 {1} 張）",
+        'dups_none': "沒有找到相似圖片",
+        'facets': "篩選",
+        'facet_sampler': "採樣器",
+        'facet_scheduler': "調度器",
+        'facet_resolution': "解析度",
+        'facet_clear': "清除篩選",
+        'new_tab': "新分頁",
+        'tab_files': "檔案",
+        'slow_storage': "慢速儲存",
+        'loading_meta': "正在讀取中繼資料…",
+        'show_all': "展開全部（{} 字）",
+        'raw_json': "原始 JSON",
+        'raw_json_loading': "正在載入 JSON…",
+        'raw_json_none': "沒有內嵌的 JSON",
+        'raw_json_lines': "共 {} 行",
+        'thumb_size': "縮圖大小",
+        'export': "匯出",
+        'export_jsonl': "提示詞和參數（JSONL）…",
+        'export_csv': "提示詞和參數（CSV）…",
+        'export_paths': "路徑清單…",
+        'export_copy': "複製檔案到資料夾…",
+        'export_link': "硬連結到資料夾…",
+        'exporting': "正在匯出… {0}/{1}",
+        'export_done': "已匯出 {0} 張",
+        'export_done_copied': "已匯出 {0} 張（其中 {1} 張無法硬連結，已改為複製）",
+        'export_failed': "匯出失敗：{0}",
+        'export_busy': "已有匯出正在進行",
+        'slideshow': "幻燈片",
+        'slideshow_seconds': "每張 {0:g} 秒",
+        'slideshow_report': "幻燈片：共 {0} 張，{1} 幀沒能按時就緒（最多晚 {2} 毫秒）",
+        'memory': "記憶體用量",
+        'mem_cache': "快取",
+        'mem_used': "佔用",
+        'mem_entries': "項目",
+        'mem_freed': "已回收",
+        'mem_tiles': "縮放圖塊",
+        'mem_documents': "中繼資料頁面（HTML）",
+        'mem_display': "已解碼大圖",
+        'mem_thumbnails': "縮圖",
+        'mem_metadata': "已解析中繼資料",
+        'mem_total': "合計",
+        'mem_budget': "記憶體預算",
+        'mem_over': "超出預算：剩下的是中繼資料、目前開啟的圖和視窗內的縮圖，這些不會被淘汰。",
+        'mem_mapped': "磁碟縮圖快取映射：{0}（系統頁快取，不計入）",
+        'meta_unreadable': "無法讀取這個檔案（可能已損壞，或者還沒寫完）。",
+        'close_tab_title': "關閉分頁",
+        'close_last_tab_confirm': "這是最後一個分頁，清空其中的 {0} 張圖片？",
+        'zoom_failed': "無法放大這張圖片：{0}",
     },
     'jp': {
         'title': "AI 画像メタデータビューア (Basic) v1.1.0",
@@ -217,6 +445,68 @@ TRANSLATIONS = {
         'sort': "並び替え",
         'sort_name': "名前順",
         'sort_mtime': "更新日時（新しい順）",
+        'delete_confirm_many': "選択した {0} 枚の画像をディスクから削除しますか？",
+        'deleting': "ごみ箱へ移動中… {0}/{1}",
+        'deleted_undo': "{0} 枚を削除しました — Ctrl+Z で元に戻す",
+        'undo_done': "{0} 枚を元に戻しました",
+        'sort_size': "ファイルサイズ（大きい順）",
+        'sort_dimensions': "解像度（大きい順）",
+        'sort_seed': "シード",
+        'sort_steps': "ステップ数",
+        'sort_cfg': "CFG スケール",
+        'sort_model': "モデル名",
+        'sort_lora': "LoRA 名",
+        'find_dups': "類似画像を検索",
+        'hashing': "画像を比較中… {0}/{1}",
+        'dups_found': "類似画像 {0} グループ（{1} 枚）",
+        'dups_none': "類似画像は見つかりませんでした",
+        'facets': "フィルター",
+        'facet_sampler': "サンプラー",
+        'facet_scheduler': "スケジューラ",
+        'facet_resolution': "解像度",
+        'facet_clear': "フィルターを解除",
+        'new_tab': "新しいタブ",
+        'tab_files': "ファイル",
+        'slow_storage': "低速ストレージ",
+        'loading_meta': "メタデータを読み込み中…",
+        'show_all': "すべて表示（{} 文字）",
+        'raw_json': "生 JSON",
+        'raw_json_loading': "JSON を読み込み中…",
+        'raw_json_none': "埋め込み JSON はありません",
+        'raw_json_lines': "{} 行",
+        'thumb_size': "サムネイルサイズ",
+        'export': "エクスポート",
+        'export_jsonl': "プロンプトとパラメータ（JSONL）…",
+        'export_csv': "プロンプトとパラメータ（CSV）…",
+        'export_paths': "パス一覧…",
+        'export_copy': "ファイルをフォルダへコピー…",
+        'export_link': "フォルダへハードリンク…",
+        'exporting': "エクスポート中… {0}/{1}",
+        'export_done': "{0} 枚をエクスポートしました",
+        'export_done_copied': "{0} 枚をエクスポートしました（{1} 枚はハードリンクできないためコピー）",
+        'export_failed': "エクスポートに失敗しました：{0}",
+        'export_busy': "エクスポートは実行中です",
+        'slideshow': "スライドショー",
+        'slideshow_seconds': "1 枚 {0:g} 秒",
+        'slideshow_report': "スライドショー：{0} 枚、期限に間に合わなかったフレーム {1}（最大 {2} ms 遅延）",
+        'memory': "メモリ使用量",
+        'mem_cache': "キャッシュ",
+        'mem_used': "使用量",
+        'mem_entries': "件数",
+        'mem_freed': "解放済み",
+        'mem_tiles': "ズームタイル",
+        'mem_documents': "メタデータページ（HTML）",
+        'mem_display': "デコード済み画像",
+        'mem_thumbnails': "サムネイル",
+        'mem_metadata': "解析済みメタデータ",
+        'mem_total': "合計",
+        'mem_budget': "メモリ予算",
+        'mem_over': "予算超過：残りはメタデータ、表示中の画像、表示範囲のサムネイルで、これらは解放されません。",
+        'mem_mapped': "ディスクのサムネイルキャッシュのマップ：{0}（OS のページキャッシュ、計上外）",
+        'meta_unreadable': "このファイルを読み込めませんでした（破損しているか、書き込み中の可能性があります）。",
+        'close_tab_title': "タブを閉じる",
+        'close_last_tab_confirm': "最後のタブです。{0} 枚の画像をクリアしますか？",
+        'zoom_failed': "この画像は拡大できません：{0}",
     },
     'kr': {
         'title': "AI 이미지 메타데이터 뷰어 (Basic) v1.1.0",
@@ -252,6 +542,68 @@ TRANSLATIONS = {
         'sort': "정렬",
         'sort_name': "이름순",
         'sort_mtime': "수정 시간(최신순)",
+        'delete_confirm_many': "선택한 {0}개의 이미지를 디스크에서 삭제하시겠습니까?",
+        'deleting': "휴지통으로 이동 중… {0}/{1}",
+        'deleted_undo': "{0}개 삭제됨 — Ctrl+Z로 실행 취소",
+        'undo_done': "{0}개 복원됨",
+        'sort_size': "파일 크기(큰 순)",
+        'sort_dimensions': "해상도(큰 순)",
+        'sort_seed': "시드",
+        'sort_steps': "스텝 수",
+        'sort_cfg': "CFG 스케일",
+        'sort_model': "모델 이름",
+        'sort_lora': "LoRA 이름",
+        'find_dups': "유사 이미지 찾기",
+        'hashing': "이미지 비교 중… {0}/{1}",
+        'dups_found': "유사 이미지 {0}개 그룹 ({1}개 파일)",
+        'dups_none': "유사한 이미지가 없습니다",
+        'facets': "필터",
+        'facet_sampler': "샘플러",
+        'facet_scheduler': "스케줄러",
+        'facet_resolution': "해상도",
+        'facet_clear': "필터 해제",
+        'new_tab': "새 탭",
+        'tab_files': "파일",
+        'slow_storage': "느린 저장소",
+        'loading_meta': "메타데이터 읽는 중…",
+        'show_all': "전체 보기 ({}자)",
+        'raw_json': "원본 JSON",
+        'raw_json_loading': "JSON 불러오는 중…",
+        'raw_json_none': "포함된 JSON이 없습니다",
+        'raw_json_lines': "{}줄",
+        'thumb_size': "썸네일 크기",
+        'export': "내보내기",
+        'export_jsonl': "프롬프트와 파라미터 (JSONL)…",
+        'export_csv': "프롬프트와 파라미터 (CSV)…",
+        'export_paths': "경로 목록…",
+        'export_copy': "폴더로 파일 복사…",
+        'export_link': "폴더로 하드 링크…",
+        'exporting': "내보내는 중… {0}/{1}",
+        'export_done': "{0}장을 내보냈습니다",
+        'export_done_copied': "{0}장을 내보냈습니다 ({1}장은 하드 링크가 불가능해 복사함)",
+        'export_failed': "내보내기 실패: {0}",
+        'export_busy': "이미 내보내기가 진행 중입니다",
+        'slideshow': "슬라이드쇼",
+        'slideshow_seconds': "장당 {0:g}초",
+        'slideshow_report': "슬라이드쇼: {0}장, 제시간에 준비되지 않은 프레임 {1}개 (최대 {2} ms 지연)",
+        'memory': "메모리 사용량",
+        'mem_cache': "캐시",
+        'mem_used': "사용량",
+        'mem_entries': "항목",
+        'mem_freed': "회수됨",
+        'mem_tiles': "확대 타일",
+        'mem_documents': "메타데이터 페이지(HTML)",
+        'mem_display': "디코딩된 이미지",
+        'mem_thumbnails': "썸네일",
+        'mem_metadata': "파싱된 메타데이터",
+        'mem_total': "합계",
+        'mem_budget': "메모리 예산",
+        'mem_over': "예산 초과: 남은 것은 메타데이터, 열린 이미지, 화면에 보이는 썸네일로, 이들은 해제되지 않습니다.",
+        'mem_mapped': "디스크 썸네일 캐시 매핑: {0} (OS 페이지 캐시, 집계 제외)",
+        'meta_unreadable': "이 파일을 읽을 수 없습니다 (손상되었거나 아직 저장 중일 수 있습니다).",
+        'close_tab_title': "탭 닫기",
+        'close_last_tab_confirm': "마지막 탭입니다. 이미지 {0}개를 비우시겠습니까?",
+        'zoom_failed': "이 이미지를 확대할 수 없습니다: {0}",
     }
 }
 
@@ -302,286 +654,3455 @@ def pil2pixmap(pil_image):
     return QPixmap.fromImage(qim)
 
 
-class ThumbnailLoader(QThread):
-    thumbnail_loaded = pyqtSignal(str, QPixmap)
-
-    def __init__(self, file_list):
-        super().__init__()
-        self.file_list = file_list
-        self.running = True
+def pil2qimage(pil_image):
+    """PIL -> QImage（深拷贝，可以安全地从工作线程传回界面线程）"""
+    if pil_image.mode != "RGBA":
+        pil_image = pil_image.convert("RGBA")
+    data = pil_image.tobytes("raw", "RGBA")
+    qim = QImage(data, pil_image.size[0], pil_image.size[1], QImage.Format.Format_RGBA8888)
+    return qim.copy()
+
+
+def encode_thumbnail(pil_image):
+    """把缩略图压缩成紧凑字节：带透明通道用 PNG，其余用 JPEG"""
+    buf = io.BytesIO()
+    has_alpha = pil_image.mode in ("RGBA", "LA") or (
+        pil_image.mode == "P" and "transparency" in pil_image.info
+    )
+    if has_alpha:
+        pil_image.save(buf, "PNG", optimize=False)
+    else:
+        pil_image.convert("RGB").save(buf, "JPEG", quality=90)
+    return buf.getvalue()
+
+
+THUMB_SIZE = 240
+# 缩略图按物理像素分档缓存：显示尺寸 × 设备像素比落在哪一档就用哪一档
+THUMB_TIERS = (THUMB_SIZE, 480, 960)
+
+
+def thumb_tier(pixels):
+    """能覆盖 pixels 的最小一档；超出最大档就用最大档"""
+    for tier in THUMB_TIERS:
+        if pixels <= tier:
+            return tier
+    return THUMB_TIERS[-1]
+
+
+def thumb_key(path, tier):
+    """磁盘缓存的 key：最小一档沿用原来的 path，老缓存继续有效"""
+    return path if tier == THUMB_SIZE else f"{path}|{tier}"
+
+
+def fast_thumbnail(img, size=THUMB_SIZE):
+    """
+    第一遍的快速缩略图，返回 (图, 是否需要精修)：
+    JPEG 用 draft 在 DCT 阶段按 1/2^n 缩小解码（最低到目标的一半），再用 BILINEAR 放到目标尺寸；
+    其它格式的耗时几乎全在解码上，省不下什么，直接出最终质量。
+    """
+    w, h = img.size
+    scale = min(size / w, size / h)
+    if img.format == "JPEG" and scale < 0.5:
+        target = (max(1, round(w * scale)), max(1, round(h * scale)))
+        img.draft("RGB", (target[0] // 2, target[1] // 2))
+        if img.size != (w, h):
+            return img.resize(target, Image.Resampling.BILINEAR), True
+    img.thumbnail((size, size), Image.Resampling.LANCZOS)
+    return img, False
+
+
+def thumbnail_difference(a, b):
+    """两张缩略图的平均通道差（0-255）；尺寸不同按差异很大处理"""
+    if a.size != b.size:
+        return 255.0
+    mean = ImageStat.Stat(ImageChops.difference(a.convert("RGB"), b.convert("RGB"))).mean
+    return sum(mean) / len(mean)
+
+
+class ThumbnailStore:
+    """
+    磁盘缩略图缓存：一个只追加的数据文件（thumbs.pack）+ 一个偏移索引（thumbs.idx）。
+    读的时候通过 mmap 切一片字节，不需要每张图单独开文件。
+
+    数据文件开头是 8 字节随机 token，之后每条记录：
+        RECORD 头（magic, key 长度, 数据长度, mtime, size, crc32）+ key(utf-8) + 缩略图字节
+    索引（JSON，原子替换写入）记录 token、覆盖到的文件长度和每个 key 的偏移。
+    打开时索引覆盖范围之后的尾部会重新扫描并校验 crc，写了一半的记录直接截掉，
+    所以中途崩溃最多丢掉最后几张，不会读到坏数据。
+    """
+    MAGIC = b"TPK1"
+    RECORD = struct.Struct("<4sIIdQI")
+    TOKEN_SIZE = 8
+
+    def __init__(self, folder=None, budget_bytes=1024 * 1024 * 1024):
+        folder = folder or os.path.join(app_data_dir(), "thumbs")
+        os.makedirs(folder, exist_ok=True)
+        self.pack_path = os.path.join(folder, "thumbs.pack")
+        self.index_path = os.path.join(folder, "thumbs.idx")
+        self.budget_bytes = budget_bytes
+        self.lock = threading.Lock()
+        self.entries = {}       # key -> (数据偏移, 数据长度, size, mtime, 写入序号)
+        self.dead_bytes = 0     # 被覆盖 / 删除的记录占用的字节，压缩时回收
+        self.seq = 0
+        self.index_dirty = False
+        self.map = None
+        self.open()
+
+    # ----- 打开 / 恢复 -----
+    def open(self):
+        if not os.path.exists(self.pack_path) or os.path.getsize(self.pack_path) < self.TOKEN_SIZE:
+            with open(self.pack_path, "wb") as f:
+                f.write(os.urandom(self.TOKEN_SIZE))
+        with open(self.pack_path, "rb") as f:
+            self.token = f.read(self.TOKEN_SIZE)
+        covered = self.load_index()
+        end = self.scan_tail(covered)
+        if end < os.path.getsize(self.pack_path):
+            # 尾部有写了一半的记录：截掉，后面从干净的位置继续追加
+            with open(self.pack_path, "r+b") as f:
+                f.truncate(end)
+        self.size = end
+        self.writer = open(self.pack_path, "ab")
+
+    def load_index(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if bytes.fromhex(data["token"]) != self.token:
+                return self.TOKEN_SIZE
+            self.entries = {k: tuple(v) for k, v in data["entries"].items()}
+            self.dead_bytes = data.get("dead", 0)
+            self.seq = max((e[4] for e in self.entries.values()), default=0)
+            return data["length"]
+        except (OSError, ValueError, KeyError, TypeError):
+            self.entries = {}
+            self.dead_bytes = 0
+            return self.TOKEN_SIZE
+
+    def scan_tail(self, offset):
+        """从 offset 起逐条校验记录，返回最后一条完整记录的结尾"""
+        file_size = os.path.getsize(self.pack_path)
+        if offset > file_size:
+            # 索引比数据文件新（数据文件被外部截断过），整个重扫
+            self.entries = {}
+            self.dead_bytes = 0
+            offset = self.TOKEN_SIZE
+        if offset >= file_size:
+            return offset
+        with open(self.pack_path, "rb") as f:
+            f.seek(offset)
+            while True:
+                head = f.read(self.RECORD.size)
+                if len(head) < self.RECORD.size:
+                    break
+                magic, key_len, data_len, mtime, size, crc = self.RECORD.unpack(head)
+                if magic != self.MAGIC:
+                    break
+                body = f.read(key_len + data_len)
+                if len(body) < key_len + data_len or zlib.crc32(body) != crc:
+                    break
+                key = body[:key_len].decode("utf-8", errors="replace")
+                self._set_entry(key, (offset + self.RECORD.size + key_len, data_len, size, mtime))
+                offset += self.RECORD.size + key_len + data_len
+        self.index_dirty = True
+        return offset
+
+    def _set_entry(self, key, entry):
+        old = self.entries.get(key)
+        if old is not None:
+            self.dead_bytes += self._record_bytes(key, old)
+        self.seq += 1
+        self.entries[key] = entry + (self.seq,)
+
+    def _record_bytes(self, key, entry):
+        return self.RECORD.size + len(key.encode("utf-8")) + entry[1]
+
+    # ----- 读写 -----
+    def get(self, key, stat):
+        """stat: (size, mtime)；文件变过则视为未命中"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            offset, length, size, mtime = entry[:4]
+            if stat is None or stat[0] != size or abs(stat[1] - mtime) > 1e-6:
+                return None
+            if self.map is None or offset + length > len(self.map):
+                self._remap()
+                if self.map is None or offset + length > len(self.map):
+                    return None
+            return self.map[offset:offset + length]
+
+    def put(self, key, stat, data):
+        if stat is None or not data:
+            return
+        key_bytes = key.encode("utf-8")
+        head = self.RECORD.pack(self.MAGIC, len(key_bytes), len(data), stat[1], stat[0],
+                                zlib.crc32(key_bytes + data))
+        with self.lock:
+            offset = self.size
+            # 一次 write 整条记录，崩溃时最多留下一条不完整的尾巴
+            self.writer.write(head + key_bytes + data)
+            self.writer.flush()
+            self.size += len(head) + len(key_bytes) + len(data)
+            self._set_entry(key, (offset + len(head) + len(key_bytes), len(data), stat[0], stat[1]))
+            self.index_dirty = True
+
+    def discard(self, keys):
+        with self.lock:
+            for key in keys:
+                entry = self.entries.pop(key, None)
+                if entry is not None:
+                    self.dead_bytes += self._record_bytes(key, entry)
+                    self.index_dirty = True
+
+    def _remap(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if self.size <= self.TOKEN_SIZE:
+            return
+        with open(self.pack_path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), self.size, access=mmap.ACCESS_READ)
 
-    def run(self):
-        for full_path in self.file_list:
-            if not self.running:
-                break
+    # ----- 索引 / 压缩 -----
+    def save_index(self):
+        with self.lock:
+            if not self.index_dirty:
+                return
+            data = {"token": self.token.hex(), "length": self.size,
+                    "dead": self.dead_bytes, "entries": self.entries}
+            tmp = self.index_path + ".tmp"
             try:
-                with Image.open(full_path) as img:
-                    img.thumbnail((240, 240), Image.Resampling.LANCZOS)
-                    self.thumbnail_loaded.emit(full_path, pil2pixmap(img))
-            except:
-                continue
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(data, f, separators=(",", ":"))
+                os.replace(tmp, self.index_path)
+                self.index_dirty = False
+            except OSError:
+                pass
+
+    def needs_compaction(self):
+        live = self.size - self.TOKEN_SIZE - self.dead_bytes
+        return self.dead_bytes > max(32 * 1024 * 1024, live // 2) or self.size > self.budget_bytes
+
+    def compact(self):
+        """
+        只保留活记录（超出预算时保留最近写入的），写到新文件后整体替换。
+        新文件有新 token，替换后、索引写好前崩溃的话，打开时 token 对不上会整体重扫，不会错位。
+        """
+        with self.lock:
+            # 从最近写入的往回挑，超出预算（留 1/4 余量）的旧记录丢掉
+            keep = []
+            budget = self.budget_bytes * 3 // 4
+            used = self.TOKEN_SIZE
+            for key, entry in sorted(self.entries.items(), key=lambda kv: kv[1][4], reverse=True):
+                used += self._record_bytes(key, entry)
+                if used > budget:
+                    break
+                keep.append((key, entry))
+            keep.reverse()
+
+            tmp = self.pack_path + ".tmp"
+            token = os.urandom(self.TOKEN_SIZE)
+            new_entries = {}
+            total = self.TOKEN_SIZE
+            try:
+                with open(self.pack_path, "rb") as src, open(tmp, "wb") as dst:
+                    dst.write(token)
+                    for seq, (key, (offset, length, size, mtime, _)) in enumerate(keep, 1):
+                        key_bytes = key.encode("utf-8")
+                        src.seek(offset)
+                        data = src.read(length)
+                        dst.write(self.RECORD.pack(self.MAGIC, len(key_bytes), length, mtime, size,
+                                                   zlib.crc32(key_bytes + data)))
+                        dst.write(key_bytes)
+                        dst.write(data)
+                        new_entries[key] = (total + self.RECORD.size + len(key_bytes), length, size, mtime, seq)
+                        total += self.RECORD.size + len(key_bytes) + length
+                if self.map is not None:
+                    self.map.close()
+                    self.map = None
+                self.writer.close()
+                os.replace(tmp, self.pack_path)
+            except OSError:
+                # 例如 Windows 上另一个实例还映射着旧文件：这次不压缩
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+                if self.writer.closed:
+                    self.writer = open(self.pack_path, "ab")
+                return
+            self.token = token
+            self.entries = new_entries
+            self.seq = len(new_entries)
+            self.dead_bytes = 0
+            self.size = total
+            self.index_dirty = True
+            self.writer = open(self.pack_path, "ab")
+        self.save_index()
+
+    def close(self):
+        if self.needs_compaction():
+            self.compact()
+        self.save_index()
+        with self.lock:
+            if self.map is not None:
+                self.map.close()
+                self.map = None
+            self.writer.close()
 
-    def stop(self):
-        self.running = False
-        self.wait()
 
+# ==========================================
+# --- 元数据解析（纯数据，不涉及界面） ---
+# ==========================================
+def _as_number(value):
+    """KSampler 的输入可能是连线（list），只有真正的数字才算"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value) if "." in str(value) else int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_comfy_prompt(comfy_json):
+    """
+    解析 ComfyUI 的 prompt JSON，返回结构化记录（解析失败抛异常）：
+    - 模型：只收集 Checkpoint / Diffusion Model 名称
+    - KSampler 的参数
+    - 正/负提示词（含 Qwen Edit 等节点）
+    - LoRA（class_type 名里包含 'lora' 的节点）
+    """
+    data = json.loads(comfy_json) if isinstance(comfy_json, (str, bytes)) else comfy_json
+    pos, neg = "", ""
+    params = {}
+    sampler_node = None
+
+    # 只保留 Checkpoint / Diffusion Model 名称
+    model_lines = []
+    model_names = []
+
+    # Qwen Edit 等节点里可能直接有 prompt / negative_prompt
+    qwen_pos_candidate = ""
+    qwen_neg_candidate = ""
+
+    # LoRA 信息
+    lora_infos = []
+    lora_names = []
+
+    for key, node in data.items():
+        ctype = node.get('class_type', '')
+        inputs = node.get('inputs', {}) or {}
+        ctype_lower = ctype.lower()
+
+        # 1) Checkpoint
+        if 'checkpointloader' in ctype_lower:
+            name = (
+                inputs.get('ckpt_name')
+                or inputs.get('model_name')
+                or inputs.get('ckpt_path')
+                or ''
+            )
+            if name:
+                line = f"Checkpoint: {name}"
+                if line not in model_lines:
+                    model_lines.append(line)
+                    model_names.append(str(name))
+
+        # 2) Diffusion Model（这里把原本的 UNet 名字改成 Diffusion Model 展示）
+        if 'unet' in ctype_lower:
+            name = (
+                inputs.get('unet_name')
+                or inputs.get('model')
+                or inputs.get('name')
+                or ''
+            )
+            if name:
+                line = f"Diffusion Model: {name}"
+                if line not in model_lines:
+                    model_lines.append(line)
+                    model_names.append(str(name))
+
+        # 3) KSampler：采样设置
+        if 'ksampler' in ctype_lower:
+            sampler_node = node
+            for k in ['seed', 'steps', 'cfg', 'sampler_name', 'scheduler', 'denoise']:
+                if k in inputs:
+                    params[k.capitalize()] = inputs[k]
+
+        # 4) LoRA 节点
+        if 'lora' in ctype_lower:
+            name = (
+                inputs.get('lora_name')
+                or inputs.get('model')
+                or inputs.get('name')
+                or ''
+            )
+            sm = inputs.get('strength_model', None)
+            sc = inputs.get('strength_clip', None)
+
+            parts = []
+            if name:
+                parts.append(str(name))
+                if isinstance(name, str):
+                    lora_names.append(name)
+            if sm is not None:
+                parts.append(f"model: {sm}")
+            if sc is not None:
+                parts.append(f"clip: {sc}")
+            if parts:
+                lora_infos.append(" | ".join(parts))
+
+        # 5) Qwen Edit / Qwen 相关节点：从 inputs 里直接抓 prompt
+        if 'qwen' in ctype_lower:
+            p = inputs.get('prompt') or inputs.get('text') or ""
+            n = inputs.get('negative_prompt') or inputs.get('negative') or ""
+            if isinstance(p, str) and p.strip():
+                qwen_pos_candidate = p.strip()
+            if isinstance(n, str) and n.strip():
+                qwen_neg_candidate = n.strip()
+
+    # == 从 KSampler 链接反推 正/负提示 ==
+    if sampler_node:
+        inputs = sampler_node.get('inputs', {}) or {}
+        for key, prompt_type in [('positive', 'pos'), ('negative', 'neg')]:
+            ref = inputs.get(key)
+            if ref:
+                text_node = data.get(str(ref[0]), {})
+                text = text_node.get('inputs', {}).get('text', '')
+                if prompt_type == 'pos':
+                    pos = text
+                else:
+                    neg = text
+
+    # == 兜底：遍历 CLIPTextEncode ==
+    if not pos and not neg:
+        for key, node in data.items():
+            if 'cliptextencode' in node.get('class_type', '').lower():
+                text = node.get('inputs', {}).get('text', '')
+                if not text:
+                    continue
+                if any(x in text.lower() for x in ['quality', 'nsfw', 'worst']):
+                    if not neg:
+                        neg = text
+                else:
+                    if not pos:
+                        pos = text
+
+    # == 再兜底：如果还是空，用 Qwen 节点里的 prompt ==
+    if (not pos) and qwen_pos_candidate:
+        pos = qwen_pos_candidate
+    if (not neg) and qwen_neg_candidate:
+        neg = qwen_neg_candidate
+
+    return {
+        'source': 'comfy',
+        'positive': pos if isinstance(pos, str) else str(pos),
+        'negative': neg if isinstance(neg, str) else str(neg),
+        'model_lines': model_lines,
+        'model': model_names[0] if model_names else "",
+        'loras': lora_infos,
+        'lora_names': lora_names,
+        'params': params,
+        'params_text': "",
+        'seed': _as_number(params.get('Seed')),
+        'steps': _as_number(params.get('Steps')),
+        'cfg': _as_number(params.get('Cfg')),
+        'sampler': params.get('Sampler_name') if isinstance(params.get('Sampler_name'), str) else "",
+        'scheduler': params.get('Scheduler') if isinstance(params.get('Scheduler'), str) else "",
+    }
 
-class GridListWidget(QListWidget):
-    """网格视图用的列表，自定义滚轮步长：每次滚轮滚动两行"""
-    def wheelEvent(self, event):
-        delta = event.angleDelta().y()
-        if delta == 0:
-            return
 
-        # 一行的高度：gridSize 高度 + 间距
-        row_height = self.gridSize().height() + self.spacing()
-        # 每个 step（120）滚动 2 行
-        steps = delta / 120.0
-        pixels = int(-steps * 2 * row_height)   # 向上滚时 delta>0，要减小 scroll value
+A1111_PARAM_RE = re.compile(r'\s*([\w][\w \-/]*):\s*("(?:\\.|[^\\"])*"|[^,]*)(?:,|$)')
 
-        bar = self.verticalScrollBar()
-        bar.setValue(bar.value() + pixels)
-        event.accept()
 
+def parse_a1111_parameters(text):
+    """
+    解析 A1111 / Forge / NovelAI 的 'parameters' 文本：
+    正/负提示词、Model、LoRA，以及 Steps: 之后的其它参数
+    """
+    parts = text.split("Negative prompt:")
+    pos = parts[0].strip()
+    neg = ""
+    if len(parts) > 1:
+        if "Steps:" in parts[1]:
+            neg = parts[1].split("Steps:")[0].strip()
+        else:
+            neg = parts[1].strip()
+
+    # 解析 Steps: 后面的参数整体
+    full_params = ""
+    if "Steps:" in text:
+        full_params = "Steps:" + text.split("Steps:", 1)[1].strip()
+
+    # 参数键值（排序 / 筛选用）
+    kv = {}
+    for m in A1111_PARAM_RE.finditer(full_params):
+        kv.setdefault(m.group(1).strip().lower(), m.group(2).strip().strip('"'))
+
+    # ---- 从参数中先拆出 Model: xxx ----
+    model_name = ""
+    if full_params:
+        idx_m = full_params.find("Model:")
+        if idx_m != -1:
+            after = full_params[idx_m + len("Model:"):].lstrip()
+            end_m = after.find(",")
+            if end_m != -1:
+                model_name = after[:end_m].strip()
+                # 把 Model: 这一段从参数字符串中删掉
+                full_params = (
+                    full_params[:idx_m].rstrip(" ,") + ", " +
+                    after[end_m + 1:].lstrip()
+                ).strip(" ,")
+            else:
+                # Model: 后面一直到结尾
+                model_name = after.strip()
+                full_params = full_params[:idx_m].rstrip(" ,")
+
+    # ---- 再从剩余参数里拆出 LoRA 信息 ----
+    lora_list = []
+    params_display = full_params
+    if full_params:
+        lower = full_params.lower()
+        idx = lower.find("lora:")
+        if idx != -1:
+            cut_start = idx + len("lora:")
+            lora_part = full_params[cut_start:].strip(" ,")
+            lora_items = [s.strip() for s in lora_part.split(",") if s.strip()]
+            if lora_items:
+                lora_list = lora_items
+            params_display = full_params[:idx].rstrip(" ,")
+
+    # 提示词里的 <lora:name:weight> 也算
+    lora_names = [re.split(r'[:\s]', item, 1)[0] for item in lora_list]
+    for m in re.finditer(r'<lora:([^:>]+)', pos):
+        if m.group(1) not in lora_names:
+            lora_names.append(m.group(1))
+
+    return {
+        'source': 'a1111',
+        'positive': pos,
+        'negative': neg,
+        'model_lines': [model_name] if model_name else [],
+        'model': model_name,
+        'loras': lora_list,
+        'lora_names': lora_names,
+        'params': {},
+        'params_text': params_display,
+        'seed': _as_number(kv.get('seed')),
+        'steps': _as_number(kv.get('steps')),
+        'cfg': _as_number(kv.get('cfg scale')),
+        'sampler': kv.get('sampler', ""),
+        'scheduler': kv.get('schedule type', ""),
+    }
 
-# --- 自定义滚轮行为的图片滚动区域：在图片区域用滚轮切图 ---
-class ImageScrollArea(QScrollArea):
-    def __init__(self, owner=None, parent=None):
-        super().__init__(parent)
-        self.owner = owner  # MainWindow
 
-    def wheelEvent(self, event):
-        if self.owner and self.owner.stacked_widget.currentIndex() == 1:
-            delta = event.angleDelta().y()
-            if delta > 0:
-                self.owner.show_prev_image()
-            elif delta < 0:
-                self.owner.show_next_image()
-            event.accept()
+def extract_generation_info(info):
+    """
+    从 PIL 的 img.info 提取生成信息：
+    - ComfyUI JSON（info['prompt']）
+    - A1111 'parameters' 文本
+    返回结构化记录；没有生成信息时 source 为 ''，ComfyUI 解析失败时 error 为 True
+    """
+    if 'prompt' in info:
+        try:
+            return parse_comfy_prompt(info['prompt'])
+        except Exception:
+            return {'source': 'comfy', 'error': True}
+    if 'parameters' in info:
+        return parse_a1111_parameters(info['parameters'])
+    return {'source': ''}
+
+
+# ---------- JPEG / WebP：只读 EXIF / XMP 段，不解码像素 ----------
+EXIF_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 7: 1, 9: 4, 10: 8}
+XMP_TEXT_RES = [
+    re.compile(r'<exif:UserComment>(.*?)</exif:UserComment>', re.S),
+    re.compile(r'exif:UserComment="([^"]*)"'),
+    re.compile(r'<dc:description>(.*?)</dc:description>', re.S),
+    re.compile(r'dc:description="([^"]*)"'),
+]
+
+
+def _read_ifd(tiff, offset, endian):
+    """读一个 IFD，返回 {tag: 原始值 bytes}"""
+    entries = {}
+    if offset + 2 > len(tiff):
+        return entries
+    count = struct.unpack_from(endian + "H", tiff, offset)[0]
+    for i in range(count):
+        pos = offset + 2 + i * 12
+        if pos + 12 > len(tiff):
+            break
+        tag, typ, n = struct.unpack_from(endian + "HHI", tiff, pos)
+        size = EXIF_TYPE_SIZES.get(typ, 1) * n
+        if size <= 4:
+            entries[tag] = tiff[pos + 8:pos + 8 + size]
         else:
-            super().wheelEvent(event)
-
+            start = struct.unpack_from(endian + "I", tiff, pos + 8)[0]
+            entries[tag] = tiff[start:start + size]
+    return entries
 
-class MainWindow(QMainWindow):
-    def __init__(self):
-        super().__init__()
-        self.settings = QSettings("AI_Tools", "AI_ImageViewer_Basic")
-        self.lang = self.settings.value("language", "en", type=str)
-        self.dark_mode = self.settings.value("theme", False, type=bool)
-        self.sort_mode = self.settings.value("sort_mode", "name_natural", type=str)
 
-        self.setWindowTitle("AI Image Viewer Basic v1.1.0")
-        self.resize(1300, 850)
-        self.setAcceptDrops(True)
+def decode_user_comment(raw):
+    """EXIF UserComment：前 8 字节是编码标记，A1111 / Forge 写的是 UNICODE（UTF-16）"""
+    code, data = raw[:8], raw[8:]
+    if code.startswith(b"UNICODE"):
+        if len(data) >= 2 and data[:2] in (b"\xff\xfe", b"\xfe\xff"):
+            text = data.decode("utf-16", errors="replace")
+        else:
+            # 没有 BOM 时看高位字节落在偶数位还是奇数位来判断字节序
+            even_zero = data[0::2].count(0)
+            odd_zero = data[1::2].count(0)
+            text = data.decode("utf-16-be" if even_zero >= odd_zero else "utf-16-le", errors="replace")
+    elif code.startswith(b"ASCII") or code == b"\0" * 8:
+        text = data.decode("utf-8", errors="replace")
+    else:
+        text = raw.decode("utf-8", errors="replace")
+    return text.rstrip("\0").strip()
+
+
+def _put_text(info, text, prefixed_only=False):
+    """
+    把一段文字放进 img.info 风格的字典：带 prompt:/workflow: 前缀的是 ComfyUI，其它当 parameters。
+    prefixed_only 时只认带前缀的（Make / Model 这类标签在普通相机照片里就是厂商和型号）
+    """
+    if not text:
+        return
+    head = text[:9].lower()
+    if head.startswith("prompt:"):
+        info.setdefault('prompt', text[7:].strip())
+    elif head.startswith("workflow:"):
+        info.setdefault('workflow', text[9:].strip())
+    elif prefixed_only:
+        return
+    elif text.startswith("{"):
+        try:
+            data = json.loads(text)
+        except ValueError:
+            info.setdefault('parameters', text)
+            return
+        if isinstance(data, dict) and any(isinstance(v, dict) and 'class_type' in v for v in data.values()):
+            info.setdefault('prompt', text)
+    else:
+        info.setdefault('parameters', text)
+
+
+def parse_exif_block(data, info):
+    if data.startswith(b"Exif\0\0"):
+        data = data[6:]
+    if data[:2] == b"II":
+        endian = "<"
+    elif data[:2] == b"MM":
+        endian = ">"
+    else:
+        return
+    ifd0 = _read_ifd(data, struct.unpack_from(endian + "I", data, 4)[0], endian)
+    exif_ptr = ifd0.get(0x8769)
+    if exif_ptr and len(exif_ptr) == 4:
+        exif_ifd = _read_ifd(data, struct.unpack_from(endian + "I", exif_ptr)[0], endian)
+        if 0x9286 in exif_ifd:
+            _put_text(info, decode_user_comment(exif_ifd[0x9286]))
+    # ComfyUI 存 WebP 时把 prompt / workflow 写进 Make(0x010F)、Model(0x0110) 等字符串标签
+    for tag in (0x0110, 0x010F, 0x010E):
+        if tag in ifd0:
+            _put_text(info, ifd0[tag].decode("utf-8", errors="replace").rstrip("\0").strip(), prefixed_only=True)
+
+
+def parse_xmp_block(data, info):
+    text = data.decode("utf-8", errors="replace")
+    for regex in XMP_TEXT_RES:
+        m = regex.search(text)
+        if not m:
+            continue
+        value = m.group(1)
+        li = re.search(r'<rdf:li[^>]*>(.*?)</rdf:li>', value, re.S)
+        if li:
+            value = li.group(1)
+        _put_text(info, html.unescape(value).strip())
+        return
+
+
+def _read_jpeg_metadata(f, info):
+    if f.read(2) != b"\xff\xd8":
+        return None
+    size = None
+    while True:
+        byte = f.read(1)
+        if not byte:
+            break
+        if byte != b"\xff":
+            continue
+        marker = f.read(1)
+        while marker == b"\xff":
+            marker = f.read(1)
+        if not marker:
+            break
+        m = marker[0]
+        if m in (0x01,) or 0xD0 <= m <= 0xD7:
+            continue
+        if m in (0xD9, 0xDA):     # EOI / SOS 之后就是像素数据
+            break
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            break
+        length = struct.unpack(">H", length_bytes)[0] - 2
+        if m == 0xE1:
+            payload = f.read(length)
+            if payload.startswith(b"Exif\0\0"):
+                parse_exif_block(payload, info)
+            elif payload.startswith(b"http://ns.adobe.com/xap/1.0/\0"):
+                parse_xmp_block(payload[29:], info)
+        elif 0xC0 <= m <= 0xCF and m not in (0xC4, 0xC8, 0xCC):
+            payload = f.read(length)
+            if len(payload) >= 5:
+                h, w = struct.unpack_from(">HH", payload, 1)
+                size = (w, h)
+            break
+        else:
+            f.seek(length, os.SEEK_CUR)
+    return size
+
+
+def _read_webp_metadata(f, info):
+    header = f.read(12)
+    if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WEBP":
+        return None
+    size = None
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            break
+        fourcc, length = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+        padded = length + (length & 1)
+        if fourcc == b"VP8X":
+            data = f.read(padded)
+            if len(data) >= 10:
+                size = (int.from_bytes(data[4:7], "little") + 1, int.from_bytes(data[7:10], "little") + 1)
+        elif fourcc in (b"VP8 ", b"VP8L") and size is None:
+            data = f.read(min(padded, 16))
+            f.seek(padded - len(data), os.SEEK_CUR)
+            if fourcc == b"VP8 " and len(data) >= 10 and data[3:6] == b"\x9d\x01\x2a":
+                w, h = struct.unpack_from("<HH", data, 6)
+                size = (w & 0x3FFF, h & 0x3FFF)
+            elif fourcc == b"VP8L" and len(data) >= 5 and data[0] == 0x2F:
+                bits = int.from_bytes(data[1:5], "little")
+                size = ((bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1)
+        elif fourcc == b"EXIF":
+            parse_exif_block(f.read(padded)[:length], info)
+        elif fourcc == b"XMP ":
+            parse_xmp_block(f.read(padded)[:length], info)
+        else:
+            f.seek(padded, os.SEEK_CUR)
+    return size
+
+
+def read_container_metadata(path):
+    """
+    JPEG / WebP 的生成信息在 EXIF UserComment 或 XMP 里（PNG 才有文本块）。
+    只按段 / chunk 跳读，返回 (img.info 风格的字典, (w, h) 或 None)
+    """
+    info = {}
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, "rb") as f:
+        if ext in ('.jpg', '.jpeg'):
+            size = _read_jpeg_metadata(f, info)
+        elif ext == '.webp':
+            size = _read_webp_metadata(f, info)
+        else:
+            size = None
+    return info, size
+
+
+def embedded_info(path, info):
+    """PIL 的 img.info 里没有生成信息时，补上 EXIF / XMP 里的"""
+    if 'prompt' in info or 'parameters' in info:
+        return info
+    if not path.lower().endswith(('.jpg', '.jpeg', '.webp')):
+        return info
+    try:
+        extra, _ = read_container_metadata(path)
+    except (OSError, struct.error, ValueError):
+        return info
+    if not extra:
+        return info
+    merged = dict(info)
+    merged.update(extra)
+    return merged
+
+
+def natural_key(path):
+    basename = os.path.basename(path).lower()
+    return [int(text) if text.isdigit() else text for text in re.split(r'(\d+)', basename)]
+
+
+def app_data_dir():
+    """索引 / 缓存文件目录（与 QSettings 同名的 AI_Tools/AI_ImageViewer_Basic）"""
+    base = (
+        os.environ.get("LOCALAPPDATA")
+        or os.environ.get("XDG_DATA_HOME")
+        or os.path.join(os.path.expanduser("~"), ".local", "share")
+    )
+    path = os.path.join(base, "AI_Tools", "AI_ImageViewer_Basic")
+    os.makedirs(path, exist_ok=True)
+    return path
 
-        self.loader_thread = None
-        self.current_image_path = None
-        self.current_file_list = []
-        self.current_index = -1
-        self.current_pos_text = ""
-        self.current_neg_text = ""
-        self.last_html = ""
 
-        # 网格相关参数：高度固定，最小宽度，用来做自适应铺满
-        self.grid_item_height = 260
-        self.grid_item_min_width = 220  # 最小宽度
+# ==========================================
+# --- 文件访问 / I/O 调度（NAS、SMB 等慢速存储） ---
+# ==========================================
+class LocalFS:
+    """本地文件访问；DelayedFS 在它上面加延迟，用来在本机模拟 NAS / SMB"""
+    def open(self, path):
+        return open(path, "rb")
 
+    def stat(self, path):
+        return os.stat(path)
 
+    def scandir(self, path):
+        return os.scandir(path)
 
-        self.central_widget = QWidget()
-        self.setCentralWidget(self.central_widget)
-        self.main_layout = QVBoxLayout(self.central_widget)
-        self.main_layout.setContentsMargins(0, 0, 0, 0)
-        self.main_layout.setSpacing(0)
 
-        self.setup_toolbar()
-        self.stacked_widget = QStackedWidget()
-        self.main_layout.addWidget(self.stacked_widget)
-        self.setup_grid_view()
-        self.setup_detail_view()
-        self.setup_toast()
+class _DelayedFile:
+    """每次 read 都付一次往返延迟 + 传输时间（PIL 分很多小块读，慢速存储上正是这里慢）"""
+    def __init__(self, f, fs):
+        self.f = f
+        self.fs = fs
 
-        self.apply_style()
-        self.update_ui_text()
-        self.setup_shortcuts()  # 全局快捷键
+    def read(self, n=-1):
+        data = self.f.read(n)
+        self.fs.wait(len(data))
+        return data
 
-    # ---------- Toast ----------
-    def setup_toast(self):
-        self.toast_label = QLabel(self)
-        self.toast_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.toast_label.setStyleSheet(f"""
-            QLabel {{
-                background-color: rgba(40, 40, 40, 0.9);
-                color: white;
-                padding: 8px 16px;
-                border-radius: 6px;
-                font-family: {NativeTheme.FONT_FAMILY};
-                font-size: 14px;
-                font-weight: 500;
-            }}
-        """)
-        self.toast_label.hide()
+    def seek(self, offset, whence=os.SEEK_SET):
+        return self.f.seek(offset, whence)
 
-    def show_toast(self, message):
-        self.toast_label.setText(message)
-        self.toast_label.adjustSize()
-        x = (self.width() - self.toast_label.width()) // 2
-        y = self.height() - 100
-        self.toast_label.move(x, y)
-        self.toast_label.show()
-        self.toast_label.raise_()
-        QTimer.singleShot(2000, self.toast_label.hide)
+    def tell(self):
+        return self.f.tell()
 
-    # ---------- i18n ----------
-    def tr(self, key):
-        return TRANSLATIONS[self.lang].get(key, key)
+    def close(self):
+        self.f.close()
 
-    # ---------- Toolbar ----------
-    def setup_toolbar(self):
-        self.toolbar = QToolBar()
-        self.toolbar.setIconSize(QSize(20, 20))
-        self.toolbar.setMovable(False)
-        self.toolbar.setToolButtonStyle(Qt.ToolButtonStyle.ToolButtonTextBesideIcon)
-        self.addToolBar(self.toolbar)
+    def __enter__(self):
+        return self
 
-        # 左侧：打开图片 / 文件夹
-        self.action_file = QAction(self.tr('open_file'), self)
-        self.action_file.setIcon(create_emoji_icon("📄"))
-        self.action_file.triggered.connect(self.open_files_dialog)
-        self.toolbar.addAction(self.action_file)
+    def __exit__(self, *exc):
+        self.close()
 
-        self.action_folder = QAction(self.tr('open_folder'), self)
-        self.action_folder.setIcon(create_emoji_icon("📂"))
-        self.action_folder.triggered.connect(self.open_folder_dialog)
-        self.toolbar.addAction(self.action_folder)
 
-        self.toolbar.addSeparator()
+class DelayedFS(LocalFS):
+    """模拟慢速存储：每个 open / stat / scandir / read 都有 latency_ms 的往返延迟"""
+    def __init__(self, latency_ms=5.0, bandwidth_mb=100.0):
+        self.latency = latency_ms / 1000.0
+        self.bandwidth = bandwidth_mb * 1024 * 1024
 
-        # 网格视图（返回）
-        self.back_action = QAction(self.tr('back'), self)
-        self.back_action.setIcon(create_emoji_icon("🔙"))
-        self.back_action.triggered.connect(self.show_grid)
-        self.back_action.setEnabled(False)
-        self.toolbar.addAction(self.back_action)
+    def wait(self, nbytes=0):
+        time.sleep(self.latency + nbytes / self.bandwidth)
 
+    def open(self, path):
+        self.wait()
+        return _DelayedFile(open(path, "rb"), self)
 
+    def stat(self, path):
+        self.wait()
+        return os.stat(path)
 
-        # 删除图片按钮
-        self.action_delete = QAction(self.tr('delete'), self)
-        self.action_delete.setIcon(create_emoji_icon("🗑", color="#ff4d4f"))
-        self.action_delete.triggered.connect(self.delete_current_image)
-        self.toolbar.addAction(self.action_delete)
+    def scandir(self, path):
+        # 一次列目录请求就带回所有条目的属性（SMB / Windows 上就是这样）
+        self.wait()
+        return os.scandir(path)
+
+
+LOCAL_FS = LocalFS()
+
+
+class IOScheduler:
+    """
+    共享的 I/O 线程池：
+    - imap() 按顺序返回结果，但同时最多有 concurrency 个请求在路上（顺序预读）
+    - read_file() 把小文件一次整读进内存，解码时不再一小块一小块地走网络
+    所有加载线程共用同一个池子，总并发有上限；concurrency 可以随时改，下一次补位时生效。
+    """
+    MAX_WORKERS = 16
+
+    def __init__(self, concurrency=2, read_ahead_bytes=8 * 1024 * 1024, fs=None):
+        self.concurrency = concurrency
+        self.read_ahead_bytes = read_ahead_bytes
+        self.fs = fs or LOCAL_FS
+        self.pool = ThreadPoolExecutor(max_workers=self.MAX_WORKERS, thread_name_prefix="io")
+
+    def read_file(self, path, size=None):
+        """小文件整读；超过 read_ahead_bytes 的返回 None，由调用方直接流式打开"""
+        if size is not None and size > self.read_ahead_bytes:
+            return None
+        with self.fs.open(path) as f:
+            data = f.read(self.read_ahead_bytes + 1)
+        if len(data) > self.read_ahead_bytes:
+            return None
+        return data
+
+    def imap(self, func, items, should_stop=None):
+        """有序、有界的并发 map：产出 (item, 结果或 None)；生成器关闭时取消还没开始的请求"""
+        items = iter(items)
+        pending = deque()
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(pending) < max(1, self.concurrency):
+                    try:
+                        item = next(items)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending.append((item, self.pool.submit(func, item)))
+                if not pending:
+                    return
+                if should_stop is not None and should_stop():
+                    return
+                item, future = pending.popleft()
+                try:
+                    result = future.result()
+                except Exception:
+                    result = None
+                yield item, result
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+# 任务优先级：数字越小越先做
+JOB_USER = 0        # 当前详情图
+JOB_VIEWPORT = 1    # 视口里的缩略图
+JOB_PREFETCH = 2    # 相邻图预取、悬停解析
+JOB_IDLE = 3        # 精修缩略图、相似图哈希等空闲任务
+
+
+class _Job:
+    __slots__ = ("priority", "key", "future", "func", "args")
+
+    def __init__(self, priority, key, func, args):
+        self.priority = priority
+        self.key = key
+        self.future = Future()
+        self.func = func
+        self.args = args
+
+
+class JobScheduler(QObject):
+    """
+    共享的 CPU 任务调度器：解码、解析、哈希都在这里排队，按优先级取任务，同级先进先出。
+    - 同一个 key（如 ('display', path, w, h)）在排队或正在跑时只保留一份：重复提交共用同一个 Future，
+      还在排队的优先级取高的
+    - workers 是同时占用 CPU 的线程数上限（设置 cpu_workers，启动时读取），给同一台机器上的生成任务留出余量
+    - 还没开始的任务可以 cancel；已经开始的跑完后由调用方按请求号丢弃结果
+    """
+    delivered = pyqtSignal(object, object)      # callback, result：回到界面线程里调用
+
+    def __init__(self, workers=2):
+        super().__init__()
+        self.workers = max(1, workers)
+        self.cond = threading.Condition()
+        self.heap = []          # (priority, seq, job)；提升优先级时重新入堆，旧条目出堆时跳过
+        self.pending = {}       # key -> 还在排队或正在跑的 job
+        self.seq = 0
+        self.active = 0
+        self.threads = []
+        self.closed = False
+        self.delivered.connect(lambda callback, result: callback(result))
+        self._spawn()
+
+    def _spawn(self):
+        while len(self.threads) < self.workers:
+            thread = threading.Thread(target=self._work, name=f"job-{len(self.threads)}", daemon=True)
+            self.threads.append(thread)
+            thread.start()
+
+    def submit(self, priority, key, func, *args):
+        """排一个任务，返回 Future；key 为 None 时不去重"""
+        with self.cond:
+            job = self.pending.get(key) if key is not None else None
+            if job is not None and not job.future.cancelled():
+                if priority < job.priority and not job.future.running():
+                    job.priority = priority
+                    self._push(job)
+                    self.cond.notify()
+                return job.future
+            job = _Job(priority, key, func, args)
+            if self.closed:
+                job.future.cancel()
+                return job.future
+            if key is not None:
+                self.pending[key] = job
+            self._push(job)
+            self.cond.notify()
+            return job.future
+
+    def _push(self, job):
+        self.seq += 1
+        heapq.heappush(self.heap, (job.priority, self.seq, job))
+
+    def _work(self):
+        while True:
+            with self.cond:
+                while not self.closed and (not self.heap or self.active >= self.workers):
+                    self.cond.wait()
+                if self.closed:
+                    return
+                priority, _, job = heapq.heappop(self.heap)
+                if priority != job.priority:
+                    continue
+                if not job.future.set_running_or_notify_cancel():
+                    self._forget(job)
+                    continue
+                self.active += 1
+            try:
+                job.future.set_result(job.func(*job.args))
+            except BaseException as e:
+                job.future.set_exception(e)
+            finally:
+                with self.cond:
+                    self.active -= 1
+                    self._forget(job)
+                    self.cond.notify()
+
+    def _forget(self, job):
+        """任务跑完 / 被取消后才从去重表里移除，跑的过程中重复提交不会再解一遍"""
+        if job.key is not None and self.pending.get(job.key) is job:
+            del self.pending[job.key]
+
+    def deliver(self, future, callback, on_error=None):
+        """任务成功完成后在界面线程里调用 callback(result)，出错时调用 on_error(异常)（没给就不回调）；被取消的不回调"""
+        def done(f):
+            if self.closed or f.cancelled():
+                return
+            error = f.exception()
+            if error is None:
+                self.delivered.emit(callback, f.result())
+            elif on_error is not None:
+                self.delivered.emit(on_error, error)
+        future.add_done_callback(done)
+
+    def imap(self, priority, func, items, should_stop=None):
+        """
+        有序、有界的 map（给后台线程用，会阻塞等待）：同时最多 workers + 1 个任务在路上，
+        产出 (item, 结果或 None)。priority 可以是函数，每次提交时取值（后台标签页会降级）。
+        """
+        items = iter(items)
+        pending = deque()
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(pending) <= self.workers:
+                    try:
+                        item = next(items)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    prio = priority() if callable(priority) else priority
+                    pending.append((item, self.submit(prio, None, func, item)))
+                if not pending:
+                    return
+                if should_stop is not None and should_stop():
+                    return
+                item, future = pending.popleft()
+                try:
+                    result = future.result()
+                except Exception:
+                    result = None
+                yield item, result
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    def shutdown(self):
+        with self.cond:
+            self.closed = True
+            for _, _, job in self.heap:
+                job.future.cancel()
+            self.heap.clear()
+            self.pending.clear()
+            self.cond.notify_all()
+
+
+def iter_folder(folder_path, fs=None):
+    """逐个产出 (path, (size, mtime))；scandir 顺带拿到属性（Windows 上不需要额外 stat）"""
+    with (fs or LOCAL_FS).scandir(folder_path) as it:
+        for entry in it:
+            if not entry.name.lower().endswith(VALID_EXTENSIONS):
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+            except OSError:
+                continue
+            yield os.path.normpath(entry.path), (st.st_size, st.st_mtime)
 
-        # 中间空白撑开
-        empty = QWidget()
-        empty.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Preferred)
-        self.toolbar.addWidget(empty)
 
-        # 右侧：语言 (QMenu) / 主题 / 清空列表
-        from PyQt6.QtWidgets import QMenu, QToolButton
+def scan_folder(folder_path, fs=None):
+    """用 scandir 列目录，返回 {path: (size, mtime)}"""
+    return dict(iter_folder(folder_path, fs))
 
-        self.lang_action = QAction(self.tr('lang_btn'), self)
-        self.lang_action.setIcon(create_emoji_icon("🌐"))
-        
-        # 创建菜单
-        self.lang_menu = QMenu(self)
-        
-        langs = [
-            ('English', 'en'),
-            ('简体中文', 'cn'),
-            ('繁體中文', 'tc'),
-            ('日本語', 'jp'),
-            ('한국어', 'kr')
-        ]
-        
-        for label, code in langs:
-            action = QAction(label, self)
-            action.triggered.connect(lambda checked, c=code: self.set_language(c))
-            self.lang_menu.addAction(action)
 
-        self.toolbar.addAction(self.lang_action)
-        
-        # 将 action 对应的 widget 设置为弹出菜单模式
-        widget = self.toolbar.widgetForAction(self.lang_action)
-        if isinstance(widget, QToolButton):
-            widget.setMenu(self.lang_menu)
-            widget.setPopupMode(QToolButton.ToolButtonPopupMode.InstantPopup)
+STAT_BATCH_MIN = 8      # 同一目录下要 stat 的文件达到这个数，就改成列一次目录
 
-        self.theme_action = QAction(self.tr('theme'), self)
-        self.theme_action.setIcon(create_emoji_icon("🌗"))
-        self.theme_action.triggered.connect(self.toggle_theme)
-        self.toolbar.addAction(self.theme_action)
 
-        # 清空列表：最右侧，用红色图标
-        self.action_clear = QAction(self.tr('clear'), self)
-        self.action_clear.setIcon(create_emoji_icon("🧹", color="#ff4d4f"))
-        self.action_clear.triggered.connect(self.clear_all)
-        self.toolbar.addAction(self.action_clear)
+def stat_files(paths, fs=None):
+    """批量取 size / mtime：同目录的文件多时用一次 scandir 代替逐个 stat"""
+    fs = fs or LOCAL_FS
+    by_dir = {}
+    for p in paths:
+        by_dir.setdefault(os.path.dirname(p), []).append(p)
+    entries = {}
+    for folder, group in by_dir.items():
+        if len(group) >= STAT_BATCH_MIN:
+            wanted = {os.path.basename(p): p for p in group}
+            try:
+                with fs.scandir(folder or ".") as it:
+                    for entry in it:
+                        p = wanted.get(entry.name)
+                        if p is None:
+                            continue
+                        try:
+                            st = entry.stat()
+                        except OSError:
+                            continue
+                        entries[p] = (st.st_size, st.st_mtime)
+                continue
+            except OSError:
+                pass
+        for p in group:
+            try:
+                st = fs.stat(p)
+            except OSError:
+                continue
+            entries[p] = (st.st_size, st.st_mtime)
+    return entries
+
+
+class MetadataIndex:
+    """
+    元数据索引：SQLite（WAL 模式），按 path + mtime 缓存每张图的解析结果和尺寸。
+    每个线程用 connect() 拿自己的连接；WAL 下读者不会阻塞写者。
+    """
+    COLUMNS = ("path", "mtime", "size", "width", "height", "seed", "steps", "cfg",
+               "model", "lora", "sampler", "scheduler", "record")
+    # 解析逻辑变化时加一，旧版本留下的记录会被清空重建
+    # （3 只是多了 file_loras 表，从 2 升级时直接用已有记录补上，不重新解析）
+    RECORD_VERSION = 4
+    # 查询接口能输出的字段；prompt 文本比较长，默认不带
+    QUERY_FIELDS = ("path", "width", "height", "model", "loras", "seed", "steps", "cfg",
+                    "sampler", "scheduler", "positive", "negative")
+    DEFAULT_QUERY_FIELDS = QUERY_FIELDS[:-2]
+    NUMERIC_COLUMNS = ("seed", "steps", "cfg", "width", "height")
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.path.join(app_data_dir(), "metadata.db")
+
+    def connect(self, readonly=False):
+        if readonly:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, timeout=10)
+            return conn
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY, mtime REAL, size INTEGER, width INTEGER, height INTEGER,"
+            " seed REAL, steps REAL, cfg REAL, model TEXT, lora TEXT, sampler TEXT, scheduler TEXT,"
+            " record TEXT)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS image_hashes ("
+            " path TEXT PRIMARY KEY, mtime REAL, size INTEGER,"
+            " ahash INTEGER, dhash INTEGER, phash INTEGER)"
+        )
+        # 每张图用到的所有 LoRA（files.lora 只存第一个），按 LoRA 查时走索引
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS file_loras ("
+            " lora TEXT COLLATE NOCASE, path TEXT, PRIMARY KEY (lora, path)) WITHOUT ROWID"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS file_loras_path ON file_loras (path)")
+        conn.execute("CREATE INDEX IF NOT EXISTS files_model ON files (model COLLATE NOCASE)")
+        for column in ("seed", "steps", "cfg", "sampler"):
+            conn.execute(f"CREATE INDEX IF NOT EXISTS files_{column} ON files ({column})")
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < self.RECORD_VERSION:
+            try:
+                if version < 2:
+                    raise sqlite3.OperationalError("records need re-parsing")
+                if version == 2:
+                    conn.execute(
+                        "INSERT OR IGNORE INTO file_loras (lora, path)"
+                        " SELECT j.value, files.path FROM files, json_each(files.record, '$.lora_names') AS j")
+                # v4：JPEG / WebP 的 Make / Model 曾被当成 A1111 参数，这些记录重新解析（只读文件头，很快）
+                stale = ("SELECT path FROM files WHERE lower(path) LIKE '%.jpg'"
+                         " OR lower(path) LIKE '%.jpeg' OR lower(path) LIKE '%.webp'")
+                conn.execute(f"DELETE FROM file_loras WHERE path IN ({stale})")
+                conn.execute(f"DELETE FROM files WHERE path IN ({stale})")
+            except sqlite3.OperationalError:
+                conn.execute("DELETE FROM files")
+                conn.execute("DELETE FROM file_loras")
+            conn.execute(f"PRAGMA user_version={self.RECORD_VERSION}")
+            conn.commit()
+        return conn
+
+    @staticmethod
+    def lookup(conn, stats):
+        """stats: {path: (size, mtime)}，返回 mtime/size 都没变的缓存记录 {path: record}"""
+        found = {}
+        paths = list(stats.keys())
+        for start in range(0, len(paths), 900):
+            chunk = paths[start:start + 900]
+            marks = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT path, mtime, size, record FROM files WHERE path IN ({marks})", chunk)
+            for path, mtime, size, record in rows:
+                st = stats.get(path)
+                if st and st[0] == size and abs(st[1] - mtime) < 1e-6:
+                    try:
+                        found[path] = json.loads(record)
+                    except ValueError:
+                        continue
+        return found
+
+    @staticmethod
+    def store(conn, rows):
+        """rows: [(path, size, mtime, record)]"""
+        values = []
+        for path, size, mtime, rec in rows:
+            loras = rec.get('lora_names') or []
+            values.append((
+                path, mtime, size, rec.get('width'), rec.get('height'),
+                rec.get('seed'), rec.get('steps'), rec.get('cfg'),
+                rec.get('model') or None, loras[0] if loras else None,
+                rec.get('sampler') or None, rec.get('scheduler') or None,
+                json.dumps(rec, ensure_ascii=False),
+            ))
+        lora_rows = [(name, path) for path, _, _, rec in rows for name in rec.get('lora_names') or []]
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO files (path, mtime, size, width, height, seed, steps, cfg,"
+                " model, lora, sampler, scheduler, record) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                values,
+            )
+            conn.executemany("DELETE FROM file_loras WHERE path = ?", [(row[0],) for row in rows])
+            conn.executemany("INSERT OR IGNORE INTO file_loras (lora, path) VALUES (?, ?)", lora_rows)
+
+    @staticmethod
+    def parse_condition(text):
+        """'cfg>7' / 'steps<=30' / 'seed=123' -> (列名, 运算符, 数值)；写错了抛 ValueError"""
+        m = re.fullmatch(r"\s*(\w+)\s*(<=|>=|!=|=|<|>)\s*(-?[\d.]+)\s*", text)
+        if not m or m.group(1).lower() not in MetadataIndex.NUMERIC_COLUMNS:
+            raise ValueError(f"bad condition: {text!r} (use e.g. cfg>7, steps<=30, seed=123)")
+        return m.group(1).lower(), m.group(2), float(m.group(3))
+
+    @staticmethod
+    def query(conn, model=None, lora=None, sampler=None, scheduler=None, conditions=(),
+              folder=None, paths=None, after=None, limit=None, fields=None):
+        """
+        按条件查索引，按 path 顺序逐条产出 {字段: 值}（不一次性读进内存）。
+        文本条件不分大小写，带 * 时按通配符匹配；conditions 是 parse_condition 的结果；
+        after 是上一页最后一条的 path（键集分页）；paths 给定时只在这些路径里查。
+        """
+        fields = fields or MetadataIndex.DEFAULT_QUERY_FIELDS
+        where, args = [], []
+        for column, value in (("model", model), ("sampler", sampler), ("scheduler", scheduler)):
+            if value:
+                if "*" in value:
+                    where.append(f"f.{column} LIKE ? ESCAPE '\\'")
+                    args.append(MetadataIndex.like_pattern(value))
+                else:
+                    where.append(f"f.{column} = ? COLLATE NOCASE")
+                    args.append(value)
+        if lora:
+            if "*" in lora:
+                where.append("f.path IN (SELECT path FROM file_loras WHERE lora LIKE ? ESCAPE '\\')")
+                args.append(MetadataIndex.like_pattern(lora))
+            else:
+                where.append("f.path IN (SELECT path FROM file_loras WHERE lora = ?)")
+                args.append(lora)
+        for column, op, value in conditions:
+            where.append(f"f.{column} {op} ?")
+            args.append(value)
+        if folder:
+            prefix = os.path.join(os.path.normpath(folder), "")
+            where.append("f.path >= ? AND f.path < ?")
+            args += [prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)]
+        if after:
+            where.append("f.path > ?")
+            args.append(after)
+
+        sql = ("SELECT f.path, f.width, f.height, f.seed, f.steps, f.cfg, f.model, f.sampler, f.scheduler,"
+               " f.record FROM files f WHERE " + (" AND ".join(where) or "1"))
+        if paths is None:
+            chunks = [None]
+        else:
+            ordered = sorted(set(paths))
+            chunks = [ordered[i:i + 900] for i in range(0, len(ordered), 900)]
+        remaining = limit
+        for chunk in chunks:
+            chunk_sql, chunk_args = sql, list(args)
+            if chunk is not None:
+                chunk_sql += f" AND f.path IN ({','.join('?' * len(chunk))})"
+                chunk_args += chunk
+            chunk_sql += " ORDER BY f.path"
+            if remaining is not None:
+                chunk_sql += " LIMIT ?"
+                chunk_args.append(remaining)
+            for row in conn.execute(chunk_sql, chunk_args):
+                yield MetadataIndex.query_row(row, fields)
+                if remaining is not None:
+                    remaining -= 1
+            if remaining is not None and remaining <= 0:
+                return
 
-    # ---------- Grid View ----------
-    def setup_grid_view(self):
-        self.grid_page = QWidget()
-        layout = QVBoxLayout(self.grid_page)
-        layout.setContentsMargins(10, 10, 10, 0)
+    @staticmethod
+    def like_pattern(value):
+        """* 通配符转成 LIKE 模式：先转义 LIKE 自己的 %、_ 和转义符（LoRA 名里常有下划线），配合 ESCAPE '\\' 用"""
+        escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        return escaped.replace("*", "%")
+
+    @staticmethod
+    def query_row(row, fields):
+        path, width, height, seed, steps, cfg, model, sampler, scheduler, record = row
+        # 列里的 seed 是 REAL，超过 2^53 会丢精度，记录 JSON 里的才是原值
+        needs_record = any(f in fields for f in ("loras", "seed", "positive", "negative"))
+        try:
+            rec = json.loads(record) if needs_record and record else {}
+        except ValueError:
+            rec = {}
+        whole = lambda v: int(v) if isinstance(v, float) and v.is_integer() else v
+        values = {
+            "path": path, "width": width, "height": height, "model": model or "",
+            "loras": rec.get('lora_names') or [], "seed": whole(rec.get('seed', seed)),
+            "steps": whole(steps), "cfg": cfg,
+            "sampler": sampler or "", "scheduler": scheduler or "",
+            "positive": rec.get('positive') or "", "negative": rec.get('negative') or "",
+        }
+        return {f: values[f] for f in fields}
+
+    def refresh(self, stats):
+        """把 stats 里索引没有 / 已过期的文件当场解析并写回（命令行 / 查询接口用，不经过界面）"""
+        conn = self.connect()
+        try:
+            found = MetadataIndex.lookup(conn, stats)
+            rows = []
+            for path, (size, mtime) in stats.items():
+                if path in found:
+                    continue
+                try:
+                    record = read_image_record(path)
+                except Exception:
+                    record = dict(UNREADABLE_RECORD)
+                rows.append((path, size, mtime, record))
+                if len(rows) >= MetadataIndexer.BATCH_SIZE:
+                    MetadataIndex.store(conn, rows)
+                    rows = []
+            if rows:
+                MetadataIndex.store(conn, rows)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def lookup_hashes(conn, stats):
+        """返回 path + mtime 仍然有效的感知哈希 {path: (ahash, dhash, phash)}"""
+        found = {}
+        paths = list(stats.keys())
+        for start in range(0, len(paths), 900):
+            chunk = paths[start:start + 900]
+            marks = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT path, mtime, size, ahash, dhash, phash FROM image_hashes WHERE path IN ({marks})",
+                chunk)
+            for path, mtime, size, a, d, p in rows:
+                st = stats.get(path)
+                if st and st[0] == size and abs(st[1] - mtime) < 1e-6:
+                    found[path] = (_from_signed64(a), _from_signed64(d), _from_signed64(p))
+        return found
+
+    @staticmethod
+    def store_hashes(conn, rows):
+        """rows: [(path, size, mtime, (ahash, dhash, phash))]"""
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO image_hashes (path, mtime, size, ahash, dhash, phash)"
+                " VALUES (?,?,?,?,?,?)",
+                [(p, mt, sz, *[_to_signed64(v) for v in h]) for p, sz, mt, h in rows],
+            )
 
-        self.hint_label = QLabel(self.tr('drag_hint'))
-        self.hint_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.hint_label.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
-        layout.addWidget(self.hint_label)
 
-        self.list_widget = GridListWidget()
-        self.list_widget.setViewMode(QListWidget.ViewMode.IconMode)
-        self.list_widget.setIconSize(QSize(220, 220))
-        self.list_widget.setResizeMode(QListWidget.ResizeMode.Adjust)
+def _to_signed64(v):
+    # SQLite 的 INTEGER 是有符号 64 位
+    return v - (1 << 64) if v >= (1 << 63) else v
 
-        # 更紧凑
-        self.list_widget.setSpacing(3)
-        self.list_widget.setUniformItemSizes(True)
-        # 单选
-        self.list_widget.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
 
-        # 初始 gridSize，高度固定，宽度先用最小值
-        self.list_widget.setGridSize(QSize(self.grid_item_min_width, self.grid_item_height))
+def _from_signed64(v):
+    return v + (1 << 64) if v < 0 else v
 
-        # 不换行 + 文本省略，避免长文件名撑高 item
-        self.list_widget.setWordWrap(False)
-        self.list_widget.setTextElideMode(Qt.TextElideMode.ElideMiddle)
 
-        self.list_widget.itemDoubleClicked.connect(self.on_thumbnail_clicked)
-        layout.addWidget(self.list_widget)
-        
-        # 初始状态：列表隐藏，显示提示文字（居中）
-        self.list_widget.hide()
-        
-        self.stacked_widget.addWidget(self.grid_page)
+# 筛选面板的维度：(facet, 翻译 key)
+FACETS = [
+    ("model", 'model'),
+    ("lora", 'lora'),
+    ("sampler", 'facet_sampler'),
+    ("scheduler", 'facet_scheduler'),
+    ("resolution", 'facet_resolution'),
+]
 
-        # 悬浮排序按钮
-        self.sort_fab = QToolButton(self.grid_page)
-        self.sort_fab.setToolButtonStyle(Qt.ToolButtonStyle.ToolButtonIconOnly)
-        self.sort_fab.setToolTip(self.tr('sort'))
-        self.sort_fab.setFixedSize(36, 36)
-        self.sort_fab.setIconSize(QSize(18, 18))
-        self.sort_fab.setCursor(Qt.CursorShape.PointingHandCursor)
-        self.sort_fab.setFocusPolicy(Qt.FocusPolicy.NoFocus)
-        self.sort_fab.setObjectName("sort_fab")
 
-        self.sort_menu = QMenu(self)
-        self.sort_group = QActionGroup(self)
-        self.sort_name_action = QAction(self.tr('sort_name'), self, checkable=True)
-        self.sort_mtime_action = QAction(self.tr('sort_mtime'), self, checkable=True)
-        self.sort_group.addAction(self.sort_name_action)
-        self.sort_group.addAction(self.sort_mtime_action)
+def record_facet_values(record):
+    """一条元数据记录在各个筛选维度上的取值 {facet: (value, ...)}"""
+    models = []
+    for line in record.get('model_lines') or []:
+        for prefix in ("Checkpoint: ", "Diffusion Model: "):
+            if line.startswith(prefix):
+                line = line[len(prefix):]
+                break
+        models.append(line)
+    w, h = record.get('width'), record.get('height')
+    return {
+        "model": tuple(dict.fromkeys(models)),
+        "lora": tuple(dict.fromkeys(record.get('lora_names') or [])),
+        "sampler": (record['sampler'],) if record.get('sampler') else (),
+        "scheduler": (record['scheduler'],) if record.get('scheduler') else (),
+        "resolution": (f"{w}×{h}",) if w and h else (),
+    }
+
+
+class FacetAggregator:
+    """各筛选维度的计数，随元数据记录增量加减，不需要重新扫描"""
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counts = {facet: Counter() for facet, _ in FACETS}
+        self.values_of = {}     # path -> {facet: (value, ...)}
+
+    def add(self, path, record):
+        self.remove(path)
+        values = record_facet_values(record)
+        self.values_of[path] = values
+        for facet, vals in values.items():
+            self.counts[facet].update(vals)
+
+    def remove(self, path):
+        values = self.values_of.pop(path, None)
+        if values is None:
+            return
+        for facet, vals in values.items():
+            counter = self.counts[facet]
+            counter.subtract(vals)
+            for v in vals:
+                if counter[v] <= 0:
+                    del counter[v]
+
+    def matches(self, path, filters):
+        """filters: {facet: value}，各维度之间是“且”"""
+        values = self.values_of.get(path)
+        if values is None:
+            return False
+        return all(value in values[facet] for facet, value in filters.items())
+
+
+# 文件头读不出来（损坏、还没写完）时的记录：和索引里存的一样，之后文件变了会重新解析
+UNREADABLE_RECORD = {'source': '', 'unreadable': True}
+
+
+def read_image_record(path):
+    """只读文件头：尺寸 + 生成信息，不解码像素"""
+    if path.lower().endswith(('.jpg', '.jpeg', '.webp')):
+        try:
+            info, size = read_container_metadata(path)
+        except (OSError, struct.error, ValueError):
+            size = None
+        if size:
+            record = extract_generation_info(info)
+            record['width'], record['height'] = size
+            return record
+    with Image.open(path) as img:
+        record = extract_generation_info(img.info)
+        record['width'], record['height'] = img.width, img.height
+    return record
+
+
+class ListingScanner(QThread):
+    """
+    后台核对文件列表：文件夹用 scandir 重新扫描，零散文件批量 stat。
+    progressive 时边扫边发 partial（条目数每翻一倍发一次），界面可以先用已知的部分。
+    """
+    scanned = pyqtSignal(int, dict)     # 加载代次, {path: (size, mtime)}
+    partial = pyqtSignal(int, dict)
+
+    FIRST_PARTIAL = 500
+
+    def __init__(self, folder, paths, generation, progressive=False):
+        super().__init__()
+        self.folder = folder
+        self.paths = list(paths)
+        self.generation = generation
+        self.progressive = progressive
+        self.running = True
+
+    def run(self):
+        try:
+            if self.folder:
+                stats = {}
+                # 文件夹已经不在了：按空列表处理
+                if os.path.isdir(self.folder):
+                    next_partial = self.FIRST_PARTIAL
+                    for path, st in iter_folder(self.folder):
+                        if not self.running:
+                            return
+                        stats[path] = st
+                        if self.progressive and len(stats) >= next_partial:
+                            self.partial.emit(self.generation, dict(stats))
+                            next_partial *= 2
+            else:
+                stats = stat_files(self.paths)
+        except OSError:
+            return
+        if self.running:
+            self.scanned.emit(self.generation, stats)
+
+    def stop(self):
+        self.running = False
+
+
+class RawJsonLoader(QThread):
+    """读出图片内嵌的 prompt / workflow JSON 并格式化（几 MB 的 JSON 也不卡界面）"""
+    loaded = pyqtSignal(str)
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.running = True
+
+    def run(self):
+        try:
+            with Image.open(self.path) as img:
+                info = embedded_info(self.path, img.info)
+        except Exception:
+            info = {}
+        sections = []
+        for key in ('prompt', 'workflow'):
+            raw = info.get(key)
+            if not raw or not self.running:
+                continue
+            try:
+                text = json.dumps(json.loads(raw), indent=2, ensure_ascii=False)
+            except ValueError:
+                text = str(raw)
+            sections.append(f"// {key}\n{text}")
+        if self.running:
+            self.loaded.emit("\n\n".join(sections))
+
+    def stop(self):
+        self.running = False
+
+
+BACKGROUND_PAUSE_MS = 15     # 后台标签页的线程每处理一张让出的时间
+
+
+def set_thread_background(thread, background):
+    """后台标签页的加载线程降到空闲优先级，并在每张之间让出 CPU"""
+    if thread is None or not thread.isRunning():
+        return
+    thread.background = background
+    # 缩略图精修阶段本来就在空闲优先级，切回前台也不提上来
+    idle = background or getattr(thread, 'refining', False)
+    thread.setPriority(QThread.Priority.IdlePriority if idle else QThread.Priority.NormalPriority)
+
+
+class MetadataIndexer(QThread):
+    """后台建立元数据索引：先批量取缓存，再解析缓存里没有/过期的文件"""
+    records_ready = pyqtSignal(list, int)    # [(path, record)], 所属的加载代次
+
+    BATCH_SIZE = 500
+
+    def __init__(self, index, stats, generation=0, io=None):
+        super().__init__()
+        self.index = index
+        self.stats = dict(stats)
+        self.generation = generation
+        self.io = io            # IOScheduler：慢速存储上并发读文件头
+        self.running = True
+        self.background = False
+
+    def run(self):
+        try:
+            conn = self.index.connect()
+        except sqlite3.Error:
+            conn = None
+
+        cached = {}
+        if conn is not None:
+            try:
+                cached = MetadataIndex.lookup(conn, self.stats)
+            except sqlite3.Error:
+                cached = {}
+        items = list(cached.items())
+        for start in range(0, len(items), self.BATCH_SIZE):
+            if not self.running:
+                break
+            self.records_ready.emit(items[start:start + self.BATCH_SIZE], self.generation)
+
+        batch, to_store = [], []
+        todo = [p for p in self.stats if p not in cached]
+        if self.io is not None:
+            results = self.io.imap(self._read_record, todo, lambda: not self.running)
+        else:
+            results = ((p, self._read_record(p)) for p in todo)
+        for path, record in results:
+            if not self.running:
+                break
+            if self.background:
+                self.msleep(BACKGROUND_PAUSE_MS)
+            if record is None:
+                record = dict(UNREADABLE_RECORD)
+            size, mtime = self.stats[path]
+            batch.append((path, record))
+            to_store.append((path, size, mtime, record))
+            if len(batch) >= self.BATCH_SIZE:
+                self._flush(conn, batch, to_store)
+                batch, to_store = [], []
+        self._flush(conn, batch, to_store)
+        if conn is not None:
+            conn.close()
+
+    @staticmethod
+    def _read_record(path):
+        try:
+            return read_image_record(path)
+        except Exception:
+            return None
+
+    def _flush(self, conn, batch, to_store):
+        if not batch:
+            return
+        if conn is not None:
+            try:
+                MetadataIndex.store(conn, to_store)
+            except sqlite3.Error:
+                pass
+        if self.running:
+            self.records_ready.emit(list(batch), self.generation)
+
+    def stop(self):
+        """只置标志、不等待；收尾时发出的结果由代次号过滤掉"""
+        self.running = False
+
+
+# ==========================================
+# --- 感知哈希 / 相似图分组 ---
+# ==========================================
+HASH_KINDS = ("phash", "dhash", "ahash")
+
+
+def load_hash_inputs(path):
+    """缩小解码后取灰度：8x8（aHash）、9x8（dHash）、32x32（pHash）的像素字节"""
+    with Image.open(path) as img:
+        img.draft("RGB", (64, 64))   # JPEG 直接在 DCT 阶段缩小
+        if img.mode not in ("L", "RGB", "RGBA"):
+            img = img.convert("RGBA")
+        small = img.resize((32, 32), Image.Resampling.BOX, reducing_gap=3.0).convert("L")
+    return (
+        small.resize((8, 8), Image.Resampling.BOX).tobytes(),
+        small.resize((9, 8), Image.Resampling.BOX).tobytes(),
+        small.tobytes(),
+    )
+
+
+def _bits_to_int(bits):
+    value = 0
+    for b in bits:
+        value = (value << 1) | int(bool(b))
+    return value
+
+
+_DCT_32 = [
+    [math.sqrt((1 if k == 0 else 2) / 32) * math.cos(math.pi * (2 * n + 1) * k / 64) for n in range(32)]
+    for k in range(32)
+]
+
+
+def compute_hashes_batch(inputs):
+    """inputs: [(a8, d9x8, p32)] -> [(ahash, dhash, phash)]，有 NumPy 时整批向量化"""
+    if not inputs:
+        return []
+    if np is not None:
+        a = np.frombuffer(b"".join(x[0] for x in inputs), np.uint8).reshape(-1, 64).astype(np.float64)
+        d = np.frombuffer(b"".join(x[1] for x in inputs), np.uint8).reshape(-1, 8, 9).astype(np.int16)
+        p = np.frombuffer(b"".join(x[2] for x in inputs), np.uint8).reshape(-1, 32, 32).astype(np.float64)
+        m = np.asarray(_DCT_32, dtype=np.float64)
+        a_bits = a > a.mean(axis=1, keepdims=True)
+        d_bits = (d[:, :, 1:] > d[:, :, :-1]).reshape(-1, 64)
+        dct = (m @ p @ m.T)[:, :8, :8].reshape(-1, 64)
+        p_bits = dct > np.median(dct[:, 1:], axis=1, keepdims=True)
+        packed = [np.packbits(bits, axis=1) for bits in (a_bits, d_bits, p_bits)]
+        return [
+            tuple(int.from_bytes(arr[i].tobytes(), "big") for arr in packed)
+            for i in range(len(inputs))
+        ]
+
+    # 纯 Python 兜底
+    results = []
+    for a8, d98, p32 in inputs:
+        mean = sum(a8) / 64.0
+        ahash = _bits_to_int(v > mean for v in a8)
+        dhash = _bits_to_int(d98[r * 9 + c + 1] > d98[r * 9 + c] for r in range(8) for c in range(8))
+        rows = [p32[r * 32:(r + 1) * 32] for r in range(32)]
+        # 只需要左上 8x8 的 DCT 系数：先对行做 8 个频率，再对列做 8 个频率
+        tmp = [[sum(_DCT_32[k][n] * row[n] for n in range(32)) for k in range(8)] for row in rows]
+        coeffs = [
+            sum(_DCT_32[k][n] * tmp[n][c] for n in range(32))
+            for k in range(8) for c in range(8)
+        ]
+        ac = sorted(coeffs[1:])
+        median = (ac[31] + ac[32]) / 2.0 if len(ac) % 2 == 0 else ac[len(ac) // 2]
+        phash = _bits_to_int(v > median for v in coeffs)
+        results.append((ahash, dhash, phash))
+    return results
+
+
+def group_near_duplicates(hashes, threshold):
+    """
+    hashes: {path: 64 位哈希}，汉明距离 <= threshold 的图归为一组（并查集传递合并）。
+    用多索引哈希：64 位尽量均分成 threshold + 1 段，距离不超过 threshold 的两条哈希
+    至少有一段完全相同，所以只需要在“某一段相同”的桶内比较，不做全量两两比较。
+    段要等宽：哪一段太窄，它的桶就会很大，里面全是假候选。
+    """
+    # 完全相同的哈希先合并，近似搜索只用每个哈希值的一个代表
+    by_value = {}
+    for path, h in hashes.items():
+        by_value.setdefault(h, []).append(path)
+    values = list(by_value.keys())
+    parent = list(range(len(values)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j):
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            parent[rj] = ri
+
+    if threshold > 0 and len(values) > 1:
+        chunks = min(threshold + 1, 64)
+        base, extra = divmod(64, chunks)
+        spans = []      # (起始位, 位数)：余数摊到前 extra 段，各段宽度最多差 1 位
+        start = 0
+        for c in range(chunks):
+            width = base + (1 if c < extra else 0)
+            spans.append((start, width))
+            start += width
+        if np is not None:
+            arr = np.array(values, dtype=np.uint64)
+            for shift, width in spans:
+                keys = (arr >> np.uint64(shift)) & np.uint64((1 << width) - 1)
+                order = np.argsort(keys, kind="stable")
+                sorted_keys = keys[order]
+                sorted_vals = arr[order]
+                # 排序后同一个桶是连续的一段：按偏移 k 整体比较第 i 和第 i+k 个元素
+                k = 1
+                while k < len(order):
+                    same = sorted_keys[k:] == sorted_keys[:-k]
+                    if not same.any():
+                        break
+                    left = np.flatnonzero(same)
+                    x = sorted_vals[left] ^ sorted_vals[left + k]
+                    if hasattr(np, "bitwise_count"):
+                        dist = np.bitwise_count(x)
+                    else:
+                        dist = np.unpackbits(x.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+                    for i in left[dist <= threshold]:
+                        union(int(order[i]), int(order[i + k]))
+                    k += 1
+        else:
+            for shift, width in spans:
+                mask = (1 << width) - 1
+                buckets = {}
+                for i, v in enumerate(values):
+                    buckets.setdefault((v >> shift) & mask, []).append(i)
+                for run in buckets.values():
+                    for x in range(len(run) - 1):
+                        vi = values[run[x]]
+                        for y in run[x + 1:]:
+                            if (vi ^ values[y]).bit_count() <= threshold:
+                                union(run[x], y)
+
+    groups = {}
+    for i, v in enumerate(values):
+        groups.setdefault(find(i), []).extend(by_value[v])
+    return [g for g in groups.values() if len(g) > 1]
+
+
+class DuplicateFinder(QThread):
+    """
+    相似图查找：先从索引取有效的哈希缓存，缺的用线程池缩小解码、按批向量化计算并写回缓存，
+    最后用多索引哈希分组
+    """
+    progress = pyqtSignal(int, int)
+    groups_ready = pyqtSignal(list)       # [[path, ...], ...]
+
+    BATCH_SIZE = 64
+
+    def __init__(self, index, stats, threshold=6, kind="phash", jobs=None):
+        super().__init__()
+        self.index = index
+        self.stats = dict(stats)
+        self.threshold = threshold
+        self.kind = kind if kind in HASH_KINDS else "phash"
+        self.jobs = jobs        # JobScheduler：缩小解码按空闲优先级排队，和其它后台任务共用 CPU 上限
+        self.running = True
+
+    def run(self):
+        try:
+            conn = self.index.connect()
+            hashes = MetadataIndex.lookup_hashes(conn, self.stats)
+        except sqlite3.Error:
+            conn, hashes = None, {}
+
+        todo = [p for p in self.stats if p not in hashes]
+        total, done = len(self.stats), len(hashes)
+        self.progress.emit(done, total)
+
+        for start in range(0, len(todo), self.BATCH_SIZE):
+            if not self.running:
+                break
+            batch = todo[start:start + self.BATCH_SIZE]
+            if self.jobs is not None:
+                results = self.jobs.imap(JOB_IDLE, self._safe_inputs, batch, lambda: not self.running)
+            else:
+                results = ((p, self._safe_inputs(p)) for p in batch)
+            loaded = [(path, inputs) for path, inputs in results if inputs is not None]
+            computed = compute_hashes_batch([x[1] for x in loaded])
+            rows = []
+            for (path, _), h in zip(loaded, computed):
+                hashes[path] = h
+                size, mtime = self.stats[path]
+                rows.append((path, size, mtime, h))
+            if conn is not None and rows:
+                try:
+                    MetadataIndex.store_hashes(conn, rows)
+                except sqlite3.Error:
+                    pass
+            done += len(batch)
+            self.progress.emit(done, total)
+        if conn is not None:
+            conn.close()
+        if not self.running:
+            return
+
+        # 缓存元组的顺序是 (ahash, dhash, phash)
+        pick = {"ahash": 0, "dhash": 1, "phash": 2}[self.kind]
+        groups = group_near_duplicates({p: h[pick] for p, h in hashes.items()}, self.threshold)
+        self.groups_ready.emit(groups)
+
+    @staticmethod
+    def _safe_inputs(path):
+        try:
+            return load_hash_inputs(path)
+        except Exception:
+            return None
+
+    def stop(self):
+        self.running = False
+
+
+class ThumbnailLoader(QThread):
+    """
+    两遍出图：先用缩小解码 + 便宜的插值尽快把整列缩略图铺满，
+    再在空闲优先级下用 LANCZOS 精修；精修版和已显示的预览差得明显才替换图标。
+    只有精修版写进磁盘缓存，下次打开直接是最终质量。
+    """
+    # path, 缩略图, 压缩后的字节（供驻留管理器在淘汰后快速恢复）
+    # 最后两个参数是加载代次和档位：列表换掉或换档后，旧线程迟到的结果直接丢弃
+    thumbnail_loaded = pyqtSignal(str, QPixmap, bytes, int, int)
+
+    REFINE_MIN_DIFF = 2.0   # 平均通道差低于这个就看不出区别，不换图标
+
+    def __init__(self, file_list, store=None, stats=None, generation=0, io=None, tier=THUMB_SIZE, jobs=None):
+        super().__init__()
+        self.file_list = file_list
+        self.tier = tier        # 缩略图边长（物理像素），决定磁盘缓存用哪一档
+        self.store = store      # ThumbnailStore；命中时只从 mmap 切一片字节，不解码原图
+        self.stats = stats or {}
+        self.generation = generation
+        self.io = io            # IOScheduler：未命中的文件并发预读进内存再解码
+        self.jobs = jobs        # JobScheduler：解码交给共享的任务池，后台标签页 / 精修按空闲优先级排队
+        self.running = True
+        self.background = False
+        self.refining = False
+        self.previews = {}
+        # 线程跑起来以后追加的路径（渐进式扫描陆续送来的），由 add_paths 写入
+        self.added = []
+        self.accepting = True
+        self.added_lock = threading.Lock()
+
+    def add_paths(self, paths):
+        """把新路径排到这条线程后面接着做；线程已经收尾、不再接收时返回 False"""
+        with self.added_lock:
+            if not self.accepting or not self.running:
+                return False
+            self.added.extend(paths)
+            return True
+
+    def _take_added(self, close=False):
+        """取走追加的路径；close 时若没有新路径就关上入口，之后的 add_paths 返回 False"""
+        with self.added_lock:
+            batch, self.added = self.added, []
+            if close and not batch:
+                self.accepting = False
+            return batch
+
+    def run(self):
+        batch = self.file_list
+        while self.running:
+            self._load(batch)
+            batch = self._take_added()
+            if batch:
+                continue
+            # 没有新路径了才精修；精修途中又追加了路径就先停下，回头接着精修剩下的
+            self._refine_previews()
+            batch = self._take_added(close=True)
+            if not batch:
+                break
+        if self.store is not None:
+            self.store.save_index()
+
+    def _load(self, paths):
+        # 第一遍：磁盘缓存命中的直接发出去；没命中的留到第二遍统一预读、解码
+        misses = []
+        missing_stats = [p for p in paths if p not in self.stats]
+        if self.store is not None and missing_stats:
+            self.stats = dict(self.stats)
+            self.stats.update(stat_files(missing_stats))
+        for full_path in paths:
+            if not self.running:
+                return
+            if self.store is not None:
+                st = self.stats.get(full_path)
+                data = self.store.get(thumb_key(full_path, self.tier), st) or self._from_larger_tier(full_path, st)
+                if data:
+                    image = QImage.fromData(data)
+                    if not image.isNull():
+                        self.thumbnail_loaded.emit(full_path, QPixmap.fromImage(image), data, self.generation, self.tier)
+                        continue
+            misses.append(full_path)
+
+        # 第二遍：快速预览；能精修的记下预览字节，留到第三遍
+        for (full_path, _), result in self._decode_all(self._preview, misses, self._viewport_priority):
+            if not self.running:
+                break
+            if self.background:
+                self.msleep(BACKGROUND_PAUSE_MS)
+            if result is None:
+                continue
+            image, data, needs_refine = result
+            self.thumbnail_loaded.emit(full_path, QPixmap.fromImage(image), data, self.generation, self.tier)
+            if needs_refine:
+                self.previews[full_path] = data
+            else:
+                self._store(full_path, data)
+
+    def _refine_previews(self):
+        # 第三遍：空闲优先级下精修
+        if self.previews and self.running:
+            self.refining = True
+            self.setPriority(QThread.Priority.IdlePriority)
+            for (full_path, _), result in self._decode_all(self._refine, list(self.previews), JOB_IDLE):
+                if not self.running or self.added:
+                    break
+                if self.background:
+                    self.msleep(BACKGROUND_PAUSE_MS)
+                self.previews.pop(full_path, None)
+                if result is None:
+                    continue
+                image, data = result
+                if image is not None:
+                    self.thumbnail_loaded.emit(full_path, QPixmap.fromImage(image), data, self.generation, self.tier)
+                self._store(full_path, data)
+            self.refining = False
+            set_thread_background(self, self.background)
+
+    def _viewport_priority(self):
+        return JOB_IDLE if self.background else JOB_VIEWPORT
+
+    def _decode_all(self, func, paths, priority):
+        """预读文件（I/O 池）→ 解码（任务池），按原顺序产出 ((path, buffer), 结果或 None)"""
+        items = self._read_all(paths)
+        if self.jobs is not None:
+            return self.jobs.imap(priority, func, items, lambda: not self.running)
+        return ((item, func(item)) for item in items)
+
+    def _open(self, item):
+        path, buffer = item
+        return Image.open(io.BytesIO(buffer) if buffer else path)
+
+    def _preview(self, item):
+        try:
+            with self._open(item) as img:
+                thumb, needs_refine = fast_thumbnail(img, self.tier)
+                return pil2qimage(thumb), encode_thumbnail(thumb), needs_refine
+        except Exception:
+            return None
+
+    def _refine(self, item):
+        """LANCZOS 精修；和已显示的预览看不出区别时图像返回 None（只写磁盘缓存、不换图标）"""
+        try:
+            with self._open(item) as img:
+                img.thumbnail((self.tier, self.tier), Image.Resampling.LANCZOS)
+                data = encode_thumbnail(img)
+                with Image.open(io.BytesIO(self.previews[item[0]])) as shown:
+                    changed = thumbnail_difference(img, shown) >= self.REFINE_MIN_DIFF
+                return (pil2qimage(img) if changed else None), data
+        except Exception:
+            return None
+
+    def _from_larger_tier(self, path, st):
+        """这一档没有缓存、但更大一档有：直接从缓存缩小，不用重新解码原图"""
+        for larger in THUMB_TIERS:
+            if larger <= self.tier:
+                continue
+            cached = self.store.get(thumb_key(path, larger), st)
+            if not cached:
+                continue
+            try:
+                with Image.open(io.BytesIO(cached)) as img:
+                    img.thumbnail((self.tier, self.tier), Image.Resampling.LANCZOS)
+                    data = encode_thumbnail(img)
+            except Exception:
+                continue
+            self._store(path, data)
+            return data
+        return None
+
+    def _read_all(self, paths):
+        if self.io is not None:
+            return self.io.imap(self._prefetch, paths, lambda: not self.running)
+        return ((p, None) for p in paths)
+
+    def _store(self, path, data):
+        if self.store is not None:
+            try:
+                self.store.put(thumb_key(path, self.tier), self.stats.get(path), data)
+            except OSError:
+                pass
+
+    def _prefetch(self, path):
+        st = self.stats.get(path)
+        return self.io.read_file(path, st[0] if st else None)
+
+    def stop(self):
+        """只置标志、不等待：正在做的那张解码完线程自己退出，GUI 线程不被卡住"""
+        self.running = False
+
+
+class IndexedFileList:
+    """
+    当前文件集合：有序路径列表 + path -> 行号映射。
+    网格里第 i 个 item 始终对应第 i 个路径，所以查行号 / 判断是否存在 / 找 item 都是 O(1)。
+    """
+    def __init__(self, paths=()):
+        self._paths = list(paths)
+        self._rows = {p: i for i, p in enumerate(self._paths)}
+
+    def __len__(self):
+        return len(self._paths)
+
+    def __bool__(self):
+        return bool(self._paths)
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __getitem__(self, row):
+        return self._paths[row]
+
+    def __contains__(self, path):
+        return path in self._rows
+
+    def index(self, path):
+        """和 list.index 一样，找不到时抛 ValueError"""
+        try:
+            return self._rows[path]
+        except KeyError:
+            raise ValueError(path) from None
+
+    def row_of(self, path, default=-1):
+        return self._rows.get(path, default)
+
+    def paths(self):
+        return list(self._paths)
+
+    def _reindex_from(self, start):
+        rows = self._rows
+        for i in range(start, len(self._paths)):
+            rows[self._paths[i]] = i
+
+    def remove_many(self, paths):
+        """一次删除多个路径，返回被删掉的行号（升序）"""
+        rows = sorted(self._rows[p] for p in set(paths) if p in self._rows)
+        if not rows:
+            return rows
+        doomed = set(rows)
+        for r in rows:
+            del self._rows[self._paths[r]]
+        self._paths = [p for i, p in enumerate(self._paths) if i not in doomed]
+        self._reindex_from(rows[0])
+        return rows
+
+    def insert_many(self, row_paths):
+        """按 (行号, 路径) 升序插回，插入完只重建一次映射"""
+        row_paths = sorted(row_paths)
+        if not row_paths:
+            return
+        for row, path in row_paths:
+            self._paths.insert(min(row, len(self._paths)), path)
+        self._reindex_from(min(row_paths[0][0], len(self._paths) - 1))
+
+
+class ThumbnailResidency:
+    """
+    缩略图驻留管理：
+    - 只有视口附近的缩略图以 QPixmap 常驻内存（LRU，受 budget_bytes 限制）
+    - 所有缩略图另存一份压缩字节到紧凑存储（同样有上限），被淘汰的图滚回视口时直接从这里解码
+    - 两级都没有命中时返回 None，由调用方重新从原图生成
+    """
+    def __init__(self, budget_bytes, compact_budget_bytes):
+        self.budget_bytes = budget_bytes
+        self.compact_budget_bytes = compact_budget_bytes
+        self.resident = OrderedDict()   # path -> QPixmap
+        self.resident_bytes = 0
+        self.compact = OrderedDict()    # path -> bytes
+        self.compact_bytes = 0
+
+    @staticmethod
+    def pixmap_bytes(pixmap):
+        return pixmap.width() * pixmap.height() * 4
+
+    def put(self, path, pixmap, data):
+        """登记一张新缩略图；pixmap 为 None 时只写紧凑存储"""
+        if data:
+            old = self.compact.pop(path, None)
+            if old is not None:
+                self.compact_bytes -= len(old)
+            self.compact[path] = data
+            self.compact_bytes += len(data)
+            while self.compact_bytes > self.compact_budget_bytes and len(self.compact) > 1:
+                _, dropped = self.compact.popitem(last=False)
+                self.compact_bytes -= len(dropped)
+        if pixmap is not None and not pixmap.isNull():
+            self._make_resident(path, pixmap)
+
+    def _make_resident(self, path, pixmap):
+        old = self.resident.pop(path, None)
+        if old is not None:
+            self.resident_bytes -= self.pixmap_bytes(old)
+        self.resident[path] = pixmap
+        self.resident_bytes += self.pixmap_bytes(pixmap)
+
+    def get(self, path):
+        """取常驻的 QPixmap；不在内存时尝试从紧凑存储恢复"""
+        pixmap = self.resident.get(path)
+        if pixmap is not None:
+            self.resident.move_to_end(path)
+            return pixmap
+        data = self.compact.get(path)
+        if data is None:
+            return None
+        self.compact.move_to_end(path)
+        pixmap = QPixmap()
+        if not pixmap.loadFromData(data):
+            return None
+        self._make_resident(path, pixmap)
+        return pixmap
+
+    @property
+    def usage_bytes(self):
+        return self.resident_bytes + self.compact_bytes
+
+    def evict_to_budget(self, protected):
+        """淘汰最久未用、且不在 protected 集合里的常驻缩略图，返回被淘汰的路径"""
+        return self.shrink_resident(self.resident_bytes - self.budget_bytes, protected)
+
+    def shrink_resident(self, needed, protected):
+        """从最久未用的开始摘掉常驻缩略图（跳过 protected），直到收回 needed 字节，返回被淘汰的路径"""
+        evicted = []
+        freed = 0
+        for path in list(self.resident.keys()):
+            if freed >= needed:
+                break
+            if path in protected:
+                continue
+            size = self.pixmap_bytes(self.resident.pop(path))
+            self.resident_bytes -= size
+            freed += size
+            evicted.append(path)
+        return evicted
+
+    def shrink_compact(self, needed, protected=()):
+        """从最久未用的开始丢紧凑字节（跳过 protected），返回收回的字节数；丢掉的之后从磁盘缓存或原图补"""
+        freed = 0
+        for path in list(self.compact.keys()):
+            if freed >= needed:
+                break
+            if path in protected:
+                continue
+            data = self.compact.pop(path)
+            self.compact_bytes -= len(data)
+            freed += len(data)
+        return freed
+
+    def drop_pixmaps(self, keep=()):
+        """只保留紧凑字节（切到后台的标签页用），keep 里的（视口附近、图标还挂着的）照留"""
+        kept = OrderedDict((p, pm) for p, pm in self.resident.items() if p in keep)
+        self.resident = kept
+        self.resident_bytes = sum(self.pixmap_bytes(pm) for pm in kept.values())
+
+    def discard(self, path):
+        pixmap = self.resident.pop(path, None)
+        if pixmap is not None:
+            self.resident_bytes -= self.pixmap_bytes(pixmap)
+        data = self.compact.pop(path, None)
+        if data is not None:
+            self.compact_bytes -= len(data)
+
+    def clear(self):
+        self.resident.clear()
+        self.compact.clear()
+        self.resident_bytes = 0
+        self.compact_bytes = 0
+
+
+def approx_size(obj):
+    """元数据记录（dict / list / str / 数字）的大致内存占用：按 sys.getsizeof 递归累加"""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for value in obj.values():
+            size += approx_size(value)
+    elif isinstance(obj, (list, tuple)):
+        for value in obj:
+            size += approx_size(value)
+    return size
+
+
+def records_bytes(records, sample=64):
+    """一组元数据记录（path -> record）的大致占用：抽前 sample 条求平均再乘条数，十万条逐条算太慢"""
+    if not records:
+        return 0
+    head = []
+    for record in records.values():
+        head.append(record)
+        if len(head) >= sample:
+            break
+    average = sum(approx_size(r) for r in head) / len(head)
+    return int(average * len(records)) + sys.getsizeof(records)
+
+
+class MemoryBudget:
+    """
+    全局内存账本：每个缓存登记成一个池（当前字节数、条目数、按需收缩），
+    总占用超过 budget_bytes 时按登记顺序（重建代价从低到高）依次收缩，直到回到预算以内。
+    只统计像素、文档、记录这些大头，不含 Qt 和解释器本身的开销；只记账不淘汰的池（shrink 为 None）
+    挤占的是其它池的份额。
+    """
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self.pools = []             # [(name, usage, count, shrink)]
+        self.evicted = Counter()    # name -> 累计收回的字节数
+
+    def register(self, name, usage, count, shrink=None):
+        """usage() / count() 返回当前字节数 / 条目数；shrink(需要收回的字节数) 返回实际收回的字节数"""
+        self.pools.append((name, usage, count, shrink))
+
+    def report(self):
+        """[(name, 字节数, 条目数, 累计收回字节数)]"""
+        return [(name, usage(), count(), self.evicted[name]) for name, usage, count, _ in self.pools]
+
+    def enforce(self):
+        """超出预算时按登记顺序收缩各池，返回收回的字节数"""
+        usage = {name: fn() for name, fn, _, _ in self.pools}
+        over = sum(usage.values()) - self.budget_bytes
+        freed_total = 0
+        for name, _, _, shrink in self.pools:
+            if over <= 0:
+                break
+            if shrink is None or usage[name] <= 0:
+                continue
+            freed = shrink(over)
+            self.evicted[name] += freed
+            freed_total += freed
+            over -= freed
+        return freed_total
+
+
+def decode_display_image(path, target_w, target_h, timings=None):
+    """
+    详情页大图按目标尺寸缩小解码（JPEG 用 draft 在 DCT 阶段缩小，其它格式先 reduce 再 LANCZOS），
+    在任务池里跑，返回 (QImage, 是否被缩小过)。给了 timings（deque）就把这次解码耗时（秒）追加进去
+    """
+    start = time.perf_counter()
+    with Image.open(path) as img:
+        reduced = img.width > target_w or img.height > target_h
+        img.thumbnail((target_w, target_h), Image.Resampling.LANCZOS, reducing_gap=2.0)
+        qimg = pil2qimage(img)
+    if timings is not None:
+        timings.append(time.perf_counter() - start)
+    return qimg, reduced
+
+
+# 幻灯片：可选的切换间隔（毫秒）；最多提前预取几帧（每帧按视口尺寸解码，几 MB 一张）
+SLIDESHOW_INTERVALS = (500, 1000, 2000, 3000, 5000, 10000)
+SLIDESHOW_MAX_AHEAD = 8
+SLIDESHOW_MAX_WAIT = 2.0    # 秒：帧过了截止时间还没解码好（比如读失败）最多再等这么久，然后照常切过去
+
+
+class TiledImageSource:
+    """
+    超大图的分级瓦片源：解码一次后，把原图和逐级 1/2 缩小的各级像素按 RGBA 原始字节
+    写进临时文件，之后通过 mmap 按行切片取瓦片。常驻内存只有瓦片缓存，页缓存由系统按需回收。
+    """
+    TILE_SIZE = 256
+    STRIP_ROWS = 256
+
+    def __init__(self, path, fileobj, levels):
+        self.path = path
+        self.levels = levels            # [(offset, width, height)]，0 级是原图
+        self._file = fileobj
+        self._mm = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @property
+    def width(self):
+        return self.levels[0][1]
+
+    @property
+    def height(self):
+        return self.levels[0][2]
+
+    JPEG_DRAFT_LEVELS = 3   # JPEG 的 1～3 级（1/2、1/4、1/8）直接在 DCT 阶段缩小解码
+
+    @classmethod
+    def build(cls, path, should_stop=lambda: False):
+        """
+        按条带写出各级像素，格式转换也是一次一个条带。
+        1 级往下从临时文件里上一级的字节按条带缩小，整帧不在内存里留到下一级；JPEG 的前几级用 draft 直接解码。
+        PNG / WebP 等不能按区域解码，0 级仍要把整帧解码进内存一次。
+        被 should_stop 打断时返回 None；打不开、解码失败时抛异常，由调用方报给界面。
+        """
+        f = tempfile.TemporaryFile(prefix="aiviewer_tiles_")
+        levels = []
+        try:
+            with Image.open(path) as img:
+                is_jpeg = img.format == "JPEG"
+                if not cls._write_image(f, img, levels, should_stop):
+                    f.close()
+                    return None
+            while max(levels[-1][1], levels[-1][2]) > cls.TILE_SIZE * 2:
+                k = len(levels)
+                done = False
+                if is_jpeg and k <= cls.JPEG_DRAFT_LEVELS:
+                    done = cls._write_draft(f, path, k, levels, should_stop)
+                if done is False:
+                    done = cls._write_reduced(f, levels, should_stop)
+                if done is None:
+                    f.close()
+                    return None
+            f.flush()
+            return cls(path, f, levels)
+        except Exception:
+            f.close()
+            raise
+
+    @classmethod
+    def _write_image(cls, f, img, levels, should_stop):
+        """把一整张图按条带转成 RGBA 追加到 f；被打断返回 None"""
+        w, h = img.size
+        f.seek(0, os.SEEK_END)
+        offset = f.tell()
+        for y in range(0, h, cls.STRIP_ROWS):
+            if should_stop():
+                return None
+            strip = img.crop((0, y, w, min(h, y + cls.STRIP_ROWS)))
+            f.write(strip.convert("RGBA").tobytes())
+        levels.append((offset, w, h))
+        return True
+
+    @classmethod
+    def _write_draft(cls, f, path, k, levels, should_stop):
+        """JPEG 的第 k 级：按 1/2^k 用 draft 解码；尺寸和逐级缩小的对不上时返回 False，改走通用路径"""
+        w0, h0 = levels[0][1], levels[0][2]
+        size = (-(-w0 >> k), -(-h0 >> k))
+        with Image.open(path) as img:
+            img.draft(img.mode, size)
+            if img.size != size:
+                return False
+            return cls._write_image(f, img, levels, should_stop)
+
+    @classmethod
+    def _write_reduced(cls, f, levels, should_stop):
+        """从 f 里读回上一级，每次 STRIP_ROWS 行缩小一半追加到末尾；被打断返回 None"""
+        src, w, h = levels[-1]
+        stride = w * 4
+        out_w, out_h = -(-w // 2), -(-h // 2)
+        f.flush()
+        f.seek(0, os.SEEK_END)
+        offset = f.tell()
+        for y in range(0, h, cls.STRIP_ROWS):
+            if should_stop():
+                return None
+            rows = min(cls.STRIP_ROWS, h - y)
+            f.seek(src + y * stride)
+            data = f.read(rows * stride)
+            strip = Image.frombuffer("RGBA", (w, rows), data, "raw", "RGBA", 0, 1).reduce(2)
+            f.seek(0, os.SEEK_END)
+            f.write(strip.tobytes())
+        levels.append((offset, out_w, out_h))
+        return True
+
+    def level_for_scale(self, scale):
+        """scale = 屏幕物理像素 / 原图像素；选分辨率不低于屏幕的最小一级"""
+        if scale >= 1:
+            return 0
+        level = int(math.floor(math.log2(1.0 / scale)))
+        return max(0, min(level, len(self.levels) - 1))
+
+    def tile(self, level, tx, ty):
+        offset, w, h = self.levels[level]
+        t = self.TILE_SIZE
+        x0, y0 = tx * t, ty * t
+        tw, th = min(t, w - x0), min(t, h - y0)
+        if tw <= 0 or th <= 0:
+            return None
+        stride = w * 4
+        row_bytes = tw * 4
+        start = offset + y0 * stride + x0 * 4
+        mm = self._mm
+        data = b"".join(mm[start + r * stride:start + r * stride + row_bytes] for r in range(th))
+        return QImage(data, tw, th, row_bytes, QImage.Format.Format_RGBA8888).copy()
+
+    def close(self):
+        try:
+            self._mm.close()
+        finally:
+            self._file.close()
+
+
+class TiledSourceBuilder(QThread):
+    ready = pyqtSignal(int, object)     # request_id, TiledImageSource
+    failed = pyqtSignal(int, str)       # request_id, 错误信息
+
+    def __init__(self, request_id, path):
+        super().__init__()
+        self.request_id = request_id
+        self.path = path
+        self.running = True
+
+    def run(self):
+        try:
+            source = TiledImageSource.build(self.path, should_stop=lambda: not self.running)
+        except Exception as e:
+            if self.running:
+                self.failed.emit(self.request_id, str(e))
+            return
+        if source is None:
+            return
+        if not self.running:
+            source.close()
+            return
+        self.ready.emit(self.request_id, source)
+
+    def stop(self):
+        self.running = False
+
+
+class TiledImageView(QWidget):
+    """
+    详情页的缩放 / 平移视图：只取当前缩放级别下可见的瓦片，
+    瓦片按 (级别, tx, ty) 做 LRU 缓存，平移时直接复用已有瓦片。
+    瓦片源还没准备好时，先把适应窗口的预览图放大显示。
+    """
+    MAX_ZOOM = 16.0
+
+    def __init__(self, owner=None, parent=None):
+        super().__init__(parent)
+        self.owner = owner  # MainWindow
+        self.setMouseTracking(True)
+        self.setCursor(Qt.CursorShape.OpenHandCursor)
+        self.path = None
+        self.source = None
+        self.preview = None
+        self.img_w = 0
+        self.img_h = 0
+        self.zoom = 1.0                 # 逻辑像素 / 原图像素
+        self.origin = QPointF(0, 0)     # 视图左上角对应的原图坐标
+        self.drag_pos = None
+        self.tile_cache = OrderedDict()  # (level, tx, ty) -> QImage
+        self.tile_cache_bytes = 0
+        self.tile_budget_bytes = 128 * 1024 * 1024
+
+    # ---------- 图像 / 瓦片源 ----------
+    def set_image(self, path, w, h, preview):
+        if path != self.path:
+            self.release()
+        self.path = path
+        self.img_w, self.img_h = w, h
+        self.preview = preview
+
+    def set_source(self, source):
+        if self.source is not None:
+            self.source.close()
+        self.clear_tiles()
+        self.source = source
+        self.img_w, self.img_h = source.width, source.height
+        self.update()
+
+    def release(self):
+        if self.source is not None:
+            self.source.close()
+        self.source = None
+        self.path = None
+        self.preview = None
+        self.clear_tiles()
+
+    def clear_tiles(self):
+        self.tile_cache.clear()
+        self.tile_cache_bytes = 0
+
+    def get_tile(self, level, tx, ty):
+        key = (level, tx, ty)
+        img = self.tile_cache.get(key)
+        if img is not None:
+            self.tile_cache.move_to_end(key)
+            return img
+        img = self.source.tile(level, tx, ty)
+        if img is None:
+            return None
+        self.tile_cache[key] = img
+        self.tile_cache_bytes += img.sizeInBytes()
+        while self.tile_cache_bytes > self.tile_budget_bytes and len(self.tile_cache) > 1:
+            _, old = self.tile_cache.popitem(last=False)
+            self.tile_cache_bytes -= old.sizeInBytes()
+        if self.owner:
+            self.owner.schedule_memory_check()
+        return img
+
+    def shrink_tiles(self, needed):
+        """全局内存超预算时让出瓦片（从最久未用的开始），返回收回的字节数；需要时再从瓦片源读"""
+        freed = 0
+        while self.tile_cache and freed < needed:
+            _, old = self.tile_cache.popitem(last=False)
+            self.tile_cache_bytes -= old.sizeInBytes()
+            freed += old.sizeInBytes()
+        return freed
+
+    # ---------- 缩放 ----------
+    def fit_zoom(self):
+        if self.img_w <= 0 or self.img_h <= 0:
+            return 1.0
+        return min(self.width() / self.img_w, self.height() / self.img_h)
+
+    def set_zoom(self, zoom, anchor=None):
+        """以 anchor（控件坐标）为中心缩放，anchor 下的原图像素保持不动"""
+        if anchor is None:
+            anchor = QPointF(self.width() / 2, self.height() / 2)
+        zoom = max(self.fit_zoom(), min(self.MAX_ZOOM, zoom))
+        img_pt = self.origin + anchor / self.zoom
+        self.zoom = zoom
+        self.origin = img_pt - anchor / self.zoom
+        self.clamp_origin()
+        self.update()
+
+    def clamp_origin(self):
+        view_w, view_h = self.width() / self.zoom, self.height() / self.zoom
+        x, y = self.origin.x(), self.origin.y()
+        # 图比视图小的方向居中，否则不许拖出边界
+        x = (self.img_w - view_w) / 2 if view_w >= self.img_w else max(0.0, min(x, self.img_w - view_w))
+        y = (self.img_h - view_h) / 2 if view_h >= self.img_h else max(0.0, min(y, self.img_h - view_h))
+        self.origin = QPointF(x, y)
+
+    # ---------- 绘制 ----------
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        if self.owner:
+            painter.fillRect(self.rect(), QColor(self.owner.get_theme()['bg_main']))
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+        z = self.zoom
+        ox, oy = self.origin.x(), self.origin.y()
+
+        if self.source is None:
+            if self.preview is not None and not self.preview.isNull():
+                target = QRectF(-ox * z, -oy * z, self.img_w * z, self.img_h * z)
+                painter.drawPixmap(target, self.preview, QRectF(self.preview.rect()))
+            painter.end()
+            return
+
+        level = self.source.level_for_scale(z * self.devicePixelRatioF())
+        _, lw, lh = self.source.levels[level]
+        s = lw / self.img_w              # 该级别像素 / 原图像素
+        t = TiledImageSource.TILE_SIZE
+        vx0 = max(0.0, ox * s)
+        vy0 = max(0.0, oy * s)
+        vx1 = min(lw, (ox + self.width() / z) * s)
+        vy1 = min(lh, (oy + self.height() / z) * s)
+        for ty in range(int(vy0) // t, int(math.ceil(vy1 / t))):
+            for tx in range(int(vx0) // t, int(math.ceil(vx1 / t))):
+                img = self.get_tile(level, tx, ty)
+                if img is None:
+                    continue
+                # 取整到像素边界，避免瓦片之间出现细缝
+                x0 = math.floor((tx * t / s - ox) * z)
+                y0 = math.floor((ty * t / s - oy) * z)
+                x1 = math.ceil(((tx * t + img.width()) / s - ox) * z)
+                y1 = math.ceil(((ty * t + img.height()) / s - oy) * z)
+                painter.drawImage(QRectF(x0, y0, x1 - x0, y1 - y0), img)
+        painter.end()
+
+    def resizeEvent(self, event):
+        self.clamp_origin()
+        super().resizeEvent(event)
+
+    # ---------- 交互：滚轮缩放、拖动平移、双击回到适应窗口 ----------
+    def wheelEvent(self, event):
+        delta = event.angleDelta().y()
+        if delta == 0:
+            return
+        factor = 1.25 if delta > 0 else 0.8
+        new_zoom = self.zoom * factor
+        if new_zoom <= self.fit_zoom() and self.owner:
+            self.owner.exit_zoom()
+        else:
+            self.set_zoom(new_zoom, event.position())
+        event.accept()
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton:
+            self.drag_pos = event.position()
+            self.setCursor(Qt.CursorShape.ClosedHandCursor)
+        super().mousePressEvent(event)
+
+    def mouseMoveEvent(self, event):
+        if self.drag_pos is not None:
+            delta = event.position() - self.drag_pos
+            self.drag_pos = event.position()
+            self.origin = self.origin - delta / self.zoom
+            self.clamp_origin()
+            self.update()
+        super().mouseMoveEvent(event)
+
+    def mouseReleaseEvent(self, event):
+        self.drag_pos = None
+        self.setCursor(Qt.CursorShape.OpenHandCursor)
+        super().mouseReleaseEvent(event)
+
+    def mouseDoubleClickEvent(self, event):
+        if self.owner:
+            self.owner.exit_zoom()
+        event.accept()
+
+
+class TrashWorker(QThread):
+    """后台分批把文件移入回收站，避免 send2trash 卡住界面"""
+    progress = pyqtSignal(int, int)          # 已处理数, 总数
+    done = pyqtSignal(list, list)            # 成功的路径, 失败的路径
+
+    BATCH_SIZE = 50
+
+    def __init__(self, paths, generation=0):
+        super().__init__()
+        self.paths = list(paths)
+        self.generation = generation    # 删除时所在列表的代次，失败的文件按它放回原标签页
+
+    def run(self):
+        trashed, failed = [], []
+        total = len(self.paths)
+        for start in range(0, total, self.BATCH_SIZE):
+            batch = [p for p in self.paths[start:start + self.BATCH_SIZE] if os.path.exists(p)]
+            try:
+                if batch:
+                    send2trash.send2trash(batch)
+                trashed.extend(batch)
+            except Exception:
+                # 整批失败时逐个重试，找出真正失败的文件；
+                # send2trash 是逐个移动、遇错即停的，出错前已经移走的文件这时已不存在，算作成功
+                for p in batch:
+                    if not os.path.exists(p):
+                        trashed.append(p)
+                        continue
+                    try:
+                        send2trash.send2trash(p)
+                        trashed.append(p)
+                    except Exception:
+                        failed.append(p)
+            self.progress.emit(min(start + self.BATCH_SIZE, total), total)
+        self.done.emit(trashed, failed)
+
+
+EXPORT_FIELDS = MetadataIndex.QUERY_FIELDS + ("params",)
+EXPORT_MODES = [
+    ("jsonl", 'export_jsonl'),
+    ("csv", 'export_csv'),
+    ("paths", 'export_paths'),
+    ("copy", 'export_copy'),
+    ("link", 'export_link'),
+]
+
+
+def export_row(path, record):
+    """一张图的导出字段：和查询接口一致，另外带上完整参数（ComfyUI 的参数表 / A1111 的参数串）"""
+    return {
+        "path": path, "width": record.get('width'), "height": record.get('height'),
+        "model": record.get('model') or "", "loras": record.get('lora_names') or [],
+        "seed": record.get('seed'), "steps": record.get('steps'), "cfg": record.get('cfg'),
+        "sampler": record.get('sampler') or "", "scheduler": record.get('scheduler') or "",
+        "positive": record.get('positive') or "", "negative": record.get('negative') or "",
+        "params": record.get('params') or record.get('params_text') or "",
+    }
+
+
+class ExportWorker(QThread):
+    """
+    后台导出：逐张写出、不在内存里攒结果，几万张也不卡界面。
+    mode: jsonl / csv（提示词和参数）、paths（路径列表）、copy / link（复制或硬链接到文件夹）
+    """
+    progress = pyqtSignal(int, int)
+    exported = pyqtSignal(int, int, str)    # 导出张数, 硬链接失败改为复制的张数, 出错信息
+
+    PROGRESS_EVERY = 100
+
+    def __init__(self, paths, records, mode, target):
+        super().__init__()
+        self.paths = list(paths)
+        self.records = records      # 界面的 metadata_records，只读；没有的当场解析
+        self.mode = mode
+        self.target = target
+        self.running = True
+
+    def run(self):
+        count, copied = 0, 0
+        try:
+            if self.mode in ("copy", "link"):
+                count, copied = self.export_files()
+            else:
+                count = self.export_text()
+        except OSError as e:
+            self.exported.emit(count, copied, str(e))
+            return
+        self.exported.emit(count, copied, "")
+
+    def record(self, path):
+        record = self.records.get(path)
+        if record is None:
+            try:
+                record = read_image_record(path)
+            except Exception:
+                record = {}
+        return record
+
+    def export_text(self):
+        total = len(self.paths)
+        # CSV 带 BOM，Excel 直接打开不乱码
+        encoding = "utf-8-sig" if self.mode == "csv" else "utf-8"
+        with open(self.target, "w", encoding=encoding, newline="") as f:
+            writer = csv.writer(f) if self.mode == "csv" else None
+            if writer is not None:
+                writer.writerow(EXPORT_FIELDS)
+            for i, path in enumerate(self.paths):
+                if not self.running:
+                    return i
+                if self.mode == "paths":
+                    f.write(path + "\n")
+                else:
+                    row = export_row(path, self.record(path))
+                    if writer is not None:
+                        row["loras"] = "; ".join(row["loras"])
+                        if isinstance(row["params"], dict):
+                            row["params"] = json.dumps(row["params"], ensure_ascii=False)
+                        writer.writerow([row[k] for k in EXPORT_FIELDS])
+                    else:
+                        f.write(json.dumps(row, ensure_ascii=False) + "\n")
+                if i % self.PROGRESS_EVERY == 0:
+                    self.progress.emit(i, total)
+        return total
+
+    def export_files(self):
+        """重名时加 (1)、(2)…；跨盘等不能硬链接的情况改为复制"""
+        total = len(self.paths)
+        os.makedirs(self.target, exist_ok=True)
+        taken = {name.casefold() for name in os.listdir(self.target)}
+        count, copied = 0, 0
+        for i, path in enumerate(self.paths):
+            if not self.running:
+                break
+            if i % self.PROGRESS_EVERY == 0:
+                self.progress.emit(i, total)
+            stem, ext = os.path.splitext(os.path.basename(path))
+            name, n = stem + ext, 1
+            while name.casefold() in taken:
+                name = f"{stem} ({n}){ext}"
+                n += 1
+            taken.add(name.casefold())
+            dest = os.path.join(self.target, name)
+            try:
+                if self.mode == "link":
+                    try:
+                        os.link(path, dest)
+                    except OSError:
+                        shutil.copy2(path, dest)
+                        copied += 1
+                else:
+                    shutil.copy2(path, dest)
+            except OSError:
+                continue
+            count += 1
+        return count, copied
+
+    def stop(self):
+        self.running = False
+
+
+class GridListWidget(QListWidget):
+    """网格视图用的列表，自定义滚轮步长：每次滚轮滚动两行；悬停提示由 tooltip_provider(path) 给出"""
+    tooltip_provider = None
+
+    def viewportEvent(self, event):
+        if event.type() == QEvent.Type.ToolTip and self.tooltip_provider is not None:
+            item = self.itemAt(event.pos())
+            if item is None:
+                QToolTip.hideText()
+                return True
+            text = self.tooltip_provider(item.data(Qt.ItemDataRole.UserRole))
+            QToolTip.showText(event.globalPos(), text, self.viewport(), self.visualItemRect(item))
+            return True
+        return super().viewportEvent(event)
+
+    def wheelEvent(self, event):
+        delta = event.angleDelta().y()
+        if delta == 0:
+            return
+
+        # 一行的高度：gridSize 高度 + 间距
+        row_height = self.gridSize().height() + self.spacing()
+        # 每个 step（120）滚动 2 行
+        steps = delta / 120.0
+        pixels = int(-steps * 2 * row_height)   # 向上滚时 delta>0，要减小 scroll value
+
+        bar = self.verticalScrollBar()
+        bar.setValue(bar.value() + pixels)
+        event.accept()
+
+
+# --- 自定义滚轮行为的图片滚动区域：在图片区域用滚轮切图 ---
+class ImageScrollArea(QScrollArea):
+    def __init__(self, owner=None, parent=None):
+        super().__init__(parent)
+        self.owner = owner  # MainWindow
+
+    def wheelEvent(self, event):
+        if self.owner and self.owner.stacked_widget.currentIndex() == 1:
+            delta = event.angleDelta().y()
+            # Ctrl + 滚轮：进入缩放模式
+            if event.modifiers() & Qt.KeyboardModifier.ControlModifier:
+                if delta > 0:
+                    self.owner.enter_zoom(event.position(), 1.25)
+                event.accept()
+                return
+            if delta > 0:
+                self.owner.show_prev_image()
+            elif delta < 0:
+                self.owner.show_next_image()
+            event.accept()
+        else:
+            super().wheelEvent(event)
 
-        if self.sort_mode == "mtime":
-            self.sort_mtime_action.setChecked(True)
+    def mouseDoubleClickEvent(self, event):
+        # 双击：以鼠标位置为中心放大到 100%
+        if self.owner and self.owner.stacked_widget.currentIndex() == 1:
+            self.owner.enter_zoom(event.position())
+            event.accept()
         else:
-            self.sort_name_action.setChecked(True)
+            super().mouseDoubleClickEvent(event)
+
+
+class RawJsonDialog(QDialog):
+    """原始 JSON 查看器：后台读取 + 格式化，再分块追加到编辑器里，大文件也能边加载边看"""
+    CHUNK_LINES = 3000
+
+    def __init__(self, owner, path):
+        super().__init__(owner)
+        self.owner = owner
+        self.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+        self.setWindowTitle(f"{owner.tr('raw_json')} - {os.path.basename(path)}")
+        self.resize(900, 700)
+
+        layout = QVBoxLayout(self)
+        self.status = QLabel(owner.tr('raw_json_loading'))
+        layout.addWidget(self.status)
+        self.view = QPlainTextEdit()
+        self.view.setReadOnly(True)
+        self.view.setLineWrapMode(QPlainTextEdit.LineWrapMode.NoWrap)
+        self.view.setStyleSheet("font-family: Consolas, monospace; font-size: 12px;")
+        layout.addWidget(self.view)
+
+        self.lines = []
+        self.pos = 0
+        self.append_timer = QTimer(self)
+        self.append_timer.setInterval(0)
+        self.append_timer.timeout.connect(self.append_chunk)
+
+        self.loader = RawJsonLoader(path)
+        self.loader.loaded.connect(self.on_loaded)
+        self.loader.start()
+
+    def on_loaded(self, text):
+        if not text:
+            self.status.setText(self.owner.tr('raw_json_none'))
+            return
+        self.lines = text.split("\n")
+        self.append_timer.start()
+
+    def append_chunk(self):
+        chunk = self.lines[self.pos:self.pos + self.CHUNK_LINES]
+        self.pos += len(chunk)
+        self.view.appendPlainText("\n".join(chunk))
+        if self.pos >= len(self.lines):
+            self.append_timer.stop()
+            self.status.setText(self.owner.tr('raw_json_lines').format(len(self.lines)))
+            self.view.moveCursor(self.view.textCursor().MoveOperation.Start)
+        else:
+            self.status.setText(f"{self.owner.tr('raw_json_loading')} {self.pos}/{len(self.lines)}")
+
+    def done(self, result):
+        self.append_timer.stop()
+        # 线程交给主窗口托管到结束，对话框可以马上关掉
+        self.owner.retire_thread(self.loader)
+        super().done(result)
+
+
+class MemoryDialog(QDialog):
+    """内存面板：各缓存的占用、条目数、累计收回量和总预算；打开期间每秒刷新，预算可以直接改"""
+    POOL_LABELS = {
+        'tiles': 'mem_tiles',
+        'documents': 'mem_documents',
+        'display': 'mem_display',
+        'thumbnails': 'mem_thumbnails',
+        'metadata': 'mem_metadata',
+    }
+
+    def __init__(self, owner):
+        super().__init__(owner)
+        self.owner = owner
+        self.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+        self.setWindowTitle(owner.tr('memory'))
+        self.resize(520, 320)
+
+        layout = QVBoxLayout(self)
+        self.table = QLabel()
+        self.table.setTextFormat(Qt.TextFormat.RichText)
+        self.table.setWordWrap(True)
+        layout.addWidget(self.table)
+        row = QHBoxLayout()
+        row.addWidget(QLabel(owner.tr('mem_budget')))
+        self.budget = QSpinBox()
+        self.budget.setRange(64, 1024 * 1024)
+        self.budget.setSingleStep(128)
+        self.budget.setSuffix(" MB")
+        self.budget.setKeyboardTracking(False)
+        self.budget.setValue(owner.memory.budget_bytes // (1024 * 1024))
+        self.budget.valueChanged.connect(self.on_budget_changed)
+        row.addWidget(self.budget)
+        row.addStretch()
+        layout.addLayout(row)
+        layout.addStretch()
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(1000)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start()
+        self.refresh()
+
+    def on_budget_changed(self, mb):
+        self.owner.set_memory_budget(mb)
+        self.refresh()
+
+    def refresh(self):
+        owner = self.owner
+        mb = lambda n: f"{n / (1024 * 1024):.1f} MB"
+        cells = "".join(f"<th align='{a}'>{owner.tr(k)}</th>" for k, a in (
+            ('mem_cache', 'left'), ('mem_used', 'right'), ('mem_entries', 'right'), ('mem_freed', 'right')))
+        rows = [f"<tr>{cells}</tr>"]
+        total = 0
+        for name, used, count, freed in owner.memory.report():
+            total += used
+            rows.append(f"<tr><td>{owner.tr(self.POOL_LABELS[name])}</td><td align='right'>{mb(used)}</td>"
+                        f"<td align='right'>{count}</td><td align='right'>{mb(freed)}</td></tr>")
+        budget = owner.memory.budget_bytes
+        rows.append(f"<tr><td><b>{owner.tr('mem_total')}</b></td><td align='right'><b>{mb(total)}</b></td>"
+                    f"<td align='right' colspan='2'>/ {mb(budget)}</td></tr>")
+        text = f"<table cellspacing='0' cellpadding='4' width='100%'>{''.join(rows)}</table>"
+        if total > budget:
+            text += f"<p style='color:#ff4d4f'>{owner.tr('mem_over')}</p>"
+        if owner.thumb_store is not None:
+            text += f"<p style='color:#888'>{owner.tr('mem_mapped').format(mb(owner.thumb_store.size))}</p>"
+        self.table.setText(text)
+
+
+class FolderSession:
+    """
+    一个标签页的浏览状态。当前标签页的状态直接放在 MainWindow 的同名属性上，
+    切换时整体存进 / 取出这里；后台标签页的线程结果按代次号写回对应的 session。
+    """
+    FIELDS = (
+        "current_folder", "folder_mtime", "loaded_files", "current_file_list", "file_stats",
+        "metadata_records", "natural_keys", "facets", "facet_filters", "dup_groups",
+        "load_generation", "indexer_thread", "loader_thread", "reload_thread",
+        "pending_reload", "thumb_residency", "sort_mode",
+        "list_widget", "iconed_paths", "protected_paths",
+    )
+
+    def __init__(self, residency, sort_mode, list_widget=None):
+        self.current_folder = None
+        self.folder_mtime = None
+        self.loaded_files = {}
+        self.current_file_list = IndexedFileList()
+        self.file_stats = {}
+        self.metadata_records = {}
+        self.natural_keys = {}
+        self.facets = FacetAggregator()
+        self.facet_filters = {}
+        self.dup_groups = None
+        self.load_generation = 0
+        self.indexer_thread = None
+        self.loader_thread = None
+        self.reload_thread = None
+        self.pending_reload = set()
+        self.thumb_residency = residency
+        self.sort_mode = sort_mode
+        # 每个标签页有自己的网格：切换时 item 和视口附近的图标都留着，不重建、不重新解码
+        self.list_widget = list_widget
+        self.iconed_paths = set()
+        self.protected_paths = set()
+        self.scroll_value = 0
+        self.selected_path = None
+        self.pending_stats = None   # 后台核对发现文件有变化时的新列表，切回来时再应用
+
+    def threads(self):
+        return [t for t in (self.indexer_thread, self.loader_thread, self.reload_thread) if t is not None]
+
+
+class MainWindow(QMainWindow):
+    def __init__(self):
+        super().__init__()
+        self.settings = QSettings("AI_Tools", "AI_ImageViewer_Basic")
+        self.lang = self.settings.value("language", "en", type=str)
+        self.dark_mode = self.settings.value("theme", False, type=bool)
+        self.sort_mode = self.settings.value("sort_mode", "name_natural", type=str)
+
+        self.setWindowTitle("AI Image Viewer Basic v1.1.0")
+        self.resize(1300, 850)
+        self.setAcceptDrops(True)
+
+        self.loader_thread = None
+        self.reload_thread = None
+        self.indexer_thread = None
+        self.metadata_index = MetadataIndex()
+        self.metadata_records = {}     # path -> 解析好的元数据记录（来自索引）
+        self.file_stats = {}           # path -> (size, mtime)，扫描时一次拿到
+        self.natural_keys = {}         # path -> 自然排序 key 缓存
+        self.loaded_files = {}         # 当前加载的全部路径（有序集合，dict 当 set 用）
+        self.dup_groups = None         # 相似图模式下的分组；None 表示普通浏览
+        self.load_generation = 0       # 每次换列表 / 清空换一个新值，后台线程带着它回报结果
+        self.generation_seq = 0        # 代次号全局递增，各标签页之间不会重复
+        self.current_folder = None     # 当前标签页对应的文件夹（打开的是零散文件时为 None）
+        self.folder_mtime = None
+        self.facets = FacetAggregator()
+        self.facet_filters = {}        # facet -> 选中的值
+        self.facet_timer = QTimer(self)
+        self.facet_timer.setSingleShot(True)
+        self.facet_timer.setInterval(300)
+        self.facet_timer.timeout.connect(self.refresh_facet_panel)
+        self.dup_thread = None
+        self.export_thread = None
+        self.current_image_path = None
+        self.display_request_id = 0
+        # 最近解码过的详情图（含预取的相邻图）：path -> (QImage, 是否被缩小过)
+        self.display_cache = OrderedDict()
+        self.display_cache_size = 4
+        self.display_jobs = []         # 当前详情图的解码任务（切图时取消还没开始的）
+        self.prefetch_jobs = {}        # path -> 相邻图预取任务
+        self.decode_times = deque(maxlen=16)   # 最近几次详情图解码耗时（秒），幻灯片据此决定提前几帧预取
+        # 幻灯片：按截止时间切帧，到点还没解码好的帧记为错过
+        self.slideshow_active = False
+        self.slideshow_interval = self.settings.value("slideshow_interval_ms", 3000, type=int)
+        self.slideshow_deadline = 0.0  # 下一帧该显示的时刻（time.monotonic）
+        self.slideshow_waiting = None  # 错过截止时间、正在等解码的那一帧
+        self.slideshow_stats = {}
+        self.slideshow_timer = QTimer(self)
+        self.slideshow_timer.setSingleShot(True)
+        self.slideshow_timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.slideshow_timer.timeout.connect(self.slideshow_tick)
+        self.tile_request_id = 0
+        self.tile_builder = None
+        self.retired_threads = set()   # 已要求停止、但还没跑完的后台线程
+        self.current_file_list = IndexedFileList()
+        self.current_index = -1
+        self.current_pos_text = ""
+        self.current_neg_text = ""
+        # 详情页右侧的元数据文档：每张图按（主题, 语言）渲染一次，缓存成 QTextDocument，切图时直接换文档
+        self.doc_cache = OrderedDict()     # (path, 标题, 主题, 语言) -> (record, QTextDocument, 估算字节数)
+        self.doc_cache_size = 64
+        self.current_doc = None
+        # 超过这个字数的段落（提示词 / LoRA / 参数）先折叠，点“展开全部”再排版
+        self.collapse_chars = self.settings.value("metadata_collapse_chars", 4000, type=int)
+        self.expanded_sections = set()
+        self.meta_request_id = 0
+        # 网格悬停提示：只读内存里的记录；没有记录时排一个低优先级的解析任务
+        self.hover_path = None
+        self.hover_job = None
+        self.meta_job = None           # 详情页当前这张的解析任务
+
+        # 批量删除：先从界面移除，撤销窗口过后才真正移入回收站
+        self.pending_trash = []        # [{'paths': [...], 'taken': [(row, item), ...], 'timer': QTimer}]
+        self.trash_queue = []          # 已过撤销窗口、等待后台线程处理的 (路径批次, 代次)
+        self.trash_thread = None
+        self.trash_undo_ms = 5000
+
+        # 网格相关参数：高度固定，最小宽度，用来做自适应铺满；图标边长可以用工具栏滑块调
+        self.thumb_icon_size = self.settings.value("thumb_icon_size", 220, type=int)
+        self.grid_item_height = self.thumb_icon_size + 40
+        self.grid_item_min_width = self.thumb_icon_size  # 最小宽度
+        # 缩略图按 图标边长 × 设备像素比 取档；滑块拖动停下后才换档
+        self.thumb_tier = thumb_tier(self.thumb_icon_size * self.devicePixelRatioF())
+        self.tier_timer = QTimer(self)
+        self.tier_timer.setSingleShot(True)
+        self.tier_timer.setInterval(200)
+        self.tier_timer.timeout.connect(self.apply_thumb_tier)
+        self.screen_hooked = False      # showEvent 里接上 screenChanged（窗口句柄要显示后才有）
+
+        # 缩略图驻留：常驻 QPixmap 与紧凑字节存储各自的内存上限（MB，可在设置里改）
+        self.thumb_residency = self.new_thumb_residency()
+        # 磁盘缩略图缓存（打包文件 + mmap）；打不开就退回每次重新生成
+        store_mb = self.settings.value("thumb_store_mb", 1024, type=int)
+        try:
+            self.thumb_store = ThumbnailStore(budget_bytes=store_mb * 1024 * 1024)
+        except OSError:
+            self.thumb_store = None
+        # 文件读取调度：并发数在慢速存储模式下调高（NAS / SMB 上每次 open 都要几毫秒）
+        self.slow_storage = self.settings.value("slow_storage", False, type=bool)
+        self.io_scheduler = IOScheduler(
+            self.io_concurrency(),
+            self.settings.value("read_ahead_mb", 8, type=int) * 1024 * 1024,
+        )
+        # 解码 / 解析 / 哈希共用的任务池；默认只用一半核心，给同机的生成任务留余量
+        self.jobs = JobScheduler(self.settings.value("cpu_workers", max(1, (os.cpu_count() or 2) // 2), type=int))
+        self.iconed_paths = set()      # 当前 item 上挂着真实缩略图的路径
+        self.protected_paths = set()   # 视口附近、不允许淘汰的路径
+        self.pending_reload = set()    # 两级缓存都没命中、等待重新生成的路径
+        self.residency_timer = QTimer(self)
+        self.residency_timer.setSingleShot(True)
+        self.residency_timer.setInterval(40)
+        self.residency_timer.timeout.connect(self.update_thumbnail_residency)
+        # 全局内存预算（MB，设置 memory_budget_mb）：各缓存在 setup_memory_budget 里登记，超出时统一收缩
+        self.memory = MemoryBudget(self.settings.value("memory_budget_mb", 1024, type=int) * 1024 * 1024)
+        self.memory_timer = QTimer(self)
+        self.memory_timer.setSingleShot(True)
+        self.memory_timer.setInterval(0)
+        self.memory_timer.timeout.connect(self.memory.enforce)
+
+        # 文件夹标签页：sessions 与标签一一对应，active_session 的状态就在 self 上
+        self.sessions = [FolderSession(self.thumb_residency, self.sort_mode)]
+        self.active_session = 0
+        self.scan_threads = set()
+
+        self.central_widget = QWidget()
+        self.setCentralWidget(self.central_widget)
+        self.main_layout = QVBoxLayout(self.central_widget)
+        self.main_layout.setContentsMargins(0, 0, 0, 0)
+        self.main_layout.setSpacing(0)
+
+        self.setup_toolbar()
+        self.setup_tab_bar()
+        self.stacked_widget = QStackedWidget()
+        self.main_layout.addWidget(self.stacked_widget)
+        self.setup_grid_view()
+        self.setup_detail_view()
+        self.setup_toast()
+
+        self.apply_style()
+        self.update_ui_text()
+        self.setup_shortcuts()  # 全局快捷键
+        self.setup_memory_budget()
 
-        self.sort_name_action.triggered.connect(lambda: self.set_sort_mode("name_natural"))
-        self.sort_mtime_action.triggered.connect(lambda: self.set_sort_mode("mtime"))
+        # 窗口显示后再恢复上次的会话（先用缓存的列表和缩略图，再到后台核对）
+        if self.settings.value("restore_session", True, type=bool):
+            QTimer.singleShot(0, self.restore_last_session)
 
-        self.sort_menu.addAction(self.sort_name_action)
-        self.sort_menu.addAction(self.sort_mtime_action)
+    # ---------- Toast ----------
+    def setup_toast(self):
+        self.toast_label = QLabel(self)
+        self.toast_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.toast_label.setStyleSheet(f"""
+            QLabel {{
+                background-color: rgba(40, 40, 40, 0.9);
+                color: white;
+                padding: 8px 16px;
+                border-radius: 6px;
+                font-family: {NativeTheme.FONT_FAMILY};
+                font-size: 14px;
+                font-weight: 500;
+            }}
+        """)
+        self.toast_label.hide()
+        self.toast_timer = QTimer(self)
+        self.toast_timer.setSingleShot(True)
+        self.toast_timer.timeout.connect(self.toast_label.hide)
+
+    def show_toast(self, message, duration=2000):
+        self.toast_label.setText(message)
+        self.toast_label.adjustSize()
+        x = (self.width() - self.toast_label.width()) // 2
+        y = self.height() - 100
+        self.toast_label.move(x, y)
+        self.toast_label.show()
+        self.toast_label.raise_()
+        # duration <= 0：常驻（用于进度提示），直到下一条 toast 覆盖
+        if duration > 0:
+            self.toast_timer.start(duration)
+        else:
+            self.toast_timer.stop()
+
+    # ---------- i18n ----------
+    def tr(self, key):
+        return TRANSLATIONS[self.lang].get(key, key)
+
+    # ---------- Toolbar ----------
+    def setup_toolbar(self):
+        self.toolbar = QToolBar()
+        self.toolbar.setIconSize(QSize(20, 20))
+        self.toolbar.setMovable(False)
+        self.toolbar.setToolButtonStyle(Qt.ToolButtonStyle.ToolButtonTextBesideIcon)
+        self.addToolBar(self.toolbar)
+
+        # 左侧：打开图片 / 文件夹
+        self.action_file = QAction(self.tr('open_file'), self)
+        self.action_file.setIcon(create_emoji_icon("📄"))
+        self.action_file.triggered.connect(self.open_files_dialog)
+        self.toolbar.addAction(self.action_file)
+
+        self.action_folder = QAction(self.tr('open_folder'), self)
+        self.action_folder.setIcon(create_emoji_icon("📂"))
+        self.action_folder.triggered.connect(self.open_folder_dialog)
+        self.toolbar.addAction(self.action_folder)
+
+        self.action_new_tab = QAction(self.tr('new_tab'), self)
+        self.action_new_tab.setIcon(create_emoji_icon("📑"))
+        self.action_new_tab.triggered.connect(self.open_folder_in_new_tab)
+        self.toolbar.addAction(self.action_new_tab)
+
+        self.toolbar.addSeparator()
+
+        # 网格视图（返回）
+        self.back_action = QAction(self.tr('back'), self)
+        self.back_action.setIcon(create_emoji_icon("🔙"))
+        self.back_action.triggered.connect(self.show_grid)
+        self.back_action.setEnabled(False)
+        self.toolbar.addAction(self.back_action)
+
+
+
+        # 删除图片按钮
+        self.action_delete = QAction(self.tr('delete'), self)
+        self.action_delete.setIcon(create_emoji_icon("🗑", color="#ff4d4f"))
+        self.action_delete.triggered.connect(self.delete_current_image)
+        self.toolbar.addAction(self.action_delete)
+
+        # 幻灯片（F5）：点按钮开始 / 停止，下拉菜单选切换间隔
+        self.action_slideshow = QAction(self.tr('slideshow'), self)
+        self.action_slideshow.setIcon(create_emoji_icon("🎞"))
+        self.action_slideshow.setCheckable(True)
+        self.action_slideshow.toggled.connect(self.toggle_slideshow)
+        self.slideshow_menu = QMenu(self)
+        interval_group = QActionGroup(self)
+        self.slideshow_interval_actions = {}
+        for ms in SLIDESHOW_INTERVALS:
+            action = QAction(self.tr('slideshow_seconds').format(ms / 1000), self)
+            action.setCheckable(True)
+            action.setChecked(ms == self.slideshow_interval)
+            action.triggered.connect(lambda checked, v=ms: self.set_slideshow_interval(v))
+            interval_group.addAction(action)
+            self.slideshow_menu.addAction(action)
+            self.slideshow_interval_actions[ms] = action
+        self.toolbar.addAction(self.action_slideshow)
+        widget = self.toolbar.widgetForAction(self.action_slideshow)
+        if isinstance(widget, QToolButton):
+            widget.setMenu(self.slideshow_menu)
+            widget.setPopupMode(QToolButton.ToolButtonPopupMode.MenuButtonPopup)
+
+        # 相似图查找（再点一次退出）
+        self.action_dups = QAction(self.tr('find_dups'), self)
+        self.action_dups.setIcon(create_emoji_icon("👯"))
+        self.action_dups.setCheckable(True)
+        self.action_dups.toggled.connect(self.toggle_duplicate_mode)
+        self.toolbar.addAction(self.action_dups)
+
+        # 筛选面板
+        self.action_facets = QAction(self.tr('facets'), self)
+        self.action_facets.setIcon(create_emoji_icon("🏷"))
+        self.action_facets.setCheckable(True)
+        self.action_facets.toggled.connect(self.toggle_facet_panel)
+        self.toolbar.addAction(self.action_facets)
+
+        # 导出（网格多选时导出选中的，否则导出当前筛选 / 排序后的列表）
+        self.action_export = QAction(self.tr('export'), self)
+        self.action_export.setIcon(create_emoji_icon("📤"))
+        self.export_menu = QMenu(self)
+        self.export_actions = {}
+        for mode, key in EXPORT_MODES:
+            action = QAction(self.tr(key), self)
+            action.triggered.connect(lambda checked, m=mode: self.start_export(m))
+            self.export_menu.addAction(action)
+            self.export_actions[mode] = action
+        self.toolbar.addAction(self.action_export)
+        widget = self.toolbar.widgetForAction(self.action_export)
+        if isinstance(widget, QToolButton):
+            widget.setMenu(self.export_menu)
+            widget.setPopupMode(QToolButton.ToolButtonPopupMode.InstantPopup)
+
+        # 慢速存储模式（NAS / SMB）：提高并发读取数
+        self.action_slow_storage = QAction(self.tr('slow_storage'), self)
+        self.action_slow_storage.setIcon(create_emoji_icon("🐢"))
+        self.action_slow_storage.setCheckable(True)
+        self.action_slow_storage.setChecked(self.slow_storage)
+        self.action_slow_storage.toggled.connect(self.set_slow_storage)
+        self.toolbar.addAction(self.action_slow_storage)
+
+        # 缩略图大小
+        self.thumb_slider = QSlider(Qt.Orientation.Horizontal)
+        self.thumb_slider.setRange(120, 400)
+        self.thumb_slider.setSingleStep(20)
+        self.thumb_slider.setPageStep(40)
+        self.thumb_slider.setFixedWidth(120)
+        self.thumb_slider.setValue(self.thumb_icon_size)
+        self.thumb_slider.setToolTip(self.tr('thumb_size'))
+        self.thumb_slider.valueChanged.connect(self.set_thumb_icon_size)
+        self.toolbar.addWidget(self.thumb_slider)
+
+        # 中间空白撑开
+        empty = QWidget()
+        empty.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Preferred)
+        self.toolbar.addWidget(empty)
+
+        # 右侧：语言 (QMenu) / 主题 / 清空列表
+        self.lang_action = QAction(self.tr('lang_btn'), self)
+        self.lang_action.setIcon(create_emoji_icon("🌐"))
+        
+        # 创建菜单
+        self.lang_menu = QMenu(self)
+        
+        langs = [
+            ('English', 'en'),
+            ('简体中文', 'cn'),
+            ('繁體中文', 'tc'),
+            ('日本語', 'jp'),
+            ('한국어', 'kr')
+        ]
+        
+        for label, code in langs:
+            action = QAction(label, self)
+            action.triggered.connect(lambda checked, c=code: self.set_language(c))
+            self.lang_menu.addAction(action)
+
+        self.toolbar.addAction(self.lang_action)
+        
+        # 将 action 对应的 widget 设置为弹出菜单模式
+        widget = self.toolbar.widgetForAction(self.lang_action)
+        if isinstance(widget, QToolButton):
+            widget.setMenu(self.lang_menu)
+            widget.setPopupMode(QToolButton.ToolButtonPopupMode.InstantPopup)
+
+        self.theme_action = QAction(self.tr('theme'), self)
+        self.theme_action.setIcon(create_emoji_icon("🌗"))
+        self.theme_action.triggered.connect(self.toggle_theme)
+        self.toolbar.addAction(self.theme_action)
+
+        # 内存面板：各缓存占用与总预算
+        self.action_memory = QAction(self.tr('memory'), self)
+        self.action_memory.setIcon(create_emoji_icon("📊"))
+        self.action_memory.triggered.connect(lambda: MemoryDialog(self).show())
+        self.toolbar.addAction(self.action_memory)
+
+        # 清空列表：最右侧，用红色图标
+        self.action_clear = QAction(self.tr('clear'), self)
+        self.action_clear.setIcon(create_emoji_icon("🧹", color="#ff4d4f"))
+        self.action_clear.triggered.connect(self.clear_all)
+        self.toolbar.addAction(self.action_clear)
+
+    # ---------- Grid View ----------
+    def setup_grid_view(self):
+        self.grid_page = QWidget()
+        page_layout = QHBoxLayout(self.grid_page)
+        page_layout.setContentsMargins(10, 10, 10, 0)
+        page_layout.setSpacing(8)
+
+        # 左侧筛选面板（默认隐藏）
+        self.facet_tree = QTreeWidget()
+        self.facet_tree.setHeaderHidden(True)
+        self.facet_tree.setFixedWidth(240)
+        self.facet_tree.setFrameShape(QFrame.Shape.NoFrame)
+        self.facet_tree.itemClicked.connect(self.on_facet_clicked)
+        self.facet_tree.hide()
+        page_layout.addWidget(self.facet_tree)
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        page_layout.addLayout(layout)
+
+        self.hint_label = QLabel(self.tr('drag_hint'))
+        self.hint_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.hint_label.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+        layout.addWidget(self.hint_label)
+
+        self.grid_layout = layout
+        # 初始状态：列表隐藏，显示提示文字（居中）
+        self.list_widget = self.create_grid_widget()
+
+        self.stacked_widget.addWidget(self.grid_page)
+
+        # 悬浮排序按钮
+        self.sort_fab = QToolButton(self.grid_page)
+        self.sort_fab.setToolButtonStyle(Qt.ToolButtonStyle.ToolButtonIconOnly)
+        self.sort_fab.setToolTip(self.tr('sort'))
+        self.sort_fab.setFixedSize(36, 36)
+        self.sort_fab.setIconSize(QSize(18, 18))
+        self.sort_fab.setCursor(Qt.CursorShape.PointingHandCursor)
+        self.sort_fab.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self.sort_fab.setObjectName("sort_fab")
+
+        self.sort_menu = QMenu(self)
+        self.sort_group = QActionGroup(self)
+        self.sort_actions = {}
+        if self.sort_mode not in dict(SORT_MODES):
+            self.sort_mode = "name_natural"
+        for mode, key in SORT_MODES:
+            action = QAction(self.tr(key), self, checkable=True)
+            action.triggered.connect(lambda checked, m=mode: self.set_sort_mode(m))
+            self.sort_group.addAction(action)
+            self.sort_actions[mode] = action
+            # 文件属性 / 元数据两组之间加分隔线
+            if mode == "dimensions":
+                self.sort_menu.addSeparator()
+            self.sort_menu.addAction(action)
+        self.sort_actions[self.sort_mode].setChecked(True)
 
         # 跟踪菜单的关闭时间，用于防止点击按钮时立即重新打开
         import time
@@ -644,7 +4165,14 @@ class MainWindow(QMainWindow):
         self.image_label = QLabel("")
         self.image_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.image_scroll.setWidget(self.image_label)
-        img_layout.addWidget(self.image_scroll)
+
+        # 适应窗口（image_scroll）和缩放 / 平移（zoom_view）两种显示方式叠在一起
+        self.zoom_view = TiledImageView(owner=self)
+        self.zoom_view.tile_budget_bytes = self.settings.value("tile_cache_mb", 128, type=int) * 1024 * 1024
+        self.image_stack = QStackedWidget()
+        self.image_stack.addWidget(self.image_scroll)
+        self.image_stack.addWidget(self.zoom_view)
+        img_layout.addWidget(self.image_stack)
 
         self.btn_next = QPushButton("▶")
         self.btn_next.setCursor(Qt.CursorShape.PointingHandCursor)
@@ -656,6 +4184,9 @@ class MainWindow(QMainWindow):
 
         self.info_text = QTextBrowser()
         self.info_text.setOpenExternalLinks(False)
+        # 复制按钮只是 anchor：不让 QTextBrowser 去“打开”链接，点了之后文档保持原样、不重排
+        self.info_text.setOpenLinks(False)
+        self.blank_doc = QTextDocument(self)
         self.info_text.anchorClicked.connect(self.on_link_clicked)
         self.info_text.setFrameShape(QFrame.Shape.NoFrame)
         self.splitter.addWidget(self.info_text)
@@ -688,6 +4219,34 @@ class MainWindow(QMainWindow):
         self.shortcut_delete = QShortcut(QKeySequence(Qt.Key.Key_Delete), self)
         self.shortcut_delete.activated.connect(self.delete_current_image)
 
+        # 缩放：Ctrl+= / Ctrl+- ，Ctrl+0 或 Esc 回到适应窗口
+        self.shortcut_zoom_in = QShortcut(QKeySequence(QKeySequence.StandardKey.ZoomIn), self)
+        self.shortcut_zoom_in.activated.connect(lambda: self.zoom_by(1.25))
+        self.shortcut_zoom_out = QShortcut(QKeySequence(QKeySequence.StandardKey.ZoomOut), self)
+        self.shortcut_zoom_out.activated.connect(lambda: self.zoom_by(0.8))
+        self.shortcut_zoom_fit = QShortcut(QKeySequence("Ctrl+0"), self)
+        self.shortcut_zoom_fit.activated.connect(self.exit_zoom)
+        self.shortcut_zoom_esc = QShortcut(QKeySequence(Qt.Key.Key_Escape), self)
+        self.shortcut_zoom_esc.activated.connect(self.exit_zoom)
+        self.shortcut_zoom_esc.activated.connect(self.stop_slideshow)
+
+        # F5：开始 / 停止幻灯片
+        self.shortcut_slideshow = QShortcut(QKeySequence(Qt.Key.Key_F5), self)
+        self.shortcut_slideshow.activated.connect(self.action_slideshow.toggle)
+
+        # Ctrl+T / Ctrl+W：新建 / 关闭标签页，Ctrl+Tab 切到下一个
+        self.shortcut_new_tab = QShortcut(QKeySequence(QKeySequence.StandardKey.AddTab), self)
+        self.shortcut_new_tab.activated.connect(self.open_folder_in_new_tab)
+        self.shortcut_close_tab = QShortcut(QKeySequence(QKeySequence.StandardKey.Close), self)
+        self.shortcut_close_tab.activated.connect(lambda: self.close_session(self.active_session))
+        self.shortcut_next_tab = QShortcut(QKeySequence(QKeySequence.StandardKey.NextChild), self)
+        self.shortcut_next_tab.activated.connect(
+            lambda: self.tab_bar.setCurrentIndex((self.active_session + 1) % len(self.sessions)))
+
+        # Ctrl+Z：撤销最近一次还在撤销窗口内的删除
+        self.shortcut_undo = QShortcut(QKeySequence(QKeySequence.StandardKey.Undo), self)
+        self.shortcut_undo.activated.connect(self.undo_delete)
+
     def _shortcut_prev(self):
         if self.stacked_widget.currentIndex() == 1:
             self.show_prev_image()
@@ -739,36 +4298,39 @@ class MainWindow(QMainWindow):
         self.btn_next.setEnabled(self.current_index < len(self.current_file_list) - 1)
 
     # ---------- 删除当前图片/选中图片 ----------
-    # ---------- 删除当前图片 ----------
     def delete_current_image(self):
-        """在磁盘中删除按当前选定的图片/当前展示的图片：
+        """删除网格中选中的图片（可多选）/ 详情页当前展示的图片：
+        先从界面一次性移除，撤销窗口过后在后台线程里分批移入回收站
         """
         if not self.current_file_list:
             return
 
-        target_path = None
+        targets = []
         if self.stacked_widget.currentIndex() == 0:
-            # 网格页：删除当前项
-            item = self.list_widget.currentItem()
-            if not item:
-                return
-            target_path = item.data(Qt.ItemDataRole.UserRole)
+            # 网格页：删除所有选中项，没有选中时删当前项
+            items = self.list_widget.selectedItems()
+            if not items and self.list_widget.currentItem():
+                items = [self.list_widget.currentItem()]
+            targets = [it.data(Qt.ItemDataRole.UserRole) for it in items]
         else:
             # 详情页：删除当前张
             if self.current_index < 0 or self.current_index >= len(self.current_file_list):
                 return
-            target_path = self.current_file_list[self.current_index]
+            targets = [self.current_file_list[self.current_index]]
 
-        if not target_path:
+        targets = [p for p in targets if p]
+        if not targets:
             return
 
-        # 确认弹窗
+        # 确认弹窗（多选时只弹一次）
         msg = QMessageBox(self)
         msg.setIcon(QMessageBox.Icon.Warning)
         msg.setWindowTitle(self.tr('delete_confirm_title'))
 
-        name = os.path.basename(target_path)
-        msg.setText(self.tr('delete_confirm_one').format(name))
+        if len(targets) == 1:
+            msg.setText(self.tr('delete_confirm_one').format(os.path.basename(targets[0])))
+        else:
+            msg.setText(self.tr('delete_confirm_many').format(len(targets)))
 
         msg.setStandardButtons(QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
         msg.setDefaultButton(QMessageBox.StandardButton.No)
@@ -776,77 +4338,220 @@ class MainWindow(QMainWindow):
         if ret != QMessageBox.StandardButton.Yes:
             return
 
-        # 移入回收站
-        error = False
-        try:
-            if os.path.exists(target_path):
-                send2trash.send2trash(target_path)
-        except Exception:
-            error = True
-
-        # 从内存列表中删掉
-        old_index = self.current_index if self.current_index >= 0 else 0
-        if target_path in self.current_file_list:
-            self.current_file_list.remove(target_path)
-
-        # 从 QListWidget 中删除对应 item
-        for i in range(self.list_widget.count()):
-            item = self.list_widget.item(i)
-            if item.data(Qt.ItemDataRole.UserRole) == target_path:
-                self.list_widget.takeItem(i)
-                break
+        taken, first_row = self.remove_paths_from_view(targets)
+        if not taken:
+            return
 
-        # 更新界面
+        # 延迟提交：撤销窗口内 Ctrl+Z 可以原样放回
+        batch = {'paths': [item.data(Qt.ItemDataRole.UserRole) for _, item in taken], 'taken': taken}
+        timer = QTimer(self)
+        timer.setSingleShot(True)
+        timer.timeout.connect(lambda b=batch: self.commit_pending_trash(b))
+        batch['timer'] = timer
+        self.pending_trash.append(batch)
+        timer.start(self.trash_undo_ms)
+
+        self.after_paths_removed(first_row)
+        self.show_toast(self.tr('deleted_undo').format(len(taken)), duration=self.trash_undo_ms)
+
+    def remove_paths_from_view(self, paths):
+        """同时从 current_file_list 和网格里移除，返回 [(原行号, item)] 和最小行号"""
+        rows = self.current_file_list.remove_many(paths)
+        if not rows:
+            return [], -1
+        for p in paths:
+            self.loaded_files.pop(p, None)
+            self.facets.remove(p)
+        self.facet_timer.start()
+
+        taken = []
+        self.list_widget.setUpdatesEnabled(False)
+        # 从后往前摘，前面的行号不会变
+        for row in reversed(rows):
+            item = self.list_widget.takeItem(row)
+            if item is None:
+                continue
+            self.iconed_paths.discard(item.data(Qt.ItemDataRole.UserRole))
+            item.setIcon(QIcon())
+            taken.append((row, item))
+        self.list_widget.setUpdatesEnabled(True)
+        taken.reverse()
+        return taken, rows[0]
+
+    def after_paths_removed(self, first_row):
+        """删除/撤销之后刷新当前位置和界面"""
         if not self.current_file_list:
             # 全删光了，回到空网格
             self.current_index = -1
             self.image_label.clear()
-            self.info_text.clear()
+            self.clear_metadata_view()
             self.hint_label.show()
+            self.list_widget.hide()
             self.show_grid()
+            return
+
+        # 还有图片，算一个新的 index
+        new_index = min(max(first_row, 0), len(self.current_file_list) - 1)
+        self.current_index = new_index
+
+        if self.stacked_widget.currentIndex() == 0:
+            # 网格页：更新选中项
+            item = self.list_widget.item(new_index)
+            if item:
+                self.list_widget.setCurrentItem(item)
+                self.list_widget.scrollToItem(item)
         else:
-            # 还有图片，算一个新的 index
-            new_index = min(old_index, len(self.current_file_list) - 1)
-            self.current_index = new_index
-
-            if self.stacked_widget.currentIndex() == 0:
-                # 网格页：更新选中项
-                next_path = self.current_file_list[new_index]
-                for i in range(self.list_widget.count()):
-                    item = self.list_widget.item(i)
-                    if item.data(Qt.ItemDataRole.UserRole) == next_path:
-                        self.list_widget.setCurrentItem(item)
-                        self.list_widget.scrollToItem(item)
-                        break
-            else:
-                # 详情页：跳到新的一张
-                self.show_image_detail(self.current_file_list[new_index])
+            # 详情页：跳到新的一张
+            self.show_image_detail(self.current_file_list[new_index])
+        self.residency_timer.start()
+
+    def undo_delete(self):
+        if not self.pending_trash:
+            return
+        batch = self.pending_trash.pop()
+        batch['timer'].stop()
+
+        # 按原行号从小到大插回去，恢复删除前的顺序
+        self.current_file_list.insert_many(
+            [(row, item.data(Qt.ItemDataRole.UserRole)) for row, item in batch['taken']])
+        for path in batch['paths']:
+            self.loaded_files[path] = None
+            if path in self.metadata_records:
+                self.facets.add(path, self.metadata_records[path])
+        self.facet_timer.start()
+        self.list_widget.setUpdatesEnabled(False)
+        for row, item in batch['taken']:
+            self.list_widget.insertItem(row, item)
+        self.list_widget.setUpdatesEnabled(True)
+
+        self.hint_label.hide()
+        self.list_widget.show()
+        first_row = batch['taken'][0][0]
+        if self.stacked_widget.currentIndex() == 1:
+            self.show_image_detail(self.current_file_list[first_row])
+        else:
+            self.current_index = first_row
+            self.list_widget.clearSelection()
+            for _, item in batch['taken']:
+                item.setSelected(True)
+            self.list_widget.scrollToItem(batch['taken'][0][1])
+            QTimer.singleShot(0, self.update_grid_for_width)
+        self.residency_timer.start()
+        self.show_toast(self.tr('undo_done').format(len(batch['taken'])))
+
+    def commit_pending_trash(self, batch):
+        """撤销窗口结束：交给后台线程移入回收站"""
+        if batch in self.pending_trash:
+            self.pending_trash.remove(batch)
+        batch['timer'].stop()
+        # 缩略图等移入回收站确实成功了再丢（on_trash_done），失败的放回网格时还能直接用
+        self.trash_queue.append((batch['paths'], self.load_generation))
+        self.start_next_trash_batch()
+
+    def flush_pending_trash(self):
+        """列表被替换（重新加载 / 清空 / 退出）前，把还在撤销窗口内的删除立即提交"""
+        for batch in list(self.pending_trash):
+            self.commit_pending_trash(batch)
+
+    def start_next_trash_batch(self):
+        if self.trash_thread and self.trash_thread.isRunning():
+            return
+        if not self.trash_queue:
+            return
+        paths, generation = self.trash_queue.pop(0)
+        self.trash_thread = TrashWorker(paths, generation)
+        self.trash_thread.progress.connect(self.on_trash_progress)
+        self.trash_thread.done.connect(self.on_trash_done)
+        self.trash_thread.start()
+
+    def on_trash_progress(self, done, total):
+        if total > TrashWorker.BATCH_SIZE:
+            self.show_toast(self.tr('deleting').format(done, total), duration=0)
+
+    def on_trash_done(self, trashed, failed):
+        generation = self.sender().generation
+        if generation == self.load_generation:
+            session = None
+            residency = self.thumb_residency
+        else:
+            session = self.session_for_generation(generation)
+            residency = session.thumb_residency if session is not None else None
+        if residency is not None:
+            for p in trashed:
+                residency.discard(p)
+        if self.thumb_store is not None:
+            self.thumb_store.discard([thumb_key(p, tier) for p in trashed for tier in THUMB_TIERS])
+        if failed:
+            if generation == self.load_generation:
+                self.restore_failed_trash(failed)
+            elif session is not None:
+                # 后台标签页：切回去时按补上失败文件的列表重新铺
+                stats = session.pending_stats
+                if stats is None:
+                    stats = {p: session.file_stats[p] for p in session.loaded_files if p in session.file_stats}
+                stats.update(stat_files(failed))
+                session.pending_stats = stats
 
         # 提示
-        if error:
+        if failed:
             self.show_toast(self.tr('delete_error'))
-        else:
+        elif len(trashed) > TrashWorker.BATCH_SIZE:
             self.show_toast(self.tr('deleted'))
+        QTimer.singleShot(0, self.start_next_trash_batch)
+
+    def restore_failed_trash(self, paths):
+        """没能移入回收站的文件放回列表和网格（按当前排序 / 筛选），缩略图从驻留缓存挂回"""
+        paths = [p for p in paths if p not in self.loaded_files and os.path.exists(p)]
+        if not paths:
+            return
+        for p in paths:
+            self.loaded_files[p] = None
+            if p in self.metadata_records:
+                self.facets.add(p, self.metadata_records[p])
+        self.facet_timer.start()
+        if self.dup_groups is not None:
+            self.resort_current_list()
+        else:
+            self.insert_view_paths(paths)
+        if self.current_file_list:
+            self.hint_label.hide()
+            self.list_widget.show()
+        if self.current_image_path:
+            self.current_index = self.current_file_list.row_of(self.current_image_path)
+            self.update_nav_buttons()
+        self.update_tab_bar()
 
     # ---------- 清空全部 ----------
     def clear_all(self):
-        # 停止 loader 线程
-        if self.loader_thread and self.loader_thread.isRunning():
-            self.loader_thread.stop()
-        self.loader_thread = None
-
-
+        self.flush_pending_trash()
+        # 后台线程只发取消信号、不等待；换了代次后它们迟到的结果都会被丢弃
+        self.load_generation = self.next_generation()
+        self.cancel_background_loaders()
+        self.current_folder = None
+        self.folder_mtime = None
 
         # 清空状态
-        self.current_file_list = []
+        self.stop_duplicate_finder()
+        self.dup_groups = None
+        self.action_dups.blockSignals(True)
+        self.action_dups.setChecked(False)
+        self.action_dups.blockSignals(False)
+        self.loaded_files = {}
+        self.facets.reset()
+        self.facet_filters = {}
+        self.refresh_facet_panel()
+        self.current_file_list = IndexedFileList()
         self.current_index = -1
         self.current_image_path = None
-        self.last_html = ""
+        self.doc_cache.clear()
         self.current_pos_text = ""
         self.current_neg_text = ""
 
         # 清空 UI
         self.list_widget.clear()
+        self.reset_grid_items()
+        self.thumb_residency.clear()
+        self.update_tab_bar()
         
         # 清空后：隐藏列表，显示提示（居中）
         self.list_widget.hide()
@@ -856,7 +4561,7 @@ class MainWindow(QMainWindow):
             self.sort_fab.hide()
         
         self.image_label.clear()
-        self.info_text.clear()
+        self.clear_metadata_view()
 
         # 回到网格页，禁用左右键快捷键
         self.stacked_widget.setCurrentIndex(0)
@@ -871,6 +4576,7 @@ class MainWindow(QMainWindow):
     def set_language(self, lang_code):
         self.lang = lang_code
         self.settings.setValue("language", lang_code)
+        self.doc_cache.clear()
         self.update_ui_text()
 
     def update_ui_text(self):
@@ -884,10 +4590,26 @@ class MainWindow(QMainWindow):
 
         if hasattr(self, 'sort_fab'):
             self.sort_fab.setToolTip(self.tr('sort'))
-            self.sort_name_action.setText(self.tr('sort_name'))
-            self.sort_mtime_action.setText(self.tr('sort_mtime'))
+            for mode, key in SORT_MODES:
+                self.sort_actions[mode].setText(self.tr(key))
 
         self.action_delete.setText(self.tr('delete'))
+        self.action_slideshow.setText(self.tr('slideshow'))
+        for ms, action in self.slideshow_interval_actions.items():
+            action.setText(self.tr('slideshow_seconds').format(ms / 1000))
+        self.action_dups.setText(self.tr('find_dups'))
+        self.action_facets.setText(self.tr('facets'))
+        self.action_new_tab.setText(self.tr('new_tab'))
+        self.action_slow_storage.setText(self.tr('slow_storage'))
+        self.action_export.setText(self.tr('export'))
+        self.action_memory.setText(self.tr('memory'))
+        for mode, key in EXPORT_MODES:
+            self.export_actions[mode].setText(self.tr(key))
+        self.thumb_slider.setToolTip(self.tr('thumb_size'))
+        if hasattr(self, 'tab_bar'):
+            self.update_tab_bar()
+        if hasattr(self, 'facet_tree'):
+            self.refresh_facet_panel()
         self.hint_label.setText(self.tr('drag_hint'))
         self.hint_label.setStyleSheet(
             f"color: #aaa; font-family: {NativeTheme.FONT_FAMILY}; font-size: 24px; font-weight: 300;")
@@ -895,14 +4617,64 @@ class MainWindow(QMainWindow):
             self.show_image_detail(self.current_image_path, keep_view=True)
 
     def on_link_clicked(self, url: QUrl):
+        link = url.toString()
+        if link.startswith('expand:'):
+            # 展开折叠的段落：只重排这一张的文档，保持滚动位置
+            record = self.metadata_records.get(self.current_image_path)
+            if record is not None:
+                bar = self.info_text.verticalScrollBar()
+                value = bar.value()
+                self.expanded_sections.add(link.split(':', 1)[1])
+                self.render_metadata(record, self.current_image_path, record.get('width'), record.get('height'))
+                bar.setValue(value)
+            return
+        if link == 'raw_json':
+            if self.current_image_path:
+                RawJsonDialog(self, self.current_image_path).show()
+            return
         if url.toString() == 'copy_pos':
             QApplication.clipboard().setText(self.current_pos_text)
             self.show_toast(self.tr('copied'))
-            self.info_text.setHtml(self.last_html)
         elif url.toString() == 'copy_neg':
             QApplication.clipboard().setText(self.current_neg_text)
             self.show_toast(self.tr('copied'))
-            self.info_text.setHtml(self.last_html)
+
+    def closeEvent(self, event):
+        # 退出前把撤销窗口内的删除落实，并等后台回收站线程做完
+        self.flush_pending_trash()
+        self.save_last_session()
+        if self.trash_thread is not None:
+            self.trash_thread.wait()
+        self.jobs.shutdown()
+        if self.tile_builder is not None:
+            self.retire_thread(self.tile_builder)
+        self.cancel_background_loaders()
+        for session in self.background_sessions():
+            for thread in session.threads():
+                self.retire_thread(thread)
+        for thread in list(self.scan_threads):
+            self.retire_thread(thread)
+        if self.export_thread is not None:
+            self.retire_thread(self.export_thread)
+        for thread in list(self.retired_threads):
+            thread.wait()
+        self.zoom_view.release()
+        # 队列里剩下的批次直接同步处理
+        while self.trash_queue:
+            TrashWorker(*self.trash_queue.pop(0)).run()
+        if self.thumb_store is not None:
+            self.thumb_store.close()
+            self.thumb_store = None
+        self.io_scheduler.shutdown()
+        super().closeEvent(event)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        # 窗口拖到另一块屏幕（缩放比例不同）时按新的物理像素重新选缩略图档位
+        handle = self.windowHandle()
+        if handle is not None and not self.screen_hooked:
+            handle.screenChanged.connect(lambda _screen: self.apply_thumb_tier())
+            self.screen_hooked = True
 
     # ---------- Resize ----------
     def resizeEvent(self, event: QResizeEvent):
@@ -911,6 +4683,7 @@ class MainWindow(QMainWindow):
             QTimer.singleShot(50, lambda: self.display_image_fit(self.current_image_path))
         # 列表页根据宽度自适应铺满
         QTimer.singleShot(0, self.update_grid_for_width)
+        self.residency_timer.start()
         self.position_sort_fab()
         super().resizeEvent(event)
 
@@ -942,9 +4715,7 @@ class MainWindow(QMainWindow):
             elif not dropped_files:
                 return
             elif len(dropped_files) == 1:
-                p = dropped_files[0]
-                self.load_from_folder_path(os.path.dirname(p))
-                self.show_image_detail(p)
+                self.open_single_image(dropped_files[0])
             else:
                 self.load_images_list(dropped_files)
                 if self.current_file_list:
@@ -963,9 +4734,7 @@ class MainWindow(QMainWindow):
         if not files:
             return
         if len(files) == 1:
-            target = files[0]
-            self.load_from_folder_path(os.path.dirname(target))
-            self.show_image_detail(target)
+            self.open_single_image(files[0])
         else:
             self.load_images_list(files)
             self.show_image_detail(files[0])
@@ -994,41 +4763,93 @@ class MainWindow(QMainWindow):
         self.sort_fab.move(x, y)
 
     def set_sort_mode(self, mode):
-        if mode not in ("name_natural", "mtime"): return
+        if mode not in self.sort_actions: return
         if self.sort_mode == mode: return
         self.sort_mode = mode
         self.settings.setValue("sort_mode", mode)
-
-        if self.sort_mode == "mtime":
-            self.sort_mtime_action.setChecked(True)
+        self.sort_actions[mode].setChecked(True)
+        self.resort_current_list()
+
+    def build_view_list(self):
+        """网格要显示的路径：普通模式是全部已加载文件排序后的结果，相似图模式按组排列"""
+        if self.facet_filters:
+            facets, filters = self.facets, self.facet_filters
+            candidates = [p for p in self.loaded_files if facets.matches(p, filters)]
         else:
-            self.sort_name_action.setChecked(True)
-
-        if not self.current_file_list:
+            candidates = self.loaded_files
+        if self.dup_groups is None:
+            return self.apply_sort(candidates)
+        paths = []
+        allowed = candidates if isinstance(candidates, dict) else set(candidates)
+        for group in self.dup_groups:
+            members = [p for p in group if p in allowed]
+            if len(members) > 1:
+                paths.extend(self.apply_sort(members))
+        return paths
+
+    def insert_view_paths(self, paths):
+        """
+        把新加载的路径插进当前视图（遵守筛选和排序），网格只新建这些 item。
+        相似图分组是对旧列表算的，新文件不在任何组里，和 build_view_list 一样不显示。
+        """
+        if self.dup_groups is not None:
+            return
+        if self.facet_filters:
+            facets, filters = self.facets, self.facet_filters
+            paths = [p for p in paths if facets.matches(p, filters)]
+        if not paths:
+            return
+        key = self.sort_key_func(self.sort_mode)
+        keys = [key(p) for p in self.current_file_list]
+        # 新路径先排好序，第 i 个的最终行号 = 在旧列表里的插入点 + i
+        row_paths = [(bisect.bisect_right(keys, key(p)) + i, p)
+                     for i, p in enumerate(self.apply_sort(paths))]
+        self.current_file_list.insert_many(row_paths)
+        size_hint = self.list_widget.gridSize()
+        self.list_widget.setUpdatesEnabled(False)
+        for row, path in row_paths:
+            self.list_widget.insertItem(row, self.make_grid_item(path, None, size_hint))
+        self.list_widget.setUpdatesEnabled(True)
+        self.residency_timer.start()
+
+    def grid_labels(self):
+        """相似图模式下，item 文字前面加上组号"""
+        if self.dup_groups is None:
+            return None
+        labels = {}
+        for gi, group in enumerate(self.dup_groups, 1):
+            for p in group:
+                labels[p] = f"#{gi} · "
+        return labels
+
+    def resort_current_list(self):
+        if not self.loaded_files:
             return
 
-        self.current_file_list = self.apply_sort(self.current_file_list)
+        self.flush_pending_trash()
+        self.current_file_list = IndexedFileList(self.build_view_list())
 
         selected_path = None
         cur_item = self.list_widget.currentItem()
         if cur_item:
             selected_path = cur_item.data(Qt.ItemDataRole.UserRole)
 
-        self.list_widget.clear()
         self.hint_label.hide()
         self.list_widget.show()
 
-        if self.loader_thread and self.loader_thread.isRunning():
-            self.loader_thread.stop()
-
-        self.loader_thread = ThumbnailLoader(self.current_file_list)
-        self.loader_thread.thumbnail_loaded.connect(self.add_thumbnail_item)
-        self.loader_thread.start()
+        # 重排只重建 item，已生成的缩略图从驻留缓存取，不重新解码
+        self.populate_grid(self.current_file_list, self.grid_labels())
+        self.start_thumbnail_loader()
 
-        if selected_path and selected_path in self.current_file_list:
-            idx = self.current_file_list.index(selected_path)
+        idx = self.current_file_list.row_of(selected_path)
+        if idx >= 0:
             QTimer.singleShot(200, lambda: self._select_grid_index(idx))
 
+        # 详情页打开时重排（例如索引刚建完），当前位置跟着新顺序走
+        if self.current_image_path:
+            self.current_index = self.current_file_list.row_of(self.current_image_path)
+            self.update_nav_buttons()
+
     def _select_grid_index(self, idx):
         if 0 <= idx < self.list_widget.count():
             item = self.list_widget.item(idx)
@@ -1045,8 +4866,7 @@ class MainWindow(QMainWindow):
             return
         
         
-        self.sort_name_action.setChecked(self.sort_mode == "name_natural")
-        self.sort_mtime_action.setChecked(self.sort_mode == "mtime")
+        self.sort_actions[self.sort_mode].setChecked(True)
 
         br = self.sort_fab.mapToGlobal(self.sort_fab.rect().bottomRight())
         menu_size = self.sort_menu.sizeHint()
@@ -1060,30 +4880,82 @@ class MainWindow(QMainWindow):
         self.sort_menu.popup(QPoint(x, y))
 
     def load_from_folder_path(self, folder_path):
+        """
+        目录在后台扫描（大文件夹 / 网络盘也不卡界面）：新文件夹边扫边并入网格，
+        重新打开当前文件夹时保留现有列表，扫完有变化才替换
+        """
         if not os.path.isdir(folder_path):
             return
-        files = [
-            os.path.normpath(os.path.join(folder_path, f))
-            for f in os.listdir(folder_path)
-            if f.lower().endswith(VALID_EXTENSIONS)
-        ]
-        self.load_images_list(files)
+        folder = os.path.normpath(folder_path)
+        if folder == self.current_folder and self.loaded_files:
+            if not self.scanning_current_list():
+                self.start_listing_scan()
+            return
+        self.load_images_list([], stats={})
+        self.current_folder = folder
+        try:
+            self.folder_mtime = os.stat(folder).st_mtime
+        except OSError:
+            self.folder_mtime = None
+        self.update_tab_bar()
+        self.start_listing_scan(progressive=True)
+
+    def sort_key_func(self, mode):
+        """排序 key 全部来自扫描结果和元数据索引的缓存，排序时不碰磁盘"""
+        cache = self.natural_keys
+
+        def name_key(p):
+            k = cache.get(p)
+            if k is None:
+                k = cache[p] = natural_key(p)
+            return k
+
+        if mode == "name_natural":
+            return name_key
+
+        stats = self.file_stats
+        records = self.metadata_records
+
+        def stat_value(p):
+            st = stats.get(p)
+            if st is None:
+                return None
+            return -(st[0] if mode == "size" else st[1])   # 大的 / 新的在前
+
+        def record_value(p):
+            rec = records.get(p)
+            if not rec:
+                return None
+            if mode == "dimensions":
+                w, h = rec.get('width'), rec.get('height')
+                return -(w * h) if w and h else None
+            if mode == "model":
+                return rec.get('model').casefold() if rec.get('model') else None
+            if mode == "lora":
+                names = rec.get('lora_names')
+                return names[0].casefold() if names else None
+            return rec.get(mode)   # seed / steps / cfg：从小到大
+
+        value = stat_value if mode in ("mtime", "size") else record_value
+
+        def key(p):
+            v = value(p)
+            # 缺失值一律排在最后，同值按文件名
+            return (v is None, v if v is not None else 0, name_key(p))
+        return key
+
     def apply_sort(self, files):
         if not files:
             return []
-        if self.sort_mode == "mtime":
-            def safe_mtime(p):
-                try: return os.path.getmtime(p)
-                except: return 0
-            return sorted(files, key=safe_mtime, reverse=True)
-        else: # "name_natural"
-            def natural_key(p):
-                basename = os.path.basename(p).lower()
-                return [int(text) if text.isdigit() else text for text in re.split(r'(\d+)', basename)]
-            return sorted(files, key=natural_key)
+        return sorted(files, key=self.sort_key_func(self.sort_mode))
 
     # ---------- 加载图片列表 ----------
-    def load_images_list(self, file_paths):
+    def load_images_list(self, file_paths, stats=None):
+        self.flush_pending_trash()
+        self.load_generation = self.next_generation()
+        self.cancel_background_loaders()
+        self.current_folder = None
+        self.folder_mtime = None
         normalized = [os.path.normpath(p) for p in file_paths]
         seen = set()
         unique_paths = []
@@ -1091,11 +4963,35 @@ class MainWindow(QMainWindow):
             if p not in seen:
                 seen.add(p)
                 unique_paths.append(p)
-                
-        self.current_file_list = self.apply_sort(unique_paths)
 
-        self.list_widget.clear()
-        
+        # size / mtime 只在加载时取一次，之后排序全走缓存
+        old_stats = self.file_stats
+        self.file_stats = stats if stats is not None else stat_files(unique_paths)
+        self.metadata_records = {p: self.metadata_records[p] for p in unique_paths if p in self.metadata_records}
+        self.facets.reset()
+        for p, rec in self.metadata_records.items():
+            self.facets.add(p, rec)
+        self.facet_filters = {}
+        self.refresh_facet_panel()
+        self.natural_keys = {p: self.natural_keys[p] for p in unique_paths if p in self.natural_keys}
+        self.start_metadata_indexer()
+
+        self.loaded_files = dict.fromkeys(unique_paths)
+        self.stop_duplicate_finder()
+        self.dup_groups = None
+        self.action_dups.blockSignals(True)
+        self.action_dups.setChecked(False)
+        self.action_dups.blockSignals(False)
+        self.current_file_list = IndexedFileList(self.build_view_list())
+
+        # 新列表：只作废不在列表里、或文件已经变过的缩略图（同一文件夹重新扫描时其余照用）
+        residency = self.thumb_residency
+        for p in list(residency.compact) + list(residency.resident):
+            st = self.file_stats.get(p)
+            if st is None or st != old_stats.get(p):
+                residency.discard(p)
+        self.populate_grid(self.current_file_list)
+
         # 有数据时：显示列表，隐藏提示
         self.hint_label.hide()
         self.list_widget.show()
@@ -1106,19 +5002,631 @@ class MainWindow(QMainWindow):
             else:
                 self.sort_fab.hide()
 
-        if self.loader_thread and self.loader_thread.isRunning():
-            self.loader_thread.stop()
-
-        self.loader_thread = ThumbnailLoader(self.current_file_list)
-        self.loader_thread.thumbnail_loaded.connect(self.add_thumbnail_item)
-        self.loader_thread.start()
+        self.start_thumbnail_loader()
         self.show_grid()
         self.sort_fab.setVisible(len(self.current_file_list) > 0)
 
         # 加载新列表后，根据当前宽度再适配一次
         QTimer.singleShot(0, self.update_grid_for_width)
 
-    def add_thumbnail_item(self, path, pixmap):
+    # ---------- 相似图查找 ----------
+    def toggle_duplicate_mode(self, checked):
+        if checked:
+            self.find_duplicates()
+        else:
+            self.stop_duplicate_finder()
+            if self.dup_groups is not None:
+                self.dup_groups = None
+                self.resort_current_list()
+
+    # ---------- 导出 ----------
+    def export_targets(self):
+        """网格里选了两张以上就导出选中的（按网格顺序），否则导出当前列表（已应用筛选和排序）"""
+        if self.stacked_widget.currentIndex() == 0:
+            items = self.list_widget.selectedItems()
+            if len(items) > 1:
+                rows = sorted(self.list_widget.row(it) for it in items)
+                return [self.current_file_list[r] for r in rows]
+        return list(self.current_file_list)
+
+    def start_export(self, mode):
+        if self.export_thread is not None and self.export_thread.isRunning():
+            self.show_toast(self.tr('export_busy'))
+            return
+        paths = self.export_targets()
+        if not paths:
+            return
+        start_dir = self.current_folder or os.path.expanduser("~")
+        if mode in ("copy", "link"):
+            target = QFileDialog.getExistingDirectory(self, self.tr(dict(EXPORT_MODES)[mode]), start_dir)
+        else:
+            name = "export." + {"jsonl": "jsonl", "csv": "csv", "paths": "txt"}[mode]
+            target, _ = QFileDialog.getSaveFileName(
+                self, self.tr(dict(EXPORT_MODES)[mode]), os.path.join(start_dir, name))
+        if not target:
+            return
+        self.export_thread = ExportWorker(paths, self.metadata_records, mode, target)
+        self.export_thread.progress.connect(self.on_export_progress)
+        self.export_thread.exported.connect(self.on_export_finished)
+        self.export_thread.start()
+        self.show_toast(self.tr('exporting').format(0, len(paths)), duration=0)
+
+    def on_export_progress(self, done, total):
+        if self.sender() is self.export_thread:
+            self.show_toast(self.tr('exporting').format(done, total), duration=0)
+
+    def on_export_finished(self, count, copied, error):
+        if self.sender() is not self.export_thread:
+            return
+        if error:
+            self.show_toast(self.tr('export_failed').format(error), duration=4000)
+        elif copied:
+            self.show_toast(self.tr('export_done_copied').format(count, copied), duration=4000)
+        else:
+            self.show_toast(self.tr('export_done').format(count))
+
+    def find_duplicates(self):
+        if not self.loaded_files:
+            self.action_dups.setChecked(False)
+            return
+        self.stop_duplicate_finder()
+        stats = {p: self.file_stats[p] for p in self.loaded_files if p in self.file_stats}
+        self.dup_thread = DuplicateFinder(
+            self.metadata_index,
+            stats,
+            threshold=self.settings.value("dup_threshold", 6, type=int),
+            kind=self.settings.value("dup_hash", "phash", type=str),
+            jobs=self.jobs,
+        )
+        self.dup_thread.progress.connect(self.on_duplicate_progress)
+        self.dup_thread.groups_ready.connect(self.on_duplicate_groups)
+        self.dup_thread.start()
+
+    def stop_duplicate_finder(self):
+        if self.dup_thread is not None:
+            self.retire_thread(self.dup_thread)
+            self.dup_thread = None
+            # 收起常驻的进度提示
+            self.toast_timer.start(1)
+
+    def on_duplicate_progress(self, done, total):
+        if self.sender() is self.dup_thread:
+            self.show_toast(self.tr('hashing').format(done, total), duration=0)
+
+    def on_duplicate_groups(self, groups):
+        if self.sender() is not self.dup_thread:
+            return
+        self.dup_thread = None
+        if not groups:
+            self.show_toast(self.tr('dups_none'))
+            self.action_dups.setChecked(False)
+            return
+        # 大组在前；组内顺序由当前排序方式决定
+        groups.sort(key=len, reverse=True)
+        self.dup_groups = groups
+        if self.stacked_widget.currentIndex() != 0:
+            self.show_grid()
+        self.resort_current_list()
+        self.show_toast(self.tr('dups_found').format(len(groups), sum(len(g) for g in groups)))
+
+    # ---------- 筛选面板 ----------
+    def toggle_facet_panel(self, checked):
+        self.facet_tree.setVisible(checked)
+        if checked:
+            self.refresh_facet_panel()
+        QTimer.singleShot(0, self.update_grid_for_width)
+
+    def refresh_facet_panel(self):
+        """按当前计数重建面板（维度下的取值通常只有几十上百个，重建很便宜）"""
+        if not self.facet_tree.isVisible():
+            return
+        tree = self.facet_tree
+        expanded = {tree.topLevelItem(i).data(0, Qt.ItemDataRole.UserRole)
+                    for i in range(tree.topLevelItemCount()) if tree.topLevelItem(i).isExpanded()}
+        first_build = tree.topLevelItemCount() == 0
+        bar_value = tree.verticalScrollBar().value()
+
+        tree.setUpdatesEnabled(False)
+        tree.clear()
+        t = self.get_theme()
+        if self.facet_filters:
+            clear_item = QTreeWidgetItem([self.tr('facet_clear')])
+            clear_item.setData(0, Qt.ItemDataRole.UserRole, ("", None))
+            clear_item.setForeground(0, QColor(t['accent']))
+            tree.addTopLevelItem(clear_item)
+        for facet, key in FACETS:
+            counter = self.facets.counts[facet]
+            top = QTreeWidgetItem([f"{self.tr(key)} ({len(counter)})"])
+            top.setData(0, Qt.ItemDataRole.UserRole, facet)
+            font = top.font(0)
+            font.setBold(True)
+            top.setFont(0, font)
+            tree.addTopLevelItem(top)
+            selected = self.facet_filters.get(facet)
+            for value, count in counter.most_common():
+                child = QTreeWidgetItem([f"{value}  ({count})"])
+                child.setData(0, Qt.ItemDataRole.UserRole, (facet, value))
+                child.setToolTip(0, str(value))
+                if value == selected:
+                    child.setText(0, "✓ " + child.text(0))
+                    child.setForeground(0, QColor(t['accent']))
+                top.addChild(child)
+            top.setExpanded(facet in expanded or facet in self.facet_filters or (first_build and facet == "model"))
+        tree.setUpdatesEnabled(True)
+        tree.verticalScrollBar().setValue(bar_value)
+
+    def on_facet_clicked(self, item, column):
+        data = item.data(0, Qt.ItemDataRole.UserRole)
+        if not isinstance(data, tuple):
+            item.setExpanded(not item.isExpanded())
+            return
+        facet, value = data
+        if not facet:
+            self.facet_filters = {}
+        elif self.facet_filters.get(facet) == value:
+            del self.facet_filters[facet]
+        else:
+            self.facet_filters[facet] = value
+        self.resort_current_list()
+        self.refresh_facet_panel()
+
+    # ---------- 文件夹标签页 ----------
+    def setup_tab_bar(self):
+        self.tab_bar = QTabBar()
+        self.tab_bar.setDocumentMode(True)
+        self.tab_bar.setTabsClosable(True)
+        self.tab_bar.setExpanding(False)
+        self.tab_bar.setElideMode(Qt.TextElideMode.ElideMiddle)
+        self.tab_bar.addTab("")
+        self.tab_bar.currentChanged.connect(self.switch_to_session)
+        self.tab_bar.tabCloseRequested.connect(self.close_session)
+        self.tab_bar.hide()
+        self.main_layout.addWidget(self.tab_bar)
+
+    def new_thumb_residency(self):
+        # 常驻 QPixmap 与紧凑字节存储各自的内存上限（MB，可在设置里改）
+        thumb_mb = self.settings.value("thumb_memory_mb", 256, type=int)
+        compact_mb = self.settings.value("thumb_compact_mb", 256, type=int)
+        return ThumbnailResidency(thumb_mb * 1024 * 1024, compact_mb * 1024 * 1024)
+
+    def next_generation(self):
+        self.generation_seq += 1
+        return self.generation_seq
+
+    def background_sessions(self):
+        return [s for i, s in enumerate(self.sessions) if i != self.active_session]
+
+    def session_for_generation(self, generation):
+        for session in self.background_sessions():
+            if session.load_generation == generation:
+                return session
+        return None
+
+    def save_session(self, session):
+        for name in FolderSession.FIELDS:
+            setattr(session, name, getattr(self, name))
+        session.scroll_value = self.list_widget.verticalScrollBar().value()
+        item = self.list_widget.currentItem()
+        session.selected_path = item.data(Qt.ItemDataRole.UserRole) if item else None
+
+    def restore_session(self, session):
+        for name in FolderSession.FIELDS:
+            setattr(self, name, getattr(session, name))
+
+    def update_tab_bar(self):
+        for i, session in enumerate(self.sessions):
+            folder = self.current_folder if i == self.active_session else session.current_folder
+            count = len(self.loaded_files if i == self.active_session else session.loaded_files)
+            if folder:
+                title = os.path.basename(folder) or folder
+            elif count:
+                title = self.tr('tab_files')
+            else:
+                title = self.tr('new_tab')
+            self.tab_bar.setTabText(i, f"{title} ({count})" if count else title)
+            self.tab_bar.setTabToolTip(i, folder or "")
+        self.tab_bar.setVisible(len(self.sessions) > 1)
+
+    def open_folder_in_new_tab(self):
+        folder = QFileDialog.getExistingDirectory(self, "Select Folder")
+        if folder:
+            self.new_session()
+            self.load_from_folder_path(folder)
+
+    def new_session(self):
+        """新建一个空标签页并切过去；当前标签页保留全部状态，转到后台"""
+        self.sessions.append(FolderSession(self.new_thumb_residency(), self.sort_mode, self.create_grid_widget()))
+        self.tab_bar.blockSignals(True)
+        self.tab_bar.addTab("")
+        self.tab_bar.blockSignals(False)
+        self.update_tab_bar()
+        self.tab_bar.setCurrentIndex(len(self.sessions) - 1)
+
+    def switch_to_session(self, index):
+        if index == self.active_session or not 0 <= index < len(self.sessions):
+            return
+        self.flush_pending_trash()
+        self.stop_duplicate_finder()
+        if self.stacked_widget.currentIndex() == 1:
+            self.show_grid()
+
+        old = self.sessions[self.active_session]
+        # 转到后台的标签页只留视口附近的图标和 QPixmap，其余只剩紧凑字节
+        self.drop_thumbnail_icons(self.iconed_paths - self.protected_paths)
+        old.thumb_residency.drop_pixmaps(keep=self.protected_paths)
+        self.list_widget.hide()
+        self.save_session(old)
+        for thread in old.threads():
+            set_thread_background(thread, True)
+
+        self.active_session = index
+        session = self.sessions[index]
+        self.restore_session(session)
+        for thread in session.threads():
+            set_thread_background(thread, False)
+        self.show_session(session)
+
+    def show_session(self, session):
+        """把当前 session 的状态铺到界面上：网格是这个标签页自己的，不重建 item、不重新扫描、不重新解码"""
+        if self.sort_mode in self.sort_actions:
+            self.sort_actions[self.sort_mode].setChecked(True)
+        self.action_dups.blockSignals(True)
+        self.action_dups.setChecked(self.dup_groups is not None)
+        self.action_dups.blockSignals(False)
+        self.refresh_facet_panel()
+        self.current_index = -1
+
+        # 图标尺寸可能在这个标签页转到后台期间改过
+        self.list_widget.setIconSize(QSize(self.thumb_icon_size, self.thumb_icon_size))
+
+        if self.loaded_files:
+            # 后台期间索引可能已经建完：顺序真的变了才重排（排序 key 全在缓存里，不碰磁盘）
+            if self.build_view_list() != self.current_file_list.paths():
+                self.resort_current_list()
+            self.hint_label.hide()
+            self.list_widget.show()
+            if self.list_widget.currentItem() is None:
+                # 刚从上次会话恢复的标签页：还原滚动位置和选中项
+                QTimer.singleShot(0, lambda v=session.scroll_value: self.list_widget.verticalScrollBar().setValue(v))
+                row = self.current_file_list.row_of(session.selected_path)
+                if row >= 0:
+                    self.list_widget.setCurrentRow(row)
+            if self.loader_thread is None or not self.loader_thread.isRunning():
+                self.start_thumbnail_loader()
+            self.residency_timer.start()
+        else:
+            self.list_widget.hide()
+            self.hint_label.show()
+        self.update_tab_bar()
+        QTimer.singleShot(0, self.update_grid_for_width)
+        if session.pending_stats is not None:
+            stats, session.pending_stats = session.pending_stats, None
+            QTimer.singleShot(0, lambda: self.apply_listing(stats))
+        else:
+            QTimer.singleShot(0, self.refresh_session_folder)
+
+    def refresh_session_folder(self):
+        """文件夹在后台期间有增删时（目录 mtime 变了）才在后台重新扫描，结果由 on_listing_scanned 套用"""
+        folder = self.current_folder
+        if not folder:
+            return
+        try:
+            mtime = os.stat(folder).st_mtime
+        except OSError:
+            return
+        if mtime != self.folder_mtime and not self.scanning_current_list():
+            # 先记下这次看到的 mtime：列表没变（只是文件被改写）时不会每次切回来都再扫一遍
+            self.folder_mtime = mtime
+            self.start_listing_scan()
+
+    def scanning_current_list(self):
+        return any(t.generation == self.load_generation and t.isRunning() for t in self.scan_threads)
+
+    def apply_listing(self, stats):
+        """用新的文件列表替换当前标签页的内容，保留文件夹、滚动位置和正在看的图"""
+        folder = self.current_folder
+        scroll_value = self.list_widget.verticalScrollBar().value()
+        detail_path = self.current_image_path if self.stacked_widget.currentIndex() == 1 else None
+        self.load_images_list(list(stats.keys()), stats=stats)
+        if folder:
+            self.current_folder = folder
+            try:
+                self.folder_mtime = os.stat(folder).st_mtime
+            except OSError:
+                self.folder_mtime = None
+        self.update_tab_bar()
+        QTimer.singleShot(0, lambda v=scroll_value: self.list_widget.verticalScrollBar().setValue(v))
+        if detail_path and detail_path in self.current_file_list:
+            self.show_image_detail(detail_path)
+
+    def start_listing_scan(self, progressive=False):
+        thread = ListingScanner(self.current_folder, self.file_stats.keys(), self.load_generation, progressive)
+        thread.scanned.connect(self.on_listing_scanned)
+        thread.partial.connect(self.merge_listing)
+        thread.finished.connect(lambda t=thread: self.scan_threads.discard(t))
+        self.scan_threads.add(thread)
+        thread.start()
+
+    def on_listing_scanned(self, generation, stats):
+        if generation == self.load_generation:
+            if self.sender().progressive:
+                # 单张图先显示、兄弟文件后补：扫描完成时把剩下的并进来，再开始建索引
+                self.merge_listing(generation, stats)
+                self.start_metadata_indexer()
+            elif stats != self.file_stats:
+                self.apply_listing(stats)
+            return
+        session = self.session_for_generation(generation)
+        if session is not None and stats != session.file_stats:
+            session.pending_stats = stats
+
+    def merge_listing(self, generation, stats):
+        """
+        把后台扫到的文件并进当前列表（不换代次，扫描线程的后续结果仍然有效）。
+        只把新文件按当前排序插到各自的行上，已有的 item 和图标不动；
+        新文件的缩略图交给正在跑的加载线程接着做，不重启线程。
+        """
+        if generation != self.load_generation:
+            return
+        new_paths = [p for p in stats if p not in self.loaded_files]
+        if not new_paths:
+            return
+        self.file_stats.update(stats)
+        for p in new_paths:
+            self.loaded_files[p] = None
+        self.insert_view_paths(new_paths)
+        if self.current_file_list and self.list_widget.isHidden():
+            self.hint_label.hide()
+            self.list_widget.show()
+            QTimer.singleShot(0, self.update_grid_for_width)
+        todo = [p for p in new_paths if p in self.current_file_list
+                and p not in self.thumb_residency.resident and p not in self.thumb_residency.compact]
+        if todo and not (self.loader_thread is not None and self.loader_thread.add_paths(todo)):
+            self.start_thumbnail_loader()
+        if self.current_image_path:
+            self.current_index = self.current_file_list.row_of(self.current_image_path)
+            self.update_nav_buttons()
+        self.update_tab_bar()
+
+    def open_single_image(self, path):
+        """
+        打开单张图片：先只把这一张放进列表并显示，同目录的其它文件在后台扫描后逐步并入，
+        大文件夹里拖进一张图也不会卡住
+        """
+        path = os.path.normpath(path)
+        folder = os.path.dirname(path)
+        self.load_images_list([path], stats=stat_files([path]))
+        self.current_folder = folder
+        try:
+            self.folder_mtime = os.stat(folder).st_mtime
+        except OSError:
+            self.folder_mtime = None
+        self.update_tab_bar()
+        self.show_image_detail(path)
+        self.start_listing_scan(progressive=True)
+
+    # ---------- 会话恢复 ----------
+    @staticmethod
+    def last_session_path():
+        return os.path.join(app_data_dir(), "session.json")
+
+    def save_last_session(self):
+        """退出时记下所有标签页：列表（连同 size / mtime）、排序、滚动位置、选中项和当前视图"""
+        self.save_session(self.sessions[self.active_session])
+        tabs, active = [], 0
+        for i, session in enumerate(self.sessions):
+            if not session.loaded_files:
+                continue
+            if i == self.active_session:
+                active = len(tabs)
+            stats = session.file_stats
+            tabs.append({
+                "folder": session.current_folder,
+                "folder_mtime": session.folder_mtime,
+                "files": [[p, *stats[p]] for p in session.loaded_files if p in stats],
+                "sort_mode": session.sort_mode,
+                "scroll": session.scroll_value,
+                "selected": session.selected_path,
+            })
+        data = {
+            "tabs": tabs,
+            "active": active,
+            "view": "detail" if self.stacked_widget.currentIndex() == 1 else "grid",
+            "image": self.current_image_path,
+        }
+        path = self.last_session_path()
+        tmp = path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    def restore_last_session(self):
+        """先用上次保存的列表把标签页建起来（不扫描、缩略图走磁盘缓存），再在后台核对文件系统"""
+        if self.loaded_files or len(self.sessions) > 1:
+            return      # 启动后已经打开了别的内容
+        try:
+            with open(self.last_session_path(), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            tabs = data["tabs"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return
+        if not tabs:
+            return
+
+        restored = []
+        for tab in tabs:
+            try:
+                stats = {p: (size, mtime) for p, size, mtime in tab["files"]}
+            except (KeyError, TypeError, ValueError):
+                continue
+            if not stats:
+                continue
+            if restored:
+                self.new_session()
+            if tab.get("sort_mode") in self.sort_actions:
+                self.sort_mode = tab["sort_mode"]
+            self.load_images_list(list(stats.keys()), stats=stats)
+            self.current_folder = tab.get("folder")
+            self.folder_mtime = tab.get("folder_mtime")
+            self.start_listing_scan()
+            restored.append(tab)
+        if not restored:
+            return
+
+        # 每个标签页的滚动位置 / 选中项，切过去时由 show_session 还原
+        def apply_saved_views():
+            for session, tab in zip(self.sessions, restored):
+                session.scroll_value = tab.get("scroll", 0)
+                session.selected_path = tab.get("selected")
+
+        self.save_session(self.sessions[self.active_session])
+        apply_saved_views()
+        active = min(max(0, data.get("active", 0)), len(restored) - 1)
+        if active != self.active_session:
+            self.tab_bar.setCurrentIndex(active)
+            # 切换时 save_session 把刚离开的标签页（还没铺到界面上）的实时滚动位置和选中项存了回去，再写一遍保存的值
+            apply_saved_views()
+        else:
+            self.show_session(self.sessions[active])
+
+        image = data.get("image")
+        if data.get("view") == "detail" and image in self.current_file_list:
+            self.show_image_detail(image)
+
+    def close_session(self, index):
+        if not 0 <= index < len(self.sessions):
+            return
+        if len(self.sessions) == 1:
+            # 最后一个标签页不关掉，只清空内容；有内容时先确认，免得 Ctrl+W 误按丢掉整个列表
+            if not self.loaded_files:
+                return
+            msg = QMessageBox(self)
+            msg.setIcon(QMessageBox.Icon.Warning)
+            msg.setWindowTitle(self.tr('close_tab_title'))
+            msg.setText(self.tr('close_last_tab_confirm').format(len(self.loaded_files)))
+            msg.setStandardButtons(QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+            msg.setDefaultButton(QMessageBox.StandardButton.No)
+            if msg.exec() == QMessageBox.StandardButton.Yes:
+                self.clear_all()
+            return
+        if index == self.active_session:
+            # 先切到相邻的标签页，再把这个（此时已在后台）关掉
+            self.tab_bar.setCurrentIndex(index + 1 if index + 1 < len(self.sessions) else index - 1)
+        session = self.sessions.pop(index)
+        for thread in session.threads():
+            self.retire_thread(thread)
+        session.thumb_residency.clear()
+        session.list_widget.deleteLater()
+        if index < self.active_session:
+            self.active_session -= 1
+        self.tab_bar.blockSignals(True)
+        self.tab_bar.removeTab(index)
+        self.tab_bar.setCurrentIndex(self.active_session)
+        self.tab_bar.blockSignals(False)
+        self.update_tab_bar()
+
+    def io_concurrency(self):
+        if self.slow_storage:
+            return self.settings.value("io_concurrency_slow", 8, type=int)
+        return self.settings.value("io_concurrency", 2, type=int)
+
+    def set_slow_storage(self, checked):
+        self.slow_storage = checked
+        self.settings.setValue("slow_storage", checked)
+        # 正在跑的加载线程下一次补位时就按新的并发数来
+        self.io_scheduler.concurrency = self.io_concurrency()
+
+    def cancel_background_loaders(self):
+        """取消索引 / 缩略图线程（不阻塞 GUI）"""
+        for attr in ('indexer_thread', 'loader_thread', 'reload_thread'):
+            thread = getattr(self, attr)
+            if thread is not None:
+                self.retire_thread(thread)
+                setattr(self, attr, None)
+
+    def start_metadata_indexer(self):
+        if self.indexer_thread is not None:
+            self.retire_thread(self.indexer_thread)
+        todo = {p: st for p, st in self.file_stats.items() if p not in self.metadata_records}
+        self.indexer_thread = MetadataIndexer(self.metadata_index, todo, self.load_generation, self.io_scheduler)
+        self.indexer_thread.records_ready.connect(self.on_metadata_records)
+        self.indexer_thread.finished.connect(self.on_metadata_index_finished)
+        self.indexer_thread.start()
+
+    def on_metadata_records(self, records, generation):
+        if generation != self.load_generation:
+            # 后台标签页的结果写回它自己的 session
+            session = self.session_for_generation(generation)
+            if session is not None:
+                for path, record in records:
+                    session.metadata_records[path] = record
+                    session.facets.add(path, record)
+            return
+        for path, record in records:
+            self.metadata_records[path] = record
+            self.facets.add(path, record)
+        self.schedule_memory_check()
+        if self.facet_tree.isVisible() and not self.facet_timer.isActive():
+            self.facet_timer.start()
+
+    def on_metadata_index_finished(self):
+        if self.sender() is not self.indexer_thread:
+            return
+        # 按元数据排序 / 筛选时，索引建完后用完整数据重排一次
+        if self.sort_mode in METADATA_SORT_MODES or self.facet_filters:
+            self.resort_current_list()
+        self.refresh_facet_panel()
+
+    def reset_grid_items(self):
+        self.iconed_paths = set()
+        self.protected_paths = set()
+        self.pending_reload = set()
+
+    def create_grid_widget(self):
+        """新建一个网格（每个标签页一个），放进网格页、先隐藏"""
+        widget = GridListWidget()
+        widget.tooltip_provider = self.grid_tooltip
+        widget.setViewMode(QListWidget.ViewMode.IconMode)
+        widget.setIconSize(QSize(self.thumb_icon_size, self.thumb_icon_size))
+        widget.setResizeMode(QListWidget.ResizeMode.Adjust)
+
+        # 更紧凑
+        widget.setSpacing(3)
+        widget.setUniformItemSizes(True)
+        # 多选：Ctrl / Shift 扩展选择，用于批量删除
+        widget.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+
+        # 初始 gridSize，高度固定，宽度先用最小值
+        widget.setGridSize(QSize(self.grid_item_min_width, self.grid_item_height))
+
+        # 不换行 + 文本省略，避免长文件名撑高 item
+        widget.setWordWrap(False)
+        widget.setTextElideMode(Qt.TextElideMode.ElideMiddle)
+
+        widget.itemDoubleClicked.connect(self.on_thumbnail_clicked)
+        widget.verticalScrollBar().valueChanged.connect(
+            lambda _: self.residency_timer.start())
+        self.grid_layout.addWidget(widget)
+        widget.hide()
+        return widget
+
+    def populate_grid(self, paths, labels=None):
+        """一次性建好所有 item（先不挂图标），缩略图由驻留管理器按视口按需挂上；
+        labels 可选，{path: 前缀文字}"""
+        self.list_widget.setUpdatesEnabled(False)
+        self.list_widget.clear()
+        self.reset_grid_items()
+        size_hint = self.list_widget.gridSize()
+        for path in paths:
+            self.list_widget.addItem(self.make_grid_item(path, labels, size_hint))
+        self.list_widget.setUpdatesEnabled(True)
+        self.residency_timer.start()
+
+    @staticmethod
+    def make_grid_item(path, labels, size_hint):
         filename = os.path.basename(path)
 
         # 极端长文件名截断
@@ -1127,14 +5635,136 @@ class MainWindow(QMainWindow):
         else:
             filename_display = filename
 
+        if labels and path in labels:
+            filename_display = labels[path] + filename_display
+
         item = QListWidgetItem(filename_display)
-        item.setIcon(QIcon(pixmap))
         item.setData(Qt.ItemDataRole.UserRole, path)
-
         # 使用当前 gridSize 作为 sizeHint，保证高度统一
-        item.setSizeHint(self.list_widget.gridSize())
+        item.setSizeHint(size_hint)
+        return item
+
+    def start_thumbnail_loader(self):
+        """只为驻留缓存里还没有的路径启动缩略图线程"""
+        for thread in (self.loader_thread, self.reload_thread):
+            if thread is not None:
+                self.retire_thread(thread)
+        self.reload_thread = None
+        todo = [p for p in self.current_file_list
+                if p not in self.thumb_residency.resident and p not in self.thumb_residency.compact]
+        self.loader_thread = ThumbnailLoader(
+            todo, self.thumb_store, self.file_stats, self.load_generation, self.io_scheduler, self.thumb_tier,
+            self.jobs)
+        self.loader_thread.thumbnail_loaded.connect(self.add_thumbnail_item)
+        self.loader_thread.finished.connect(self.residency_timer.start)
+        self.loader_thread.start()
+
+    def grid_item(self, path):
+        """path -> 网格 item（行号与 current_file_list 一一对应）"""
+        row = self.current_file_list.row_of(path)
+        if row < 0:
+            return None
+        return self.list_widget.item(row)
+
+    def add_thumbnail_item(self, path, pixmap, data, generation, tier):
+        if tier != self.thumb_tier:
+            return      # 换档前的旧线程还在路上的结果，尺寸不对，不进缓存
+        if generation != self.load_generation:
+            session = self.session_for_generation(generation)
+            if session is not None:
+                session.thumb_residency.put(path, None, data)
+                session.pending_reload.discard(path)
+            return
+        item = self.grid_item(path)
+        if item is None:
+            return
+        self.pending_reload.discard(path)
+        if path in self.protected_paths:
+            self.thumb_residency.put(path, pixmap, data)
+            item.setIcon(QIcon(pixmap))
+            self.iconed_paths.add(path)
+        else:
+            # 视口外的图只留压缩字节，不占 QPixmap 内存
+            self.thumb_residency.put(path, None, data)
+        if not self.residency_timer.isActive():
+            self.residency_timer.start()
+
+    def visible_grid_rows(self):
+        """当前视口覆盖的 item 行号范围（含上下各若干行的预留）"""
+        count = self.list_widget.count()
+        if count == 0:
+            return 0, -1
+        vp = self.list_widget.viewport().rect()
+        first = self.list_widget.indexAt(vp.topLeft() + QPoint(4, 4)).row()
+        last = self.list_widget.indexAt(vp.bottomRight() - QPoint(4, 4)).row()
+        cell = self.list_widget.gridSize()
+        cols = max(1, vp.width() // max(1, cell.width()))
+        rows = max(1, vp.height() // max(1, cell.height()) + 1)
+        if first < 0:
+            first = 0
+        if last < 0:
+            last = min(count - 1, first + cols * rows)
+        # 上下各预留两屏，滚动时不至于露白
+        margin = cols * rows * 2
+        return max(0, first - margin), min(count - 1, last + margin)
+
+    def update_thumbnail_residency(self):
+        """把视口附近的缩略图挂到 item 上，并把超出预算的旧缩略图摘掉"""
+        if self.list_widget.count() == 0:
+            return
+        first, last = self.visible_grid_rows()
+        protected = set()
+        missing = []
+        for row in range(first, last + 1):
+            item = self.list_widget.item(row)
+            path = item.data(Qt.ItemDataRole.UserRole)
+            protected.add(path)
+            if path in self.iconed_paths:
+                continue
+            pixmap = self.thumb_residency.get(path)
+            if pixmap is not None:
+                item.setIcon(QIcon(pixmap))
+                self.iconed_paths.add(path)
+            else:
+                missing.append(path)
+        self.protected_paths = protected
 
-        self.list_widget.addItem(item)
+        self.drop_thumbnail_icons(self.thumb_residency.evict_to_budget(protected))
+        self.schedule_memory_check()
+
+        # 紧凑存储里也被挤掉的：等主加载线程跑完后再补生成
+        loading = self.loader_thread is not None and self.loader_thread.isRunning()
+        if missing and not loading:
+            self.request_thumbnail_reload(missing)
+
+    def drop_thumbnail_icons(self, paths, session=None):
+        """被淘汰的缩略图也从 item 上摘掉，否则 QIcon 仍然持有像素；session 给出时摘后台标签页网格上的"""
+        if session is None:
+            file_list, widget, iconed = self.current_file_list, self.list_widget, self.iconed_paths
+        else:
+            file_list, widget, iconed = session.current_file_list, session.list_widget, session.iconed_paths
+        for path in list(paths):
+            row = file_list.row_of(path)
+            if row >= 0:
+                item = widget.item(row)
+                if item is not None:
+                    item.setIcon(QIcon())
+            iconed.discard(path)
+
+    def request_thumbnail_reload(self, paths):
+        self.pending_reload.update(paths)
+        if self.reload_thread and self.reload_thread.isRunning():
+            return
+        todo = [p for p in self.pending_reload if p in self.protected_paths]
+        self.pending_reload = set(todo)
+        if not todo:
+            return
+        self.reload_thread = ThumbnailLoader(
+            todo, self.thumb_store, self.file_stats, self.load_generation, self.io_scheduler, self.thumb_tier,
+            self.jobs)
+        self.reload_thread.thumbnail_loaded.connect(self.add_thumbnail_item)
+        self.reload_thread.finished.connect(self.residency_timer.start)
+        self.reload_thread.start()
 
     def on_thumbnail_clicked(self, item):
         self.show_image_detail(item.data(Qt.ItemDataRole.UserRole))
@@ -1147,6 +5777,9 @@ class MainWindow(QMainWindow):
         if hasattr(self, 'sort_fab'):
             self.sort_fab.hide()
         path = os.path.normpath(path)
+        if path != self.current_image_path:
+            self.release_zoom()
+            self.expanded_sections = set()
         self.current_image_path = path
         if not keep_view:
             self.image_label.clear()
@@ -1159,53 +5792,485 @@ class MainWindow(QMainWindow):
         self.shortcut_prev.setEnabled(True)
         self.shortcut_next.setEnabled(True)
 
-        if path in self.current_file_list:
-            self.current_index = self.current_file_list.index(path)
-        else:
-            self.current_index = -1
+        self.current_index = self.current_file_list.row_of(path)
         self.update_nav_buttons()
 
         if not keep_view:
-            QTimer.singleShot(50, lambda: self.display_image_fit(path))
+            QTimer.singleShot(0, lambda: self.display_image_fit(path))
 
-        try:
-            with Image.open(path) as img:
-                self.parse_metadata(img, path, img.width, img.height)
-        except:
-            pass
+        # 索引里已有记录（按 size / mtime 校验过）就直接用；没有就放到后台解析，先显示占位
+        self.meta_request_id += 1
+        record = self.metadata_records.get(path)
+        if record is not None and record.get('width') and not record.get('unreadable'):
+            self.render_metadata(record, path, record['width'], record['height'])
+            return
+        self.render_metadata_placeholder(path)
+        self.meta_job = self.jobs.submit(JOB_USER, ('record', path), read_image_record, path)
+        self.jobs.deliver(self.meta_job,
+                          lambda record, r=self.meta_request_id, p=path: self.on_metadata_parsed(r, p, record),
+                          lambda error, r=self.meta_request_id, p=path: self.on_metadata_parsed(r, p, dict(UNREADABLE_RECORD)))
+
+    def on_metadata_parsed(self, request_id, path, record):
+        if path in self.loaded_files:
+            self.metadata_records[path] = record
+            self.facets.add(path, record)
+        if request_id == self.meta_request_id and path == self.current_image_path:
+            self.render_metadata(record, path, record.get('width'), record.get('height'))
+        # 鼠标还停在这张上：把“读取中”换成真正的摘要
+        if path == self.hover_path and QToolTip.isVisible():
+            pos = self.list_widget.viewport().mapFromGlobal(QCursor.pos())
+            item = self.list_widget.itemAt(pos)
+            if item is not None and item.data(Qt.ItemDataRole.UserRole) == path:
+                QToolTip.showText(QCursor.pos(), self.grid_tooltip(path), self.list_widget.viewport(),
+                                  self.list_widget.visualItemRect(item))
+
+    def grid_tooltip(self, path):
+        """网格悬停摘要：模型 / 种子 / 提示词开头，全部来自内存里的记录，不碰磁盘"""
+        self.hover_path = path
+        name = html.escape(os.path.basename(path))
+        record = self.metadata_records.get(path)
+        if record is None:
+            self.request_hover_parse(path)
+            return f"<b>{name}</b><br><i>{self.tr('loading_meta')}</i>"
+        lines = [f"<b>{name}</b>"]
+        if record.get('width'):
+            lines.append(f"{record['width']} x {record['height']} px")
+        if record.get('model'):
+            lines.append(f"{self.tr('model')}: {html.escape(record['model'])}")
+        params = [f"{label}: {record[key]}" for key, label in
+                  (('seed', 'Seed'), ('steps', 'Steps'), ('cfg', 'CFG')) if record.get(key) is not None]
+        if params:
+            lines.append(" | ".join(params))
+        prompt = record.get('positive') or ""
+        if prompt:
+            if len(prompt) > 200:
+                prompt = prompt[:200] + "…"
+            lines.append(f"<div style='max-width:360px;'>{html.escape(prompt)}</div>")
+        return "<br>".join(lines)
+
+    def request_hover_parse(self, path):
+        """悬停到还没建索引的图：只保留一个低优先级的解析任务，解析完的结果也写进 metadata_records"""
+        # 同一张图的解析任务和详情页共用一个 Future，详情页还在等的不能取消
+        if self.hover_job is not None and self.hover_job is not self.meta_job:
+            self.hover_job.cancel()
+        self.hover_job = self.jobs.submit(JOB_PREFETCH, ('record', path), read_image_record, path)
+        self.jobs.deliver(self.hover_job, lambda record, p=path: self.on_metadata_parsed(-1, p, record),
+                          lambda error, p=path: self.on_metadata_parsed(-1, p, dict(UNREADABLE_RECORD)))
 
     def display_image_fit(self, path):
-        try:
-            view_w = self.image_scroll.viewport().width()
-            view_h = self.image_scroll.viewport().height()
-            if view_w <= 50:
-                QTimer.singleShot(100, lambda: self.display_image_fit(path))
+        """
+        渐进显示：先用缓存的缩略图放大顶上（几乎不受原图尺寸影响），
+        再在后台线程按视口尺寸解码高质量版本，解码完成后替换
+        """
+        view_w = self.image_scroll.viewport().width()
+        view_h = self.image_scroll.viewport().height()
+        if view_w <= 50:
+            QTimer.singleShot(100, lambda: self.display_image_fit(path))
+            return
+        if path != self.current_image_path:
+            return
+
+        # --- High DPI Fix Start ---
+        dpr = self.image_label.devicePixelRatio()
+        # Calculate physical pixels needed
+        target_w = int((view_w - 40) * dpr)
+        target_h = int((view_h - 40) * dpr)
+
+        self.display_request_id += 1
+        for future in self.display_jobs:
+            future.cancel()
+        self.display_jobs = []
+        self.prefetch_neighbors(path, target_w, target_h)
+
+        # 1) 同一张图已经解码过（或预取过），并且分辨率够用：直接缩放
+        cached = self.cached_display(path, target_w, target_h)
+        if cached is not None:
+            self.display_cache.move_to_end(path)
+            self.set_fit_pixmap(QPixmap.fromImage(cached[0]), target_w, target_h, dpr)
+            return
+
+        # 2) 先用缩略图顶上
+        if self.image_label.pixmap() is None or self.image_label.pixmap().isNull():
+            preview = self.thumb_residency.get(path)
+            if preview is not None:
+                self.set_fit_pixmap(preview, target_w, target_h, dpr)
+
+        # 3) 后台解码高质量版本（预取任务还在排队的话直接提到最高优先级）
+        future = self.jobs.submit(
+            JOB_USER, ('display', path, target_w, target_h),
+            decode_display_image, path, target_w, target_h, self.decode_times)
+        self.jobs.deliver(
+            future, lambda result, r=self.display_request_id, p=path: self.on_display_decoded(r, p, *result))
+        self.display_jobs.append(future)
+
+    def display_target_size(self):
+        """详情页适应窗口时的目标物理像素尺寸：(宽, 高, dpr)"""
+        dpr = self.image_label.devicePixelRatio()
+        view = self.image_scroll.viewport()
+        return int((view.width() - 40) * dpr), int((view.height() - 40) * dpr), dpr
+
+    def cached_display(self, path, target_w, target_h):
+        """display_cache 里分辨率够用的解码结果 (QImage, 是否被缩小过)，没有返回 None"""
+        cached = self.display_cache.get(path)
+        if cached is not None and (not cached[1] or cached[0].width() >= target_w or cached[0].height() >= target_h):
+            return cached
+        return None
+
+    def prefetch_neighbors(self, path, target_w, target_h):
+        """
+        按当前视口尺寸预解码前后各一张，翻页时直接从 display_cache 取；不再相邻的预取任务取消。
+        幻灯片播放时改成往后预取 slideshow_ahead() 张：这些帧都有截止时间，按用户优先级排在缩略图等后台任务前面，
+        同级先进先出，按播放顺序提交也就是按截止时间先后解码
+        """
+        row = self.current_file_list.row_of(path)
+        count = len(self.current_file_list)
+        if row < 0:
+            rows = []
+        elif self.slideshow_active:
+            ahead = self.slideshow_ahead()
+            self.display_cache_size = max(4, ahead + 2)
+            rows = [(row + k) % count for k in range(1, ahead + 1)]
+        else:
+            rows = [r for r in (row + 1, row - 1) if 0 <= r < count]
+        wanted = []
+        for r in rows:
+            p = self.current_file_list[r]
+            if p != path and p not in wanted:
+                wanted.append(p)
+        for p in list(self.prefetch_jobs):
+            if p not in wanted:
+                self.prefetch_jobs.pop(p).cancel()
+        priority = JOB_USER if self.slideshow_active else JOB_PREFETCH
+        for p in wanted:
+            if self.cached_display(p, target_w, target_h) is not None:
+                continue
+            # 排队中或正在跑的同一任务再提交一次只会共用 Future（排队中的顺带提升优先级，比如刚开始播放时的相邻预取）
+            future = self.jobs.submit(
+                priority, ('display', p, target_w, target_h),
+                decode_display_image, p, target_w, target_h, self.decode_times)
+            if self.prefetch_jobs.get(p) is not future:
+                self.jobs.deliver(future, lambda result, p=p: self.cache_display_image(p, *result))
+                self.prefetch_jobs[p] = future
+
+    def cache_display_image(self, path, qimg, reduced):
+        self.prefetch_jobs.pop(path, None)
+        self.display_cache[path] = (qimg, reduced)
+        self.display_cache.move_to_end(path)
+        while len(self.display_cache) > self.display_cache_size:
+            self.display_cache.popitem(last=False)
+        self.schedule_memory_check()
+        if path == self.slideshow_waiting:
+            # 错过截止时间的那一帧到了：马上切过去
+            self.slideshow_tick()
+
+    # ---------- 幻灯片 ----------
+    def slideshow_ahead(self):
+        """
+        提前预取的帧数：第 k 帧在截止前 k 个间隔就开始排队。任务开始后不能打断，最坏情况下要先等一个正在跑的
+        后台任务（缩略图解码之类，按同量级估）再解码自己，所以让 k × 间隔 盖住两次解码耗时
+        （取最近几次里最慢的），再多留一帧余量；还没测过时按一个间隔估
+        """
+        interval = self.slideshow_interval / 1000
+        cost = max(self.decode_times) if self.decode_times else interval
+        return max(2, min(SLIDESHOW_MAX_AHEAD, math.ceil(2 * cost / interval) + 1))
+
+    def toggle_slideshow(self, checked):
+        if checked:
+            self.start_slideshow()
+        else:
+            self.stop_slideshow()
+
+    def start_slideshow(self):
+        if self.slideshow_active:
+            return
+        if len(self.current_file_list) < 2:
+            self.action_slideshow.setChecked(False)
+            return
+        in_detail = self.stacked_widget.currentIndex() == 1 and self.current_image_path
+        self.slideshow_active = True
+        self.slideshow_waiting = None
+        self.slideshow_stats = {'frames': 0, 'missed': 0, 'worst': 0.0}
+        self.slideshow_deadline = time.monotonic() + self.slideshow_interval / 1000
+        self.slideshow_timer.start(self.slideshow_interval)
+        if in_detail:
+            self.exit_zoom()
+            target_w, target_h, _ = self.display_target_size()
+            self.prefetch_neighbors(self.current_image_path, target_w, target_h)
+        else:
+            # 从网格开始：从当前选中的那张放起（打开详情页时会顺带按幻灯片方式预取）
+            item = self.list_widget.currentItem() or self.list_widget.item(0)
+            self.show_image_detail(item.data(Qt.ItemDataRole.UserRole))
+
+    def stop_slideshow(self):
+        if not self.slideshow_active:
+            return
+        self.slideshow_active = False
+        self.slideshow_waiting = None
+        self.slideshow_timer.stop()
+        self.action_slideshow.blockSignals(True)
+        self.action_slideshow.setChecked(False)
+        self.action_slideshow.blockSignals(False)
+        self.display_cache_size = 4
+        while len(self.display_cache) > self.display_cache_size:
+            self.display_cache.popitem(last=False)
+        # 多出来的预取收回到前后各一张
+        if self.stacked_widget.currentIndex() == 1 and self.current_image_path:
+            target_w, target_h, _ = self.display_target_size()
+            self.prefetch_neighbors(self.current_image_path, target_w, target_h)
+        stats = self.slideshow_stats
+        if stats.get('frames'):
+            self.show_toast(self.tr('slideshow_report').format(
+                stats['frames'], stats['missed'], int(stats['worst'] * 1000)), 4000)
+
+    def set_slideshow_interval(self, ms):
+        self.slideshow_interval = ms
+        self.settings.setValue("slideshow_interval_ms", ms)
+        if self.slideshow_active:
+            self.slideshow_deadline = time.monotonic() + ms / 1000
+            self.slideshow_timer.start(ms)
+
+    def slideshow_tick(self):
+        """
+        到了下一帧的截止时间：帧已经在 display_cache 里就直接换上（不走解码），
+        否则记一次错过、保持当前帧，等解码完成（cache_display_image）时立即切，迟到的帧从实际显示时刻重新计时
+        """
+        if not self.slideshow_active:
+            return
+        if (self.stacked_widget.currentIndex() != 1 or not self.current_image_path
+                or len(self.current_file_list) < 2 or self.image_stack.currentWidget() is self.zoom_view):
+            # 回到网格、列表清空或进入了缩放：停止播放
+            self.stop_slideshow()
+            return
+        row = self.current_file_list.row_of(self.current_image_path)
+        path = self.current_file_list[(row + 1) % len(self.current_file_list)]
+        now = time.monotonic()
+        target_w, target_h, _ = self.display_target_size()
+        ready = self.cached_display(path, target_w, target_h) is not None
+        if not ready:
+            if self.slideshow_waiting != path:
+                self.slideshow_waiting = path
+                self.prefetch_neighbors(self.current_image_path, target_w, target_h)
+            give_up = self.slideshow_deadline + SLIDESHOW_MAX_WAIT
+            if now < give_up:
+                self.slideshow_timer.start(int((give_up - now) * 1000) + 1)
                 return
-            
-            # --- High DPI Fix Start ---
-            dpr = self.image_label.devicePixelRatio()
-            # Calculate physical pixels needed
-            target_w = int((view_w - 40) * dpr)
-            target_h = int((view_h - 40) * dpr)
-            
-            with Image.open(path) as img:
-                pixmap = pil2pixmap(img)
-                # Scale to physical pixels
-                scaled = pixmap.scaled(
-                    target_w,
-                    target_h,
-                    Qt.AspectRatioMode.KeepAspectRatio,
-                    Qt.TransformationMode.SmoothTransformation
-                )
-                # Tell pixmap it is high-dpi (so it draws smaller in logical coords, matching viewport)
-                scaled.setDevicePixelRatio(dpr)
-                self.image_label.setPixmap(scaled)
-            # --- High DPI Fix End ---
-        except:
-            pass
+        if self.slideshow_waiting is not None:
+            self.slideshow_stats['missed'] += 1
+            self.slideshow_stats['worst'] = max(self.slideshow_stats['worst'], now - self.slideshow_deadline)
+            self.slideshow_deadline = now
+            self.slideshow_waiting = None
+        self.slideshow_stats['frames'] += 1
+        self.slideshow_deadline += self.slideshow_interval / 1000
+        if ready:
+            self.show_image_detail(path, keep_view=True)
+            self.display_image_fit(path)
+        else:
+            self.show_image_detail(path)
+        self.slideshow_timer.start(max(0, int((self.slideshow_deadline - time.monotonic()) * 1000)))
+
+    def set_fit_pixmap(self, pixmap, target_w, target_h, dpr):
+        if pixmap.width() != target_w and pixmap.height() != target_h:
+            # Scale to physical pixels
+            pixmap = pixmap.scaled(
+                target_w,
+                target_h,
+                Qt.AspectRatioMode.KeepAspectRatio,
+                Qt.TransformationMode.SmoothTransformation
+            )
+        # Tell pixmap it is high-dpi (so it draws smaller in logical coords, matching viewport)
+        pixmap.setDevicePixelRatio(dpr)
+        self.image_label.setPixmap(pixmap)
+        # --- High DPI Fix End ---
+
+    def on_display_decoded(self, request_id, path, qimg, reduced):
+        self.cache_display_image(path, qimg, reduced)
+        if request_id != self.display_request_id or path != self.current_image_path:
+            return
+        dpr = self.image_label.devicePixelRatio()
+        view = self.image_scroll.viewport()
+        self.set_fit_pixmap(
+            QPixmap.fromImage(qimg),
+            int((view.width() - 40) * dpr),
+            int((view.height() - 40) * dpr),
+            dpr,
+        )
+
+    # ---------- 缩放 / 平移 ----------
+    def enter_zoom(self, anchor=None, factor=None):
+        """
+        进入缩放模式：factor 为 None 时放大到 100%，否则在适应窗口的基础上乘以 factor。
+        瓦片源在后台构建，构建完成前先放大显示当前预览。
+        """
+        path = self.current_image_path
+        if not path or self.stacked_widget.currentIndex() != 1:
+            return
+        rec = self.metadata_records.get(path) or {}
+        w, h = rec.get('width'), rec.get('height')
+        if not w or not h:
+            return
+
+        view = self.zoom_view
+        entering = self.image_stack.currentWidget() is not view
+        if entering:
+            view.set_image(path, w, h, self.image_label.pixmap())
+            self.image_stack.setCurrentWidget(view)
+            view.zoom = view.fit_zoom()
+            view.origin = QPointF(0, 0)
+            view.clamp_origin()
+        if anchor is None:
+            anchor = QPointF(view.width() / 2, view.height() / 2)
+        target = 1.0 if factor is None else view.zoom * factor
+        view.set_zoom(target, QPointF(anchor))
+
+        if view.source is None and (self.tile_builder is None or self.tile_builder.path != path):
+            if self.tile_builder is not None:
+                self.retire_thread(self.tile_builder)
+            self.tile_request_id += 1
+            self.tile_builder = TiledSourceBuilder(self.tile_request_id, path)
+            self.tile_builder.ready.connect(self.on_tile_source_ready)
+            self.tile_builder.failed.connect(self.on_tile_source_failed)
+            self.tile_builder.start()
+
+    def zoom_by(self, factor):
+        if self.stacked_widget.currentIndex() != 1:
+            return
+        view = self.zoom_view
+        if self.image_stack.currentWidget() is not view:
+            if factor > 1:
+                self.enter_zoom(None, factor)
+            return
+        if view.zoom * factor <= view.fit_zoom():
+            self.exit_zoom()
+        else:
+            view.set_zoom(view.zoom * factor)
+
+    def exit_zoom(self):
+        if self.image_stack.currentWidget() is self.zoom_view:
+            self.image_stack.setCurrentWidget(self.image_scroll)
+
+    def on_tile_source_ready(self, request_id, source):
+        if request_id != self.tile_request_id or source.path != self.zoom_view.path:
+            source.close()
+            return
+        self.tile_builder = None
+        self.zoom_view.set_source(source)
+
+    def on_tile_source_failed(self, request_id, error):
+        """瓦片源建不起来：退出缩放并提示，不要一直停在放大的预览上"""
+        if request_id != self.tile_request_id:
+            return
+        self.tile_builder = None
+        self.exit_zoom()
+        self.show_toast(self.tr('zoom_failed').format(error))
+
+    # ---------- 全局内存预算 ----------
+    def setup_memory_budget(self):
+        """按重建代价从低到高登记：瓦片（从瓦片源重读）、元数据文档（重新排版）、大图（重新解码）、
+        缩略图（从紧凑字节 / 磁盘缓存恢复）；元数据记录撑着排序和筛选，只记账不淘汰"""
+        zoom = self.zoom_view
+        self.memory.register('tiles', lambda: zoom.tile_cache_bytes, lambda: len(zoom.tile_cache), zoom.shrink_tiles)
+        self.memory.register('documents', lambda: sum(v[2] for v in self.doc_cache.values()),
+                             lambda: len(self.doc_cache), self.shrink_documents)
+        self.memory.register('display', self.display_bytes, lambda: len(self.display_cache), self.shrink_display_cache)
+        self.memory.register('thumbnails', self.thumbnail_bytes, self.thumbnail_count, self.shrink_thumbnails)
+        self.memory.register('metadata', self.metadata_bytes,
+                             lambda: sum(len(records) for records in self.all_metadata_records()))
+
+    def schedule_memory_check(self):
+        """缓存变大后调用：同一轮事件循环里合并成一次检查"""
+        if not self.memory_timer.isActive():
+            self.memory_timer.start()
+
+    def set_memory_budget(self, mb):
+        self.memory.budget_bytes = mb * 1024 * 1024
+        self.settings.setValue("memory_budget_mb", mb)
+        self.memory.enforce()
+
+    def all_thumb_residencies(self):
+        return [self.thumb_residency] + [s.thumb_residency for s in self.background_sessions()]
+
+    def all_metadata_records(self):
+        return [self.metadata_records] + [s.metadata_records for s in self.background_sessions()]
+
+    def display_bytes(self):
+        # 正在显示的那张（适应窗口后的 QPixmap）不可淘汰，但也算在内
+        pixmap = self.image_label.pixmap()
+        shown = 0 if pixmap is None or pixmap.isNull() else pixmap.width() * pixmap.height() * 4
+        return shown + sum(qimg.sizeInBytes() for qimg, _ in self.display_cache.values())
+
+    def thumbnail_bytes(self):
+        return sum(r.usage_bytes for r in self.all_thumb_residencies())
+
+    def thumbnail_count(self):
+        return sum(len(r.resident) + len(r.compact) for r in self.all_thumb_residencies())
+
+    def metadata_bytes(self):
+        return sum(records_bytes(records) for records in self.all_metadata_records())
+
+    def shrink_documents(self, needed):
+        """从最久未用的开始丢元数据文档（正在显示的除外），返回收回的字节数"""
+        freed = 0
+        for key in list(self.doc_cache):
+            if freed >= needed:
+                break
+            if self.doc_cache[key][1] is self.current_doc:
+                continue
+            freed += self.doc_cache.pop(key)[2]
+        return freed
+
+    def shrink_display_cache(self, needed):
+        """从最久未用的开始丢解码好的大图（当前这张除外），幻灯片预取的帧被丢掉时会按错过截止时间记"""
+        freed = 0
+        for path in list(self.display_cache):
+            if freed >= needed:
+                break
+            if path == self.current_image_path:
+                continue
+            freed += self.display_cache.pop(path)[0].sizeInBytes()
+        return freed
+
+    def shrink_thumbnails(self, needed):
+        """
+        先丢后台标签页的缩略图，再摘当前标签页视口外的常驻 QPixmap（之后从紧凑字节恢复），
+        还不够再丢视口外的紧凑字节（滚回来时从磁盘缓存补）；视口里的不动
+        """
+        freed = 0
+        for session in self.background_sessions():
+            residency = session.thumb_residency
+            before = residency.usage_bytes
+            self.drop_thumbnail_icons(residency.shrink_resident(needed - freed, ()), session)
+            residency.shrink_compact(needed - freed - (before - residency.usage_bytes))
+            freed += before - residency.usage_bytes
+            if freed >= needed:
+                return freed
+        residency = self.thumb_residency
+        before = residency.resident_bytes
+        self.drop_thumbnail_icons(residency.shrink_resident(needed - freed, self.protected_paths))
+        freed += before - residency.resident_bytes
+        if freed < needed:
+            freed += residency.shrink_compact(needed - freed, self.protected_paths)
+        return freed
+
+    def retire_thread(self, thread):
+        """停止但不等待：保留引用直到线程真正结束，避免 QThread 在运行中被回收"""
+        thread.stop()
+        if thread.isRunning():
+            self.retired_threads.add(thread)
+            thread.finished.connect(lambda t=thread: self.retired_threads.discard(t))
+
+    def release_zoom(self):
+        """换图 / 回网格时释放瓦片源和瓦片缓存"""
+        self.exit_zoom()
+        if self.tile_builder is not None:
+            self.retire_thread(self.tile_builder)
+            self.tile_builder = None
+        self.tile_request_id += 1
+        self.zoom_view.release()
 
     # ---------- 回到网格 ----------
     def show_grid(self):
+        self.stop_slideshow()
+        self.release_zoom()
         self.current_image_path = None
         self.image_label.clear()
         self.stacked_widget.setCurrentIndex(0)
@@ -1223,6 +6288,41 @@ class MainWindow(QMainWindow):
         QTimer.singleShot(0, self.update_grid_for_width)
 
     # ---------- 自适应网格尺寸 ----------
+    def set_thumb_icon_size(self, size):
+        """滑块改图标边长：网格立即按新尺寸排版（先用现有缩略图缩放显示），停下后再按需换档"""
+        self.thumb_icon_size = size
+        self.settings.setValue("thumb_icon_size", size)
+        self.list_widget.setIconSize(QSize(size, size))
+        self.grid_item_min_width = size
+        self.grid_item_height = size + 40
+        self.update_grid_for_width()
+        self.residency_timer.start()
+        self.tier_timer.start()
+
+    def apply_thumb_tier(self):
+        """换档：各标签页的驻留缩略图作废，按新档位从磁盘缓存重新取（缓存里有更大档时直接缩小）"""
+        tier = thumb_tier(self.thumb_icon_size * self.devicePixelRatioF())
+        if tier == self.thumb_tier:
+            return
+        self.thumb_tier = tier
+        for session in self.background_sessions():
+            for thread in (session.loader_thread, session.reload_thread):
+                if thread is not None:
+                    self.retire_thread(thread)
+            session.loader_thread = session.reload_thread = None
+            session.pending_reload = set()
+            session.thumb_residency.clear()
+            self.drop_thumbnail_icons(session.iconed_paths, session)
+            session.protected_paths = set()
+        for path in self.iconed_paths:
+            item = self.grid_item(path)
+            if item is not None:
+                item.setIcon(QIcon())
+        self.thumb_residency.clear()
+        self.reset_grid_items()
+        if self.loaded_files:
+            self.start_thumbnail_loader()
+
     def update_grid_for_width(self):
         if hasattr(self, "sort_fab"):
             if self.stacked_widget.currentIndex() == 0 and len(self.current_file_list) > 0:
@@ -1262,338 +6362,246 @@ class MainWindow(QMainWindow):
     def get_theme(self):
         return NativeTheme.DARK if self.dark_mode else NativeTheme.LIGHT
 
-    def parse_comfy_data(self, comfy_json):
+    def metadata_header_html(self, title, copy_link=None):
+        t = self.get_theme()
+        copy_style = (
+            f"text-decoration:none; font-size:12px; color:{t['accent']}; "
+            f"border:1px solid {t['accent']}; padding:2px 8px; border-radius:10px;"
+        )
+        btn = f"<a href='{copy_link}' style='{copy_style}'>{self.tr('copy_btn')}</a>" if copy_link else ""
+        return (
+            "<div style='margin-bottom:6px; margin-top:16px;'>"
+            f"<span style='color:{t['text_sub']}; font-weight:bold; font-size:13px;'>{title}</span> &nbsp; {btn}</div>"
+        )
+
+    def collapsible(self, text, section):
+        """
+        段落的 HTML：text 是原始文字（不是 HTML），给列表时每项一行。
+        过长的先只排前 collapse_chars 个字，后面跟一个“展开全部”链接；先截断再转义，不会切坏标签或实体
+        """
+        lines = text if isinstance(text, (list, tuple)) else [text]
+        size = sum(len(line) for line in lines) + len(lines) - 1
+        if size <= self.collapse_chars or section in self.expanded_sections:
+            return "<br>".join(html.escape(line, quote=False) for line in lines)
+        kept, room = [], self.collapse_chars
+        for line in lines:
+            if room <= 0:
+                break
+            kept.append(line[:room])
+            room -= len(line) + 1
+        t = self.get_theme()
+        return (
+            "<br>".join(html.escape(line, quote=False) for line in kept)
+            + f"…<br><a href='expand:{section}' style='color:{t['accent']}; text-decoration:none;'>"
+            f"{self.tr('show_all').format(size)}</a>"
+        )
+
+    def parse_comfy_data(self, record):
         """
-        解析 ComfyUI 的 JSON 数据：
+        ComfyUI 记录（parse_comfy_prompt 的结果）渲染成 HTML：
         - 模型：只展示 Checkpoint / Diffusion Model 名称
         - KSampler 的参数
-        - 正/负提示词（含 Qwen Edit 等节点）
-        - LoRA（class_type 名里包含 'lora' 的节点）
+        - 正/负提示词
+        - LoRA
         """
+        if record.get('error'):
+            return self.tr('comfy_err')
         t = self.get_theme()
-        try:
-            data = json.loads(comfy_json)
-            pos, neg = "", ""
-            params = {}
-            sampler_node = None
-
-            # 只保留你关心的：Checkpoint / Diffusion Model 名称
-            model_lines = []
-
-            # Qwen Edit 等节点里可能直接有 prompt / negative_prompt
-            qwen_pos_candidate = ""
-            qwen_neg_candidate = ""
-
-            # LoRA 信息
-            lora_infos = []
-
-            for key, node in data.items():
-                ctype = node.get('class_type', '')
-                inputs = node.get('inputs', {}) or {}
-                ctype_lower = ctype.lower()
-
-                # 1) Checkpoint
-                if 'checkpointloader' in ctype_lower:
-                    name = (
-                        inputs.get('ckpt_name')
-                        or inputs.get('model_name')
-                        or inputs.get('ckpt_path')
-                        or ''
-                    )
-                    if name:
-                        line = f"Checkpoint: {name}"
-                        if line not in model_lines:
-                            model_lines.append(line)
-
-                # 2) Diffusion Model（这里把原本的 UNet 名字改成 Diffusion Model 展示）
-                if 'unet' in ctype_lower:
-                    name = (
-                        inputs.get('unet_name')
-                        or inputs.get('model')
-                        or inputs.get('name')
-                        or ''
-                    )
-                    if name:
-                        line = f"Diffusion Model: {name}"
-                        if line not in model_lines:
-                            model_lines.append(line)
-
-                # 3) KSampler：采样设置
-                if 'ksampler' in ctype_lower:
-                    sampler_node = node
-                    for k in ['seed', 'steps', 'cfg', 'sampler_name', 'scheduler', 'denoise']:
-                        if k in inputs:
-                            params[k.capitalize()] = inputs[k]
-
-                # 4) LoRA 节点
-                if 'lora' in ctype_lower:
-                    name = (
-                        inputs.get('lora_name')
-                        or inputs.get('model')
-                        or inputs.get('name')
-                        or ''
-                    )
-                    sm = inputs.get('strength_model', None)
-                    sc = inputs.get('strength_clip', None)
-
-                    parts = []
-                    if name:
-                        parts.append(str(name))
-                    if sm is not None:
-                        parts.append(f"model: {sm}")
-                    if sc is not None:
-                        parts.append(f"clip: {sc}")
-                    if parts:
-                        lora_infos.append(" | ".join(parts))
-
-                # 5) Qwen Edit / Qwen 相关节点：从 inputs 里直接抓 prompt
-                if 'qwen' in ctype_lower:
-                    p = inputs.get('prompt') or inputs.get('text') or ""
-                    n = inputs.get('negative_prompt') or inputs.get('negative') or ""
-                    if isinstance(p, str) and p.strip():
-                        qwen_pos_candidate = p.strip()
-                    if isinstance(n, str) and n.strip():
-                        qwen_neg_candidate = n.strip()
-
-            # == 从 KSampler 链接反推 正/负提示 ==
-            if sampler_node:
-                inputs = sampler_node.get('inputs', {}) or {}
-                for key, prompt_type in [('positive', 'pos'), ('negative', 'neg')]:
-                    ref = inputs.get(key)
-                    if ref:
-                        text_node = data.get(str(ref[0]), {})
-                        text = text_node.get('inputs', {}).get('text', '')
-                        if prompt_type == 'pos':
-                            pos = text
-                        else:
-                            neg = text
-
-            # == 兜底：遍历 CLIPTextEncode ==
-            if not pos and not neg:
-                for key, node in data.items():
-                    if 'cliptextencode' in node.get('class_type', '').lower():
-                        text = node.get('inputs', {}).get('text', '')
-                        if not text:
-                            continue
-                        if any(x in text.lower() for x in ['quality', 'nsfw', 'worst']):
-                            if not neg:
-                                neg = text
-                        else:
-                            if not pos:
-                                pos = text
-
-            # == 再兜底：如果还是空，用 Qwen 节点里的 prompt ==
-            if (not pos) and qwen_pos_candidate:
-                pos = qwen_pos_candidate
-            if (not neg) and qwen_neg_candidate:
-                neg = qwen_neg_candidate
-
-            self.current_pos_text, self.current_neg_text = pos, neg
-
-            copy_style = (
-                f"text-decoration:none; font-size:12px; color:{t['accent']}; "
-                f"border:1px solid {t['accent']}; padding:2px 8px; border-radius:10px;"
+        make_header = self.metadata_header_html
+        model_lines = record['model_lines']
+        lora_infos = record['loras']
+        pos, neg = record['positive'], record['negative']
+        params = record['params']
+
+        parts = []
+
+        # --- 模型信息（Checkpoint / Diffusion Model） ---
+        if model_lines:
+            parts.append(make_header(self.tr('model')))
+            parts.append(
+                f"<div style='color:{t['accent']}; font-weight:bold;'>"
+                + "<br>".join(html.escape(line, quote=False) for line in model_lines) +
+                "</div>"
             )
 
-            def make_header(title, copy_link=None):
-                btn = f"<a href='{copy_link}' style='{copy_style}'>{self.tr('copy_btn')}</a>" if copy_link else ""
-                return (
-                    "<div style='margin-bottom:6px; margin-top:16px;'>"
-                    f"<span style='color:{t['text_sub']}; font-weight:bold; font-size:13px;'>{title}</span> &nbsp; {btn}</div>"
-                )
-
-            html = ""
-
-            # --- 模型信息（Checkpoint / Diffusion Model） ---
-            if model_lines:
-                html += make_header(self.tr('model'))
-                html += (
-                    f"<div style='color:{t['accent']}; font-weight:bold;'>"
-                    + "<br>".join(model_lines) +
-                    "</div>"
-                )
-
-            # --- LoRA 信息 ---
-            if lora_infos:
-                html += make_header(self.tr('lora'))
-                html += (
-                    f"<div style='background:{t['code_bg']}; padding:10px; "
-                    f"border-radius:6px; color:{t['text_sub']}; font-family:Consolas; font-size:12px;'>"
-                    + "<br>".join(lora_infos)
-                    + "</div>"
-                )
+        # --- LoRA 信息 ---
+        if lora_infos:
+            parts.append(make_header(self.tr('lora')))
+            parts.append(
+                f"<div style='background:{t['code_bg']}; padding:10px; "
+                f"border-radius:6px; color:{t['text_sub']}; font-family:Consolas; font-size:12px;'>"
+                + self.collapsible(lora_infos, 'lora')
+                + "</div>"
+            )
 
-            # --- 正向提示 ---
-            if pos:
-                html += make_header(self.tr('prompt'), 'copy_pos')
-                html += (
-                    f"<div style='background:{t['prompt_bg']}; padding:10px; "
-                    f"border-radius:6px; line-height:1.5;'>{pos}</div>"
-                )
+        # --- 正向提示 ---
+        if pos:
+            parts.append(make_header(self.tr('prompt'), 'copy_pos'))
+            parts.append(
+                f"<div style='background:{t['prompt_bg']}; padding:10px; "
+                f"border-radius:6px; line-height:1.5;'>{self.collapsible(pos, 'pos')}</div>"
+            )
 
-            # --- 负向提示 ---
-            if neg:
-                html += make_header(self.tr('negative'), 'copy_neg')
-                html += (
-                    f"<div style='background:{t['neg_bg']}; padding:10px; "
-                    f"border-radius:6px; line-height:1.5;'>{neg}</div>"
-                )
+        # --- 负向提示 ---
+        if neg:
+            parts.append(make_header(self.tr('negative'), 'copy_neg'))
+            parts.append(
+                f"<div style='background:{t['neg_bg']}; padding:10px; "
+                f"border-radius:6px; line-height:1.5;'>{self.collapsible(neg, 'neg')}</div>"
+            )
 
-            # --- 采样参数 ---
-            if params:
-                html += make_header(self.tr('params'))
-                html += (
-                    f"<div style='background:{t['code_bg']}; padding:10px; border-radius:6px; "
-                    f"color:{t['text_sub']}; font-family:Consolas; font-size:12px;'>"
-                    + " | ".join([f"{k}: {v}" for k, v in params.items()])
-                    + "</div>"
-                )
-            return html
-        except:
-            return self.tr('comfy_err')
+        # --- 采样参数 ---
+        if params:
+            parts.append(make_header(self.tr('params')))
+            parts.append(
+                f"<div style='background:{t['code_bg']}; padding:10px; border-radius:6px; "
+                f"color:{t['text_sub']}; font-family:Consolas; font-size:12px;'>"
+                + self.collapsible(" | ".join([f"{k}: {v}" for k, v in params.items()]), 'params')
+                + "</div>"
+            )
+        return "".join(parts)
 
-    def parse_metadata(self, img, path, w, h):
-        """
-        解析元数据：
-        - ComfyUI JSON（img.info['prompt']）
-        - A1111 'parameters' 文本（包含 Model / LoRA 信息）
-        """
+    def parse_a1111_data(self, record):
+        """A1111 'parameters' 记录（parse_a1111_parameters 的结果）渲染成 HTML"""
         t = self.get_theme()
-        self.current_pos_text, self.current_neg_text = "", ""
-
-        filename = os.path.basename(path)
-        if self.current_file_list and 0 <= self.current_index < len(self.current_file_list):
-            filename += f" ({self.current_index+1}/{len(self.current_file_list)})"
+        make_header = self.metadata_header_html
+        model_name = record['model']
+        pos, neg = record['positive'], record['negative']
+        lora_list = record['loras']
+        params_display = record['params_text']
+
+        parts = []
+
+        # --- 模型信息（和 ComfyUI 一致的样式） ---
+        if model_name:
+            parts.append(make_header(self.tr('model')))
+            parts.append(
+                f"<div style='color:{t['accent']}; font-weight:bold;'>{html.escape(model_name, quote=False)}</div>"
+            )
 
-        html = (
-            f"<div style='font-size:16px; font-weight:bold; color:{t['text_main']};'>"
-            f"{filename}</div>"
-        )
-        html += (
-            f"<div style='color:{t['text_sub']}; margin-bottom:15px;'>{w} x {h} px</div>"
-            f"<hr style='border:0; border-top:1px solid {t['border']};'>"
+        # --- 正向提示 ---
+        parts.append(make_header(self.tr('prompt'), 'copy_pos'))
+        parts.append(
+            f"<div style='background:{t['prompt_bg']}; padding:10px; "
+            f"border-radius:6px; line-height:1.5;'>{self.collapsible(pos, 'pos')}</div>"
         )
 
-        info = img.info
-        # --- ComfyUI ---
-        if 'prompt' in info:
-            html += self.parse_comfy_data(info['prompt'])
-
-        # --- A1111 / NovelAI 等 'parameters' ---
-        elif 'parameters' in info:
-            text = info['parameters']
-            parts = text.split("Negative prompt:")
-            pos = parts[0].strip()
-            neg = ""
-            if len(parts) > 1:
-                if "Steps:" in parts[1]:
-                    neg = parts[1].split("Steps:")[0].strip()
-                else:
-                    neg = parts[1].strip()
-
-            # 解析 Steps: 后面的参数整体
-            full_params = ""
-            if "Steps:" in text:
-                full_params = "Steps:" + text.split("Steps:", 1)[1].strip()
-
-            # ---- 从参数中先拆出 Model: xxx ----
-            model_name = ""
-            if full_params:
-                idx_m = full_params.find("Model:")
-                if idx_m != -1:
-                    after = full_params[idx_m + len("Model:"):].lstrip()
-                    end_m = after.find(",")
-                    if end_m != -1:
-                        model_name = after[:end_m].strip()
-                        # 把 Model: 这一段从参数字符串中删掉
-                        full_params = (
-                            full_params[:idx_m].rstrip(" ,") + ", " +
-                            after[end_m + 1:].lstrip()
-                        ).strip(" ,")
-                    else:
-                        # Model: 后面一直到结尾
-                        model_name = after.strip()
-                        full_params = full_params[:idx_m].rstrip(" ,")
-
-            # ---- 再从剩余参数里拆出 LoRA 信息 ----
-            lora_list = []
-            params_display = full_params
-            if full_params:
-                lower = full_params.lower()
-                idx = lower.find("lora:")
-                if idx != -1:
-                    cut_start = idx + len("lora:")
-                    lora_part = full_params[cut_start:].strip(" ,")
-                    lora_items = [s.strip() for s in lora_part.split(",") if s.strip()]
-                    if lora_items:
-                        lora_list = lora_items
-                    params_display = full_params[:idx].rstrip(" ,")
-
-            self.current_pos_text, self.current_neg_text = pos, neg
-
-            copy_style = (
-                f"text-decoration:none; font-size:12px; color:{t['accent']}; "
-                f"border:1px solid {t['accent']}; padding:2px 8px; border-radius:10px;"
+        # --- 负向提示 ---
+        if neg:
+            parts.append(make_header(self.tr('negative'), 'copy_neg'))
+            parts.append(
+                f"<div style='background:{t['neg_bg']}; padding:10px; "
+                f"border-radius:6px; line-height:1.5;'>{self.collapsible(neg, 'neg')}</div>"
             )
 
-            def make_header(title, copy_link=None):
-                btn = f"<a href='{copy_link}' style='{copy_style}'>{self.tr('copy_btn')}</a>" if copy_link else ""
-                return (
-                    "<div style='margin-bottom:6px; margin-top:16px;'>"
-                    f"<span style='color:{t['text_sub']}; font-weight:bold; font-size:13px;'>{title}</span> &nbsp; {btn}</div>"
-                )
+        # --- LoRA 列表 ---
+        if lora_list:
+            parts.append(make_header(self.tr('lora')))
+            parts.append(
+                f"<div style='background:{t['code_bg']}; padding:10px; "
+                f"border-radius:6px; color:{t['text_sub']}; font-family:Consolas; font-size:12px;'>"
+                + self.collapsible(lora_list, 'lora')
+                + "</div>"
+            )
 
-            # --- 模型信息（和 ComfyUI 一致的样式） ---
-            if model_name:
-                html += make_header(self.tr('model'))
-                html += (
-                    f"<div style='color:{t['accent']}; font-weight:bold;'>{model_name}</div>"
-                )
+        # --- 其它参数（已经不含 Model / LoRA） ---
+        if params_display:
+            parts.append(make_header(self.tr('params')))
+            parts.append(
+                f"<div style='background:{t['code_bg']}; padding:10px; border-radius:10px; "
+                f"color:{t['text_sub']}; font-family:Consolas; font-size:12px; line-height:1.5;'>"
+                f"{self.collapsible(params_display, 'params')}</div>"
+            )
+        return "".join(parts)
 
-            # --- 正向提示 ---
-            html += make_header(self.tr('prompt'), 'copy_pos')
-            html += (
-                f"<div style='background:{t['prompt_bg']}; padding:10px; "
-                f"border-radius:6px; line-height:1.5;'>{pos}</div>"
+    def metadata_html(self, record, title, w, h):
+        t = self.get_theme()
+        source = record.get('source')
+        raw_link = ""
+        if source == 'comfy':
+            raw_link = (
+                f" &nbsp; <a href='raw_json' style='color:{t['accent']}; text-decoration:none; font-size:12px;'>"
+                f"{self.tr('raw_json')}</a>"
             )
+        size = f"{w} x {h} px" if w and h else ""
+        parts = [
+            f"<div style='font-size:16px; font-weight:bold; color:{t['text_main']};'>{html.escape(title, quote=False)}</div>",
+            f"<div style='color:{t['text_sub']}; margin-bottom:15px;'>{size}{raw_link}</div>"
+            f"<hr style='border:0; border-top:1px solid {t['border']};'>",
+        ]
 
-            # --- 负向提示 ---
-            if neg:
-                html += make_header(self.tr('negative'), 'copy_neg')
-                html += (
-                    f"<div style='background:{t['neg_bg']}; padding:10px; "
-                    f"border-radius:6px; line-height:1.5;'>{neg}</div>"
-                )
+        # --- ComfyUI ---
+        if source == 'comfy':
+            parts.append(self.parse_comfy_data(record))
 
-            # --- LoRA 列表 ---
-            if lora_list:
-                html += make_header(self.tr('lora'))
-                html += (
-                    f"<div style='background:{t['code_bg']}; padding:10px; "
-                    f"border-radius:6px; color:{t['text_sub']}; font-family:Consolas; font-size:12px;'>"
-                    + "<br>".join(lora_list)
-                    + "</div>"
-                )
+        # --- A1111 / NovelAI 等 'parameters' ---
+        elif source == 'a1111':
+            parts.append(self.parse_a1111_data(record))
 
-            # --- 其它参数（已经不含 Model / LoRA） ---
-            if params_display:
-                html += make_header(self.tr('params'))
-                html += (
-                    f"<div style='background:{t['code_bg']}; padding:10px; border-radius:10px; "
-                    f"color:{t['text_sub']}; font-family:Consolas; font-size:12px; line-height:1.5;'>{params_display}</div>"
-                )
+        # --- 文件头读不出来（损坏 / 还没写完） ---
+        elif record.get('unreadable'):
+            parts.append(
+                f"<p style='color:{t['text_sub']}; margin-top:20px;'>{self.tr('meta_unreadable')}</p>"
+            )
 
         else:
-            html += (
+            parts.append(
                 f"<p style='color:{t['text_sub']}; margin-top:20px;'>{self.tr('no_data_desc')}</p>"
             )
+        return "".join(parts)
+
+    def render_metadata(self, record, path, w, h):
+        """取（或生成并缓存）这张图的元数据文档，换到右侧面板上；同一张图再看时不重新排版"""
+        self.current_pos_text = record.get('positive', "")
+        self.current_neg_text = record.get('negative', "")
+
+        title = os.path.basename(path)
+        if self.current_file_list and 0 <= self.current_index < len(self.current_file_list):
+            title += f" ({self.current_index+1}/{len(self.current_file_list)})"
+
+        key = (path, title, self.dark_mode, self.lang, frozenset(self.expanded_sections))
+        cached = self.doc_cache.get(key)
+        if cached is not None and cached[0] is record:
+            self.doc_cache.move_to_end(key)
+            doc = cached[1]
+        else:
+            doc = QTextDocument()
+            doc.setDefaultFont(self.info_text.font())
+            doc.setDocumentMargin(self.blank_doc.documentMargin())
+            html_text = self.metadata_html(record, title, w, h)
+            doc.setHtml(html_text)
+            # 文档占用按 HTML 长度粗估（文本 + 格式表 + 排版行，大致同量级）
+            self.doc_cache[key] = (record, doc, len(html_text) * 2)
+            while len(self.doc_cache) > self.doc_cache_size:
+                self.doc_cache.popitem(last=False)
+            self.schedule_memory_check()
+
+        # current_doc 持有正在显示的文档，被 LRU 挤出去也不会被回收
+        self.current_doc = doc
+        if self.info_text.document() is not doc:
+            self.info_text.setDocument(doc)
+
+    def render_metadata_placeholder(self, path):
+        t = self.get_theme()
+        doc = QTextDocument()
+        doc.setDefaultFont(self.info_text.font())
+        doc.setDocumentMargin(self.blank_doc.documentMargin())
+        doc.setHtml(
+            f"<div style='font-size:16px; font-weight:bold; color:{t['text_main']};'>{os.path.basename(path)}</div>"
+            f"<p style='color:{t['text_sub']}; margin-top:20px;'>{self.tr('loading_meta')}</p>"
+        )
+        self.current_pos_text = self.current_neg_text = ""
+        self.current_doc = doc
+        self.info_text.setDocument(doc)
 
-        self.last_html = html
-        self.info_text.setHtml(html)
+    def clear_metadata_view(self):
+        self.current_doc = None
+        self.info_text.setDocument(self.blank_doc)
 
     def toggle_theme(self):
         self.dark_mode = not self.dark_mode
         self.settings.setValue("theme", self.dark_mode)
+        self.doc_cache.clear()
         self.apply_style()
         if self.stacked_widget.currentIndex() == 1 and self.current_image_path:
             self.show_image_detail(self.current_image_path, keep_view=True)
@@ -1676,6 +6684,20 @@ class MainWindow(QMainWindow):
                 background-color: {btn_hover};
                 color: {t['accent']};
             }}
+            QTabBar::tab {{
+                background-color: transparent;
+                color: {t['text_sub']};
+                padding: 6px 14px;
+                border: none;
+                border-bottom: 2px solid transparent;
+            }}
+            QTabBar::tab:selected {{
+                color: {t['text_main']};
+                border-bottom: 2px solid {t['accent']};
+            }}
+            QTabBar::tab:hover {{
+                background-color: {t['hover']};
+            }}
             QMenu {{
                 background-color: {t['bg_panel']};
                 border: 1px solid {t['border']};
@@ -1720,7 +6742,309 @@ class MainWindow(QMainWindow):
         """)
 
 
+# ==========================================
+# --- 慢速存储基准：python main.py --bench-io <文件夹> ---
+# ==========================================
+def run_io_benchmark(argv):
+    """
+    用 DelayedFS 在本机模拟 NAS / SMB 的往返延迟，对比：
+    - 列表：逐个 stat vs 一次 scandir
+    - 缩略图：串行按块读 vs IOScheduler 并发整读预读
+    """
+    import argparse
+    parser = argparse.ArgumentParser(prog="main.py --bench-io")
+    parser.add_argument("folder")
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--bandwidth-mb", type=float, default=100.0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--limit", type=int, default=200, help="最多处理多少张图")
+    args = parser.parse_args(argv)
+
+    fs = DelayedFS(args.latency_ms, args.bandwidth_mb)
+    paths = sorted(scan_folder(args.folder))[:args.limit]
+    if not paths:
+        print("no images in", args.folder)
+        return 1
+
+    def make_thumbnail(source):
+        with Image.open(source) as img:
+            img.thumbnail((240, 240), Image.Resampling.LANCZOS)
+            return encode_thumbnail(img)
+
+    def timed(label, func):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        print(f"{label:<34}{elapsed:8.2f} s  ({elapsed * 1000 / len(paths):6.1f} ms/file)")
+        return elapsed
+
+    def serial_stat():
+        for p in paths:
+            fs.stat(p)
+
+    def serial_thumbnails():
+        for p in paths:
+            with fs.open(p) as f:
+                make_thumbnail(f)
+
+    def scheduled_thumbnails():
+        io_scheduler = IOScheduler(args.concurrency, fs=fs)
+        try:
+            for p, data in io_scheduler.imap(io_scheduler.read_file, paths):
+                if data:
+                    make_thumbnail(io.BytesIO(data))
+                else:
+                    with fs.open(p) as f:
+                        make_thumbnail(f)
+        finally:
+            io_scheduler.shutdown()
+
+    print(f"{len(paths)} files, latency {args.latency_ms} ms, bandwidth {args.bandwidth_mb} MB/s, "
+          f"concurrency {args.concurrency}")
+    timed("stat, one by one", serial_stat)
+    timed("stat, batched (scandir)", lambda: stat_files(paths, fs))
+    base = timed("thumbnails, serial", serial_thumbnails)
+    fast = timed("thumbnails, scheduled read-ahead", scheduled_thumbnails)
+    print(f"speedup: {base / max(fast, 1e-9):.1f}x")
+    return 0
+
+
+# --- 元数据查询：python main.py --query ... / python main.py --serve-query ---
+# ==========================================
+def query_arguments(parser):
+    parser.add_argument("--model", help="模型名，不分大小写，可用 * 通配")
+    parser.add_argument("--lora", help="用到的 LoRA 名，不分大小写，可用 * 通配")
+    parser.add_argument("--sampler")
+    parser.add_argument("--scheduler")
+    parser.add_argument("--where", action="append", default=[], metavar="COND",
+                        help="数值条件，可以写多次：cfg>7 / steps<=30 / seed=123 / width>=1024")
+    parser.add_argument("--db", help="索引数据库路径（默认用界面程序的）")
+
+
+def query_filters(args):
+    return dict(
+        model=args.model, lora=args.lora, sampler=args.sampler, scheduler=args.scheduler,
+        conditions=[MetadataIndex.parse_condition(c) for c in args.where],
+    )
+
+
+def query_fields(text):
+    if not text:
+        return MetadataIndex.DEFAULT_QUERY_FIELDS
+    fields = tuple(f.strip() for f in text.split(",") if f.strip())
+    unknown = [f for f in fields if f not in MetadataIndex.QUERY_FIELDS]
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(unknown)} (available: {', '.join(MetadataIndex.QUERY_FIELDS)})")
+    return fields
+
+
+def run_query(argv):
+    """
+    不开界面，直接查元数据索引；结果按 JSON Lines 边查边写：
+        python main.py --query --lora add_detail --where "cfg>7"
+        python main.py --query --folder D:/outputs --model "*xl*" --limit 100 --after <上一页最后的 path>
+        python main.py --query --paths-from list.txt     # 按路径批量查，没建索引 / 过期的当场解析
+    --folder / --paths 给定时会先把这些文件的索引补齐。
+    """
+    import argparse
+    parser = argparse.ArgumentParser(prog="main.py --query")
+    query_arguments(parser)
+    parser.add_argument("--folder", help="只查这个文件夹下的图（先补齐索引）")
+    parser.add_argument("--paths", nargs="*", default=[], help="按路径批量查")
+    parser.add_argument("--paths-from", metavar="FILE", help="从文件读路径，每行一个；- 表示标准输入")
+    parser.add_argument("--fields", help="输出字段，逗号分隔：" + ",".join(MetadataIndex.QUERY_FIELDS))
+    parser.add_argument("--format", choices=("jsonl", "paths"), default="jsonl")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--after", help="分页：上一页最后一条的 path")
+    args = parser.parse_args(argv)
+    try:
+        filters = query_filters(args)
+        fields = query_fields(args.fields)
+    except ValueError as e:
+        parser.error(str(e))
+
+    index = MetadataIndex(args.db)
+    paths = [os.path.normpath(os.path.abspath(p)) for p in args.paths]
+    if args.paths_from:
+        f = sys.stdin if args.paths_from == "-" else open(args.paths_from, encoding="utf-8")
+        with f:
+            paths += [os.path.normpath(os.path.abspath(line.strip())) for line in f if line.strip()]
+    folder = os.path.normpath(os.path.abspath(args.folder)) if args.folder else None
+    try:
+        if paths:
+            index.refresh(stat_files(paths))
+        elif folder:
+            index.refresh(scan_folder(folder))
+        else:
+            index.connect().close()     # 建表 / 升级，之后只用只读连接
+        conn = index.connect(readonly=True)
+    except (OSError, sqlite3.Error) as e:
+        print(f"cannot open index {index.db_path}: {e}", file=sys.stderr)
+        return 1
+
+    last, count = None, 0
+    out = sys.stdout
+    for row in MetadataIndex.query(conn, folder=folder, paths=paths or None, after=args.after,
+                                   limit=args.limit, fields=("path",) + fields, **filters):
+        last = row["path"]
+        count += 1
+        if args.format == "paths":
+            out.write(last + "\n")
+        else:
+            out.write(json.dumps({f: row[f] for f in fields}, ensure_ascii=False) + "\n")
+    out.flush()
+    conn.close()
+    if args.limit is not None and count >= args.limit:
+        print(f"next page: --after {json.dumps(last, ensure_ascii=False)}", file=sys.stderr)
+    return 0
+
+
+def run_query_server(argv):
+    """
+    只监听 127.0.0.1 的 HTTP / JSON 查询接口；每个请求线程用自己的只读连接，WAL 下不会挡住界面写索引。
+        GET  /query?lora=X&where=cfg>7&limit=100&after=<path>  -> {"results": [...], "next": path 或 null}
+        GET  /query?...&format=jsonl                           -> 逐行输出全部结果（不分页）
+        POST /lookup  {"paths": [...], "fields": [...]}         -> {"results": [...], "unindexed": [...]}
+    全部只读：索引里没有、已过期或文件不存在的路径放进 unindexed，不在请求线程里解析图片、写索引
+    （需要补索引用 --query --paths-from，或者在界面里打开那个文件夹）。
+    Host 必须是 127.0.0.1 / localhost（挡住 DNS rebinding），POST 必须是 application/json
+    （浏览器跨站发不出这种简单请求，别的网页没法借它读文件、写索引）。
+    """
+    import argparse
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import urlparse, parse_qs
+
+    parser = argparse.ArgumentParser(prog="main.py --serve-query")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--db", help="索引数据库路径（默认用界面程序的）")
+    args = parser.parse_args(argv)
+
+    index = MetadataIndex(args.db)
+    try:
+        index.connect().close()
+    except sqlite3.Error as e:
+        print(f"cannot open index {index.db_path}: {e}", file=sys.stderr)
+        return 1
+    local = threading.local()
+    page_max = 10000
+    allowed_hosts = ("127.0.0.1", "localhost")
+
+    def reader():
+        if getattr(local, "conn", None) is None:
+            local.conn = index.connect(readonly=True)
+        return local.conn
+
+    class QueryHandler(BaseHTTPRequestHandler):
+        def send_json(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def host_allowed(self):
+            host = (self.headers.get("Host") or "").strip().lower()
+            if host.split(":", 1)[0] in allowed_hosts:
+                return True
+            self.send_json(403, {"error": "only reachable as 127.0.0.1 or localhost"})
+            return False
+
+        def do_GET(self):
+            if not self.host_allowed():
+                return
+            url = urlparse(self.path)
+            if url.path != "/query":
+                return self.send_json(404, {"error": "use GET /query or POST /lookup"})
+            qs = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            try:
+                filters = dict(
+                    model=qs.get("model"), lora=qs.get("lora"),
+                    sampler=qs.get("sampler"), scheduler=qs.get("scheduler"),
+                    conditions=[MetadataIndex.parse_condition(c) for c in parse_qs(url.query).get("where", [])],
+                )
+                fields = query_fields(qs.get("fields"))
+                limit = min(int(qs.get("limit", 1000)), page_max)
+                if limit < 1:
+                    raise ValueError("limit must be at least 1")
+            except ValueError as e:
+                return self.send_json(400, {"error": str(e)})
+            fields = ("path",) + tuple(f for f in fields if f != "path")
+            folder = os.path.normpath(os.path.abspath(qs["folder"])) if qs.get("folder") else None
+            stream = qs.get("format") == "jsonl"
+            rows = MetadataIndex.query(reader(), folder=folder, after=qs.get("after"),
+                                       limit=None if stream else limit, fields=fields, **filters)
+            try:
+                if not stream:
+                    results = list(rows)
+                    nxt = results[-1]["path"] if len(results) >= limit else None
+                    return self.send_json(200, {"results": results, "next": nxt})
+                # 先取到第一条再发响应头，查询本身出错时还能回 500
+                first = next(rows, None)
+            except sqlite3.Error as e:
+                return self.send_json(500, {"error": str(e)})
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+            self.end_headers()
+            if first is None:
+                return
+            self.wfile.write((json.dumps(first, ensure_ascii=False) + "\n").encode("utf-8"))
+            try:
+                for row in rows:
+                    self.wfile.write((json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8"))
+            except (sqlite3.Error, ConnectionError):
+                # 响应头已经发出去了（或者客户端先断开了），只能提前结束这一串
+                self.close_connection = True
+
+        def do_POST(self):
+            if not self.host_allowed():
+                return
+            if urlparse(self.path).path != "/lookup":
+                return self.send_json(404, {"error": "use GET /query or POST /lookup"})
+            content_type = (self.headers.get("Content-Type") or "").split(";", 1)[0].strip().lower()
+            if content_type != "application/json":
+                return self.send_json(415, {"error": "Content-Type must be application/json"})
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                paths = [os.path.normpath(os.path.abspath(p)) for p in payload.get("paths", [])]
+                fields = query_fields(",".join(payload.get("fields", [])))
+            except (ValueError, TypeError, AttributeError) as e:
+                return self.send_json(400, {"error": str(e)})
+            fields = ("path",) + tuple(f for f in fields if f != "path")
+            try:
+                found = MetadataIndex.lookup(reader(), stat_files(paths)) if paths else {}
+                indexed = [p for p in paths if p in found]
+                by_path = {row["path"]: row for row in MetadataIndex.query(reader(), paths=indexed, fields=fields)}
+            except sqlite3.Error as e:
+                return self.send_json(500, {"error": str(e)})
+            self.send_json(200, {
+                "results": [by_path[p] for p in paths if p in by_path],
+                "unindexed": [p for p in paths if p not in by_path],
+            })
+
+        def log_message(self, fmt, *log_args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), QueryHandler)
+    server.daemon_threads = True
+    print(f"serving metadata queries on http://127.0.0.1:{server.server_address[1]}/query", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    return 0
+
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench-io":
+        sys.exit(run_io_benchmark(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "--query":
+        sys.exit(run_query(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "--serve-query":
+        sys.exit(run_query_server(sys.argv[2:]))
+
     from PyQt6.QtCore import qInstallMessageHandler, QtMsgType
 
     def qt_message_handler(mode, context, message):
@@ -1749,4 +7073,12 @@ if __name__ == "__main__":
 
     win = MainWindow()
     win.show()
+
+    # 命令行 / “打开方式” 传进来的图片或文件夹
+    if len(sys.argv) > 1:
+        target = os.path.abspath(sys.argv[1])
+        if os.path.isdir(target):
+            win.load_from_folder_path(target)
+        elif os.path.isfile(target) and target.lower().endswith(VALID_EXTENSIONS):
+            win.open_single_image(target)
     sys.exit(app.exec())